@@ -0,0 +1,79 @@
+"""Benchmark of the integer-cents amounts engine against the original float computation.
+
+Usage: python benchmarks/bench_amounts.py [-n INVOICES] [--seed SEED]
+
+-n random single-line invoices (amounts up to 100,000 EUR at 22, 9.5, 5
+and 0 % VAT) are computed with:
+
+- float:     the original compute_amounts (float division and round(),
+             copied below)
+- invoice:   amounts.invoice_totals, one invoice at a time
+- batch:     amounts.batch_totals over the whole amount and rate columns
+
+The batch columns are checked against invoice_totals for every invoice,
+and every result against the EN 16931 rules (BR-CO-15, BR-CO-16, BR-CO-17).
+The script also counts the invoices whose float VAT amount breaks
+BR-CO-17 and exits with status 1 if the engine breaks any rule.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.xml_generator.amounts import VAT_RATES, batch_totals, invoice_totals, line_tax, rate_points
+
+
+def float_amounts(data):
+    """The original compute_amounts, which split the total with floats."""
+    total_amount_with_vat = float(data.get('Amount', 0.0))
+    tax_rate = float(data.get('TaxRate', 22.0))
+    base_amount = round(total_amount_with_vat / (1 + tax_rate / 100), 2)
+    tax_amount = round(total_amount_with_vat - base_amount, 2)
+    return total_amount_with_vat, tax_rate, base_amount, tax_amount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--invoices", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cents = [rng.randint(0, 10 ** 7) for _ in range(args.invoices)]
+    rates = [rng.choice(VAT_RATES) for _ in range(args.invoices)]
+    invoices = [{'AmountCents': c, 'Amount': c / 100, 'TaxRate': r} for c, r in zip(cents, rates)]
+
+    timings = {}
+    started = time.perf_counter()
+    floats = [float_amounts(data) for data in invoices]
+    timings["float"] = time.perf_counter() - started
+    started = time.perf_counter()
+    totals = [invoice_totals(data) for data in invoices]
+    timings["invoice"] = time.perf_counter() - started
+    started = time.perf_counter()
+    columns = batch_totals(cents, rates)
+    timings["batch"] = time.perf_counter() - started
+
+    errors = 0
+    for i, t in enumerate(totals):
+        vat = t.breakdown[0]
+        if (t.gross != t.net + t.tax or t.payable != t.gross - t.paid + t.rounding or t.payable != cents[i]
+                or vat.tax != line_tax(vat.taxable, vat.rate)
+                or (columns["BT-109"][i], columns["BT-110"][i], columns["BT-114"][i]) != (t.net, t.tax, t.rounding)):
+            errors += 1
+    float_drift = sum(1 for (_, rate, base, tax) in floats
+                      if round(tax * 100) != line_tax(round(base * 100), rate_points(rate)))
+    rounded = sum(1 for t in totals if t.rounding)
+
+    for name, elapsed in timings.items():
+        print(f"{name:<8} {elapsed:>7.2f}s  {elapsed / args.invoices * 1e6:>6.2f} µs/invoice")
+    print(f"float VAT breaking BR-CO-17: {float_drift} of {args.invoices} invoices")
+    print(f"engine: {errors} rule violations, {rounded} invoices with a one cent BT-114 rounding amount")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
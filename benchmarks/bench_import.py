@@ -0,0 +1,76 @@
+"""Start-up benchmark of main.py based on python -X importtime.
+
+Usage: python benchmarks/bench_import.py [--repeat N] [--max-ms MS] [--top N] [-- MAIN_ARGS...]
+
+main.py is started --repeat times with MAIN_ARGS (default: --help) in a
+fresh interpreter. The best run is reported with:
+
+- the wall time of the whole process
+- the total import time, as reported by -X importtime
+- the --top modules with the highest cumulative import time
+
+The script exits with status 1 if one of the heavy dependencies (PyMuPDF,
+Pillow, pyzbar, lxml, inquirer, numpy) was imported, or if the import time
+exceeds --max-ms. The regression tests for the lazy imports are in
+tests/test_startup.py; this script shows where the start-up time goes.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load once the stage that needs them runs
+FORBIDDEN = ("fitz", "pymupdf", "PIL", "pyzbar", "lxml", "inquirer", "numpy")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def measure(main_args):
+    """Runs main.py once; returns (wall seconds, [(cumulative µs, depth, module)])."""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, "main.py"), *main_args],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    return wall, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs to take the best of (default: 5)")
+    parser.add_argument("--max-ms", type=float, help="Fail if the import time exceeds this many milliseconds")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list (default: 10)")
+    parser.add_argument("main_args", nargs="*", help="Arguments for main.py, after '--' (default: --help)")
+    args = parser.parse_args()
+    main_args = args.main_args or ["--help"]
+
+    runs = [measure(main_args) for _ in range(args.repeat)]
+    wall, modules = min(runs, key=lambda run: sum(cumulative for cumulative, depth, _ in run[1] if depth == 0))
+    total = sum(cumulative for cumulative, depth, _ in modules if depth == 0) / 1000
+
+    print(f"main.py {' '.join(main_args)}: {wall * 1000:.1f} ms wall, {total:.1f} ms importing "
+          f"{len(modules)} modules (best of {args.repeat})")
+    for cumulative, _, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:>7.1f} ms  {name}")
+
+    failed = False
+    loaded = sorted({name.split(".")[0] for _, _, name in modules} & set(FORBIDDEN))
+    if loaded:
+        print(f"Heavy modules imported: {', '.join(loaded)}")
+        failed = True
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"Import time {total:.1f} ms exceeds --max-ms {args.max_ms:g}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Microbenchmark of the UPNQR parser against the original dict-building implementation.
+
+Usage: python benchmarks/bench_parser.py [-n PAYLOADS] [--unique N] [--seed SEED] [--broken RATIO]
+
+-n synthetic payloads (see corpus.py; --broken of them damaged) are parsed
+with:
+
+- reference:      the original parser, which built a dict and converted
+                  both dates with datetime.strptime (copied below)
+- parse:          parse_upnqr_data; dates and amount are derived on access
+- parse+as_dict:  parse_upnqr_data followed by record.as_dict(), which
+                  derives every field the reference computes eagerly
+- parse+validate: parse_upnqr_data with checksum, IBAN and reference checks
+- parse_many:     the bulk API over the whole list
+
+All results are kept until a variant finishes, as a bulk job would keep
+them. The payload list cycles through --unique generated payloads, since
+generating a million of them would take longer than parsing them. Before
+timing, the results of both parsers are compared on every unique payload;
+the parse_many results are compared with the reference afterwards.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_payload, BROKEN_KINDS
+from src.qr_code_processor.upnqr import parse_upnqr_data, parse_many
+
+
+def reference_parse(data):
+    """The original parse_upnqr_data, which returned a plain dict."""
+    lines = data.strip().split('\n')
+    if len(lines) < 20 or lines[0] != "UPNQR":
+        return None
+    try:
+        amount_str = lines[8].strip()
+        amount = int(amount_str) / 100.0 if amount_str else 0.0
+        dates = []
+        for date_str in (lines[9].strip(), lines[13].strip()):
+            date = None
+            if date_str:
+                try:
+                    date = datetime.strptime(date_str, "%d.%m.%Y").strftime("%Y-%m-%d")
+                except ValueError:
+                    date = date_str
+            dates.append(date)
+        data_dict = {
+            "format": lines[0].strip(),
+            "iban_placnika": lines[1].strip(),
+            "polog": lines[2].strip(),
+            "dvig": lines[3].strip(),
+            "referenca_placnika": lines[4].strip(),
+            "ime_placnika": lines[5].strip(),
+            "ulica_placnika": lines[6].strip(),
+            "kraj_placnika": lines[7].strip(),
+            "znesek": amount,
+            "znesek_centi": amount_str,
+            "datum_placila": dates[0],
+            "datum_placila_original": lines[9].strip(),
+            "nujno": lines[10].strip(),
+            "koda_namena": lines[11].strip(),
+            "namen": lines[12].strip(),
+            "rok_placila": dates[1],
+            "rok_placila_original": lines[13].strip(),
+            "iban_prejemnika": lines[14].strip(),
+            "referenca_prejemnika": lines[15].strip(),
+            "ime_prejemnika": lines[16].strip(),
+            "ulica_prejemnika": lines[17].strip(),
+            "kraj_prejemnika": lines[18].strip().replace('鬚', 'Ž'),
+            "checksum": lines[19].strip() if len(lines) > 19 else "",
+        }
+        namen = data_dict["namen"]
+        if "računa št.:" in namen or "računa št:" in namen:
+            data_dict["stevilka_racuna"] = namen.split("računa št")[-1].strip(":. ")
+        else:
+            data_dict["stevilka_racuna"] = data_dict["referenca_prejemnika"]
+        return data_dict
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_as_dict(data):
+    record = parse_upnqr_data(data)
+    return record.as_dict() if record is not None else None
+
+
+def parse_validated(data):
+    return parse_upnqr_data(data, [])
+
+
+def verify(payloads):
+    """Returns the number of payloads the two parsers disagree on."""
+    return sum(1 for payload in payloads if reference_parse(payload) != parse_as_dict(payload))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--payloads", type=int, default=1_000_000)
+    parser.add_argument("--unique", type=int, default=20000, help="Distinct payloads to generate (default: 20000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--broken", type=float, default=0.05, help="Share of damaged payloads (default: 0.05)")
+    args = parser.parse_args()
+    # Damaged amounts are logged by the parser
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    kinds = [kind for kind in BROKEN_KINDS if kind != "no_qr"]
+    unique = [make_payload(rng, rng.choice(kinds) if rng.random() < args.broken else None)
+              for _ in range(min(args.unique, args.payloads))]
+    mismatches = verify(unique)
+    print(f"{len(unique)} distinct payloads, {mismatches} parsed differently")
+    payloads = (unique * (args.payloads // len(unique) + 1))[:args.payloads]
+
+    timings = {}
+    for name, func in (("reference", reference_parse), ("parse", parse_upnqr_data),
+                       ("parse+as_dict", parse_as_dict), ("parse+validate", parse_validated)):
+        started = time.perf_counter()
+        results = [func(payload) for payload in payloads]
+        timings[name] = time.perf_counter() - started
+        del results
+    started = time.perf_counter()
+    results = parse_many(payloads)
+    timings["parse_many"] = time.perf_counter() - started
+    bulk_mismatches = sum(1 for payload, record in zip(unique, results)
+                          if reference_parse(payload) != (record.as_dict() if record is not None else None))
+    print(f"parse_many: {bulk_mismatches} of {len(unique)} distinct payloads parsed differently")
+    mismatches += bulk_mismatches
+
+    for name, elapsed in timings.items():
+        print(f"{name:<15} {elapsed:>7.2f}s  {elapsed / len(payloads) * 1e6:>6.2f} µs/payload  "
+              f"{timings['reference'] / elapsed:>5.1f}x")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Times every stage of the PDF -> e-SLOG pipeline over a corpus and writes the results as JSON.
+
+Usage: python benchmarks/bench_pipeline.py [CORPUS_DIR] [-n INVOICES] [--rounds N]
+                                           [-o results.json] [--baseline old.json]
+
+CORPUS_DIR is a directory written by benchmarks/corpus.py. Without one, a
+corpus of -n invoices is generated into a temporary directory first.
+
+Each PDF is run through the stages one at a time, the way the original
+pipeline calls them:
+
+    extract_images     all embedded images as PIL images
+    decode_qr_code     decoding those images until one holds a QR code
+    render_fallback    rendering pages for vector QR codes (only when no image decoded)
+    parse_upnqr_data
+    map_upnqr_to_eslog
+    generate_eslog_xml
+    write              writing the XML file
+
+plus convert_pdf, the end-to-end conversion the batch and service modes
+use. Every stage is timed --rounds times per file. The JSON report holds
+summary statistics per stage (milliseconds), the per-file median of every
+stage, the version and platform it was measured on and the number of
+payloads that did not decode to what the corpus manifest expects.
+
+With --baseline, the median of every stage is compared against an earlier
+report and the script exits with status 1 if any stage got slower than
+--max-regression allows.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fitz  # PyMuPDF
+from src import __version__
+from src.pdf_handler.handler import extract_images
+from src.pdf_handler.render import iter_rendered_qr_regions
+from src.qr_code_processor.processor import decode_qr_code
+from src.qr_code_processor.upnqr import parse_upnqr_data
+from src.xml_generator.generator import generate_eslog_xml, map_upnqr_to_eslog
+from src.pipeline.converter import convert_pdf, ConversionError
+from benchmarks.corpus import generate_corpus, MANIFEST_NAME
+
+STAGES = (
+    "extract_images", "decode_qr_code", "render_fallback", "parse_upnqr_data",
+    "map_upnqr_to_eslog", "generate_eslog_xml", "write", "convert_pdf",
+)
+
+
+def timed(samples, stage, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    samples.setdefault(stage, []).append(time.perf_counter() - started)
+    return result
+
+
+def decode_first(images):
+    for image in images:
+        qr_data = decode_qr_code(image)
+        if qr_data:
+            return qr_data
+    return None
+
+
+def decode_rendered(pdf_path):
+    for region in iter_rendered_qr_regions(pdf_path):
+        qr_data = decode_qr_code(region)
+        if qr_data:
+            return qr_data
+    return None
+
+
+def write_xml(path, xml):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(xml)
+
+
+def run_stages(pdf_path, xml_path, samples):
+    """Runs the pipeline stage by stage once and returns the decoded QR payload (or None)."""
+    images = timed(samples, "extract_images", extract_images, pdf_path)
+    qr_data = timed(samples, "decode_qr_code", decode_first, images)
+    if not qr_data:
+        qr_data = timed(samples, "render_fallback", decode_rendered, pdf_path)
+    if qr_data:
+        upnqr_data = timed(samples, "parse_upnqr_data", parse_upnqr_data, qr_data)
+        if upnqr_data:
+            eslog_data = timed(samples, "map_upnqr_to_eslog", map_upnqr_to_eslog, upnqr_data)
+            xml = timed(samples, "generate_eslog_xml", generate_eslog_xml, eslog_data)
+            timed(samples, "write", write_xml, xml_path, xml)
+
+    started = time.perf_counter()
+    try:
+        convert_pdf(pdf_path, xml_path)
+    except ConversionError:
+        pass
+    samples.setdefault("convert_pdf", []).append(time.perf_counter() - started)
+    return qr_data
+
+
+def summarize(values):
+    """Returns summary statistics in milliseconds for a list of durations in seconds."""
+    ms = sorted(v * 1000 for v in values)
+    return {
+        "count": len(ms),
+        "total": round(sum(ms), 3),
+        "mean": round(statistics.fmean(ms), 3),
+        "median": round(statistics.median(ms), 3),
+        "p95": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min": round(ms[0], 3),
+        "max": round(ms[-1], 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, max_regression):
+    """Prints the median change of every stage against a baseline report; returns the regressed stages."""
+    regressed = []
+    print(f"\nAgainst baseline {baseline.get('version')} ({baseline.get('git') or 'unknown revision'}):")
+    for stage, stats in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old or not old["median"]:
+            continue
+        change = stats["median"] / old["median"] - 1
+        flag = ""
+        if change > max_regression:
+            regressed.append(stage)
+            flag = "  REGRESSION"
+        print(f"  {stage:<20}{old['median']:>10.3f} -> {stats['median']:>10.3f} ms  {change:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", help="Corpus directory from benchmarks/corpus.py")
+    parser.add_argument("-n", "--invoices", type=int, default=50, help="Invoices to generate without a corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("-o", "--output", default="bench_pipeline.json")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown of a stage median against the baseline (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = args.corpus
+        if not corpus_dir:
+            corpus_dir = os.path.join(tmp, "corpus")
+            print(f"Generating {args.invoices} invoices...")
+            generate_corpus(corpus_dir, args.invoices, args.seed)
+        with open(os.path.join(corpus_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        samples = {}
+        files = []
+        mismatches = 0
+        started = time.perf_counter()
+        for entry in manifest["files"]:
+            pdf_path = os.path.join(corpus_dir, entry["file"])
+            xml_path = os.path.join(tmp, os.path.splitext(entry["file"])[0] + ".xml")
+            file_samples = {}
+            for _ in range(args.rounds):
+                qr_data = run_stages(pdf_path, xml_path, file_samples)
+            if qr_data != entry["expected_qr"]:
+                mismatches += 1
+                print(f"  {entry['file']}: decoded payload does not match the manifest")
+            for stage, values in file_samples.items():
+                samples.setdefault(stage, []).extend(values)
+            files.append({
+                "file": entry["file"],
+                "decoded": qr_data is not None,
+                "stages": {stage: round(statistics.median(v) * 1000, 3) for stage, v in file_samples.items()},
+            })
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "version": __version__,
+        "git": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pymupdf": fitz.VersionBind,
+        "corpus": {key: manifest[key] for key in ("seed", "count", "broken_ratio", "vector_ratio") if key in manifest},
+        "rounds": args.rounds,
+        "elapsed": round(elapsed, 3),
+        "mismatches": mismatches,
+        "stages": {stage: summarize(samples[stage]) for stage in STAGES if stage in samples},
+        "files": files,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'stage':<20}{'count':>7}{'median ms':>11}{'p95 ms':>10}{'total ms':>11}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<20}{stats['count']:>7}{stats['median']:>11.3f}{stats['p95']:>10.3f}{stats['total']:>11.1f}")
+    print(f"{len(files)} files, {mismatches} payload mismatches, results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
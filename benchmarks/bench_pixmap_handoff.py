@@ -0,0 +1,112 @@
+"""Compares the PIL and the grayscale pixmap handoff from PyMuPDF to pyzbar.
+
+Usage: python benchmarks/bench_pixmap_handoff.py [invoice.pdf ...] [-n ROUNDS]
+
+For every embedded image the script measures the time and the peak Python
+memory needed to turn it into the 8-bit buffer pyzbar scans:
+
+- pil:    doc.extract_image -> io.BytesIO -> Image.open -> convert('L') -> tobytes
+          (what pyzbar does internally when given a PIL image)
+- pixmap: fitz.Pixmap(doc, xref) -> grayscale pixmap -> samples
+
+If libzbar is available, the full decode time for both inputs is reported too.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from PIL import Image
+from src.pdf_handler.handler import extract_gray_image
+
+
+def pil_handoff(doc, xref):
+    image = Image.open(io.BytesIO(doc.extract_image(xref)["image"]))
+    if image.mode != 'L':
+        image = image.convert('L')
+    return image.tobytes(), image.width, image.height
+
+
+def pixmap_handoff(doc, xref):
+    return extract_gray_image(doc, xref)
+
+
+def measure(func, doc, xref, rounds):
+    """Returns (mean seconds, peak traced bytes) for one handoff."""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(doc, xref)
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    func(doc, xref)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def load_decoder():
+    try:
+        from src.qr_code_processor.processor import decode_qr_code
+        return decode_qr_code
+    except ImportError as e:
+        print(f"pyzbar not available, skipping decode timings ({e})")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", default=["example_invoice.pdf"])
+    parser.add_argument("-n", "--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    decode_qr_code = load_decoder()
+    header = f"{'image':<28}{'pil ms':>9}{'pixmap ms':>11}{'pil KiB':>10}{'pixmap KiB':>12}"
+    if decode_qr_code:
+        header += f"{'decode pil':>12}{'decode pix':>12}"
+    print(header)
+
+    totals = [0.0, 0.0, 0, 0]
+    count = 0
+    for pdf_path in args.pdfs:
+        with fitz.open(pdf_path) as doc:
+            xrefs = sorted({img[0] for page in doc for img in page.get_images(full=True)})
+            for xref in xrefs:
+                pil_time, pil_peak = measure(pil_handoff, doc, xref, args.rounds)
+                pix_time, pix_peak = measure(pixmap_handoff, doc, xref, args.rounds)
+                totals[0] += pil_time
+                totals[1] += pix_time
+                totals[2] += pil_peak
+                totals[3] += pix_peak
+                count += 1
+
+                line = (f"{os.path.basename(pdf_path) + ':' + str(xref):<28}"
+                        f"{pil_time * 1000:>9.2f}{pix_time * 1000:>11.2f}"
+                        f"{pil_peak / 1024:>10.0f}{pix_peak / 1024:>12.0f}")
+                if decode_qr_code:
+                    image = Image.open(io.BytesIO(doc.extract_image(xref)["image"]))
+                    pixels = pixmap_handoff(doc, xref)
+                    started = time.perf_counter()
+                    decode_qr_code(image)
+                    decode_pil = time.perf_counter() - started
+                    started = time.perf_counter()
+                    decode_qr_code(pixels)
+                    decode_pix = time.perf_counter() - started
+                    line += f"{decode_pil * 1000:>12.2f}{decode_pix * 1000:>12.2f}"
+                print(line)
+
+    if count:
+        print(f"\nMean per image over {count} images:")
+        print(f"  time:   pil {totals[0] / count * 1000:.2f} ms, pixmap {totals[1] / count * 1000:.2f} ms "
+              f"({(1 - totals[1] / totals[0]) * 100:.0f}% saved)")
+        print(f"  memory: pil {totals[2] / count / 1024:.0f} KiB, pixmap {totals[3] / count / 1024:.0f} KiB "
+              f"({(1 - totals[3] / totals[2]) * 100:.0f}% saved)")
+
+
+if __name__ == "__main__":
+    main()
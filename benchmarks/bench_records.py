@@ -0,0 +1,84 @@
+"""Compares the memory of parsed invoices held as records and as the old plain dicts.
+
+Usage: python benchmarks/bench_records.py [-n INVOICES] [--seed SEED]
+
+Synthetic UPNQR payloads (see corpus.py) are parsed and mapped, and all
+results are kept in memory, the way a reconciliation job holds a month of
+invoices:
+
+- records: the UpnqrRecord and EslogInvoice returned by parse_upnqr_data
+           and map_upnqr_to_eslog
+- dicts:   the same data as the plain dicts both functions used to return
+           (record.as_dict(), invoice.as_dict())
+
+For each form the script reports the memory traced with tracemalloc, per
+invoice, and the time to build it.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_payload
+from src.qr_code_processor.upnqr import parse_upnqr_data
+from src.xml_generator.generator import map_upnqr_to_eslog
+
+
+def as_records(payloads):
+    invoices = []
+    for payload in payloads:
+        record = parse_upnqr_data(payload)
+        invoices.append((record, map_upnqr_to_eslog(record)))
+    return invoices
+
+
+def as_dicts(payloads):
+    invoices = []
+    for payload in payloads:
+        record = parse_upnqr_data(payload)
+        invoices.append((record.as_dict(), map_upnqr_to_eslog(record).as_dict()))
+    return invoices
+
+
+def measure(build, payloads):
+    """Returns (traced bytes still held, seconds) for building and keeping all invoices.
+
+    The time is taken in a separate run without tracemalloc, which slows
+    allocations down considerably.
+    """
+    started = time.perf_counter()
+    build(payloads)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    invoices = build(payloads)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del invoices
+    return current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--invoices", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = [make_payload(rng) for _ in range(args.invoices)]
+
+    results = {}
+    for name, build in (("dicts", as_dicts), ("records", as_records)):
+        results[name] = measure(build, payloads)
+        held, elapsed = results[name]
+        print(f"{name:<8} {held / 1024 / 1024:>8.1f} MiB  {held / len(payloads):>7.0f} B/invoice  "
+              f"{elapsed:.2f}s to build")
+    print(f"records use {(1 - results['records'][0] / results['dicts'][0]) * 100:.0f}% less memory")
+
+
+if __name__ == "__main__":
+    main()
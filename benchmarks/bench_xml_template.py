@@ -0,0 +1,96 @@
+"""Compares the throughput of the template serializer and generate_eslog_xml.
+
+Usage: python benchmarks/bench_xml_template.py [-n INVOICES] [--seed SEED]
+
+The random invoices mix optional segments (due date, buyer, seller, IBAN,
+VAT and legal IDs), VAT rates, invoices with several lines, address
+formats, characters that need escaping, non-ASCII text and None values.
+Before timing, the outputs of both serializers are compared and the script
+exits with status 1 on a mismatch. The equivalence tests of template.py
+are in tests/test_xml_template.py.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.xml_generator.generator import generate_eslog_xml
+from src.xml_generator.template import render_eslog_xml
+
+TEXTS = [
+    '', 'NGEN d.o.o.', 'Luka Oblak', 'Žirovnica', 'Čevljarstvo & Co.', 'A <b> "quoted" \'x\'',
+    'line\r\nbreak', ']]> cdata end', 'tab\there', 'Šenčur', 'd.o.o., Ljubljana', '鬚',
+]
+ADDRESSES = [
+    '', ', ', 'Moste 101, 4274 Žirovnica', 'Delavska cesta BŠ, 4280 Šenčur', 'Ulica 1',
+    'Ulica 1, Ljubljana', 'Ulica 1, 1000', 'A & B, 1000 Ljubljana <center>', 'a,b,c', ' , 2000 Maribor',
+]
+
+
+def random_invoice(rng):
+    """Returns e-SLOG data as map_upnqr_to_eslog would, with randomly mixed edge cases."""
+    data = {
+        'InvoiceNumber': rng.choice(TEXTS + ['1090010602', 'SI00 1234-56']),
+        'InvoiceDate': rng.choice(['2025-04-17', '2024-12-31']),
+        'DueDate': rng.choice(['', None, '2025-05-01', '17.04.2025']),
+        'BuyerName': rng.choice(TEXTS),
+        'BuyerAddress': rng.choice(ADDRESSES),
+        'SellerName': rng.choice(TEXTS),
+        'SellerAddress': rng.choice(ADDRESSES),
+        'SellerIBAN': rng.choice(['', 'SI56040000276166895', None]),
+        'SellerVATID': rng.choice(['', 'SI24576239']),
+        'SellerLegalID': rng.choice(['', '8209901000']),
+        'Amount': rng.choice([0.0, 0.48, 0.01, 1.0, 99.99, 1234.56, rng.randint(0, 10 ** 7) / 100]),
+        'PaymentReference': 'SI001090010602',
+        'PurposeCode': 'GDSV',
+        'ItemDescription': rng.choice(TEXTS + ['Plačilo računa št.: 1090010602', None]),
+        'TaxRate': rng.choice([22.0, 9.5, 5.0, 0.0]),
+    }
+    # Exact cents as map_upnqr_to_eslog provides them, and invoices with lines at several VAT rates
+    if rng.random() < 0.5:
+        data['AmountCents'] = str(rng.randint(0, 10 ** 7))
+    if rng.random() < 0.2:
+        data['Lines'] = [(rng.randint(0, 10 ** 6), rng.choice([22.0, 9.5, 5.0, 0.0])) for _ in range(rng.randint(1, 4))]
+    # Missing keys exercise the serializers' defaults
+    for key in ('InvoiceNumber', 'ItemDescription', 'TaxRate', 'SellerIBAN'):
+        if rng.random() < 0.1:
+            del data[key]
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--invoices", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    invoices = [random_invoice(rng) for _ in range(args.invoices)]
+
+    for i, data in enumerate(invoices):
+        expected = generate_eslog_xml(data).encode('utf-8')
+        actual = render_eslog_xml(data).encode('utf-8')
+        if expected != actual:
+            print(f"Mismatch for invoice {i}: {data!r}")
+            for line_no, (a, b) in enumerate(zip(expected.splitlines(), actual.splitlines()), 1):
+                if a != b:
+                    print(f"  line {line_no}:\n    lxml:     {a!r}\n    template: {b!r}")
+                    break
+            sys.exit(1)
+    print(f"{len(invoices)} invoices: template output is byte-identical to the lxml path")
+
+    results = {}
+    for name, func in (("lxml", generate_eslog_xml), ("template", render_eslog_xml)):
+        started = time.perf_counter()
+        for data in invoices:
+            func(data)
+        results[name] = time.perf_counter() - started
+        print(f"{name:<9} {results[name]:.3f}s  {len(invoices) / results[name]:>10.0f} invoices/s")
+    print(f"speedup   {results['lxml'] / results['template']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
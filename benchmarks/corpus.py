@@ -0,0 +1,292 @@
+"""Generates a synthetic corpus of UPNQR invoice PDFs for benchmarking.
+
+Usage: python benchmarks/corpus.py OUTPUT_DIR [-n INVOICES] [--seed SEED] [--broken RATIO] [--statement PAGES]
+
+Every PDF is built from a seeded random generator, so the same arguments
+always produce the same corpus. The invoices vary in:
+
+- page count, with the UPN slip on the last page
+- number of decoy images (logos and photos) around the QR code
+- QR placement: an embedded raster image or vector paths drawn on the page
+- raster resolution (DPI) and noise (blur plus flipped pixels)
+- payload: a valid UPNQR record or a broken one (wrong header, missing
+  lines, bad amount or checksum, or no QR code at all)
+
+With --statement PAGES, a consolidated statement.pdf with one slip per page
+is written as well, with its expected payloads in statement.json.
+
+A corpus.json manifest next to the PDFs records these properties and the
+expected QR payload of each file. The QR codes are built with the qrcode
+package, which is only needed to generate the corpus:
+
+    pip install qrcode
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageFilter
+
+MANIFEST_NAME = "corpus.json"
+
+# UPN slips print a version 15 QR code with error correction M, about 40 mm wide
+QR_VERSION = 15
+QR_SIZE_PT = 113
+
+PLACEMENTS = ("raster", "vector")
+DPIS = (150, 200, 300)
+NOISE_LEVELS = (0.0, 0.0, 0.005, 0.01)
+BROKEN_KINDS = ("header", "truncated", "amount", "checksum", "no_qr")
+
+FIRST_NAMES = ["Luka", "Ana", "Marko", "Špela", "Žiga", "Nina", "Jure", "Maja", "Tadej", "Urška"]
+LAST_NAMES = ["Oblak", "Novak", "Horvat", "Kovačič", "Krajnc", "Zupančič", "Potočnik", "Kos"]
+STREETS = ["Delavska cesta", "Slovenska cesta", "Ulica heroja Šaranoviča", "Trg svobode", "Moste", "Čopova ulica"]
+CITIES = ["1000 Ljubljana", "2000 Maribor", "4000 Kranj", "4280 Šenčur", "4274 Žirovnica", "6000 Koper"]
+COMPANIES = ["NGEN d.o.o.", "Elektro Gorenjska d.d.", "Komunala Kranj d.o.o.", "Telekom Slovenije d.d.",
+             "Petrol d.d.", "Mestna občina Žirovnica"]
+PURPOSE_CODES = ["GDSV", "ENRG", "OTHR", "SUPP", "COST"]
+
+
+def upnqr_checksum(fields):
+    """Returns field 20 of a UPNQR record: the summed length of fields 1-19 plus 19."""
+    return sum(len(field) for field in fields) + 19
+
+
+def slovenian_iban(bban):
+    """Returns the SI IBAN with valid mod-97 check digits for a 15 digit account number."""
+    # "SI" becomes 2818 in the mod-97 computation
+    return f"SI{98 - int(bban + '281800') % 97:02d}{bban}"
+
+
+def make_payload(rng, broken=None):
+    """Returns a UPNQR payload string; broken names one of BROKEN_KINDS to damage it."""
+    invoice_number = str(rng.randint(10 ** 9, 10 ** 10 - 1))
+    fields = [
+        "UPNQR",
+        "", "", "", "",
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        f"{rng.choice(STREETS)} {rng.randint(1, 150)}",
+        rng.choice(CITIES),
+        f"{rng.randint(1, 10 ** 6):011d}",
+        "", "",
+        rng.choice(PURPOSE_CODES),
+        f"Plačilo računa št.: {invoice_number}",
+        f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2024, 2026)}",
+        slovenian_iban(str(rng.randint(10 ** 14, 10 ** 15 - 1))),
+        f"SI00{invoice_number}",
+        rng.choice(COMPANIES),
+        f"{rng.choice(STREETS)} {rng.randint(1, 150)}",
+        rng.choice(CITIES),
+    ]
+    if broken == "header":
+        fields[0] = "UPNQX"
+    elif broken == "amount":
+        fields[8] = "12,34"
+    checksum = upnqr_checksum(fields) + (7 if broken == "checksum" else 0)
+    fields.append(f"{checksum:03d}")
+    if broken == "truncated":
+        fields = fields[:rng.randint(8, 15)]
+    return "\n".join(fields) + "\n"
+
+
+def qr_matrix(payload):
+    """Returns the module matrix of the UPN QR code for payload (True = dark)."""
+    try:
+        import qrcode
+    except ImportError:
+        sys.exit("The corpus generator needs the qrcode package: pip install qrcode")
+    qr = qrcode.QRCode(version=QR_VERSION, error_correction=qrcode.constants.ERROR_CORRECT_M, border=0)
+    qr.add_data(payload.encode("utf-8"))
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def raster_qr(matrix, size_pt, dpi, noise, rng):
+    """Returns PNG bytes of the QR matrix scanned at dpi, with optional noise."""
+    quiet = 4
+    modules = len(matrix) + 2 * quiet
+    pixels = max(modules, round(size_pt / 72 * dpi))
+    image = Image.new("L", (modules, modules), 255)
+    for y, row in enumerate(matrix):
+        for x, dark in enumerate(row):
+            if dark:
+                image.putpixel((x + quiet, y + quiet), 0)
+    image = image.resize((pixels, pixels), Image.NEAREST)
+
+    if noise:
+        image = image.filter(ImageFilter.GaussianBlur(noise * 60))
+        data = bytearray(image.tobytes())
+        for i in rng.sample(range(len(data)), int(len(data) * noise)):
+            data[i] = 255 - data[i]
+        image = Image.frombytes("L", image.size, bytes(data))
+    else:
+        image = image.convert("1")
+
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def draw_vector_qr(page, matrix, rect):
+    """Draws the QR matrix as filled rectangles, one per horizontal run of dark modules."""
+    module = rect.width / len(matrix)
+    shape = page.new_shape()
+    for row_index, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            y0 = rect.y0 + row_index * module
+            shape.draw_rect(fitz.Rect(rect.x0 + start * module, y0, rect.x0 + x * module, y0 + module))
+    shape.finish(color=None, fill=(0, 0, 0))
+    shape.commit()
+
+
+def decoy_image(rng, width, height, quality=80):
+    """Returns JPEG bytes of a smooth random colour image, standing in for logos and photos."""
+    seed = Image.frombytes("RGB", (8, 6), bytes(rng.getrandbits(8) for _ in range(8 * 6 * 3)))
+    out = io.BytesIO()
+    seed.resize((width, height), Image.BICUBIC).save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def fill_text(page, rng, top, bottom):
+    y = top
+    while y < bottom:
+        words = rng.choices(["Račun", "postavka", "znesek", "DDV", "storitev", "EUR", "kos", "skupaj",
+                             "dobava", "obdobje", "0,00", "22 %", "števec"], k=rng.randint(4, 12))
+        page.insert_text((50, y), " ".join(words), fontsize=10)
+        y += 14
+
+
+def make_invoice_pdf(path, rng, pages=1, images=0, placement="raster", dpi=200, noise=0.0, broken=None):
+    """Writes one synthetic invoice PDF and returns its manifest entry."""
+    payload = make_payload(rng, broken)
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        page.insert_text((50, 60), f"Račun – stran {page_number + 1}/{pages}", fontsize=16)
+        last = page_number == pages - 1
+        fill_text(page, rng, 90, 480 if last else 780)
+
+    # Decoy images: a logo on the first page, photos spread over the rest
+    for i in range(images):
+        page = doc[rng.randrange(pages)]
+        if i == 0:
+            rect = fitz.Rect(400, 30, 545, 80)
+            page.insert_image(rect, stream=decoy_image(rng, 290, 100))
+        else:
+            x, y = rng.randint(50, 300), rng.randint(100, 380)
+            rect = fitz.Rect(x, y, x + 240, y + 160)
+            page.insert_image(rect, stream=decoy_image(rng, 800, 533))
+
+    slip = doc[-1]
+    slip.draw_line((30, 520), (565, 520), dashes="[3] 0")
+    slip.insert_text((50, 545), "UPN – univerzalni plačilni nalog", fontsize=11)
+    expected = None
+    if broken != "no_qr":
+        x, y = rng.randint(40, 120), rng.randint(600, 700)
+        rect = fitz.Rect(x, y, x + QR_SIZE_PT, y + QR_SIZE_PT)
+        matrix = qr_matrix(payload)
+        if placement == "raster":
+            slip.insert_image(rect, stream=raster_qr(matrix, QR_SIZE_PT, dpi, noise, rng))
+        else:
+            draw_vector_qr(slip, matrix, rect)
+        expected = payload
+
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return {
+        "file": os.path.basename(path),
+        "pages": pages,
+        "images": images,
+        "placement": placement if expected else None,
+        "dpi": dpi if expected and placement == "raster" else None,
+        "noise": noise if expected and placement == "raster" else None,
+        "payload": broken or "valid",
+        "expected_qr": expected,
+    }
+
+
+def make_statement_pdf(path, rng, pages, vector_ratio=0.2, dpi=200):
+    """Writes a consolidated statement with one UPN slip per page and returns its manifest entry."""
+    doc = fitz.open()
+    logo = decoy_image(rng, 290, 100)
+    expected = []
+    for page_number in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        page.insert_text((50, 60), f"Zbirni račun – stran {page_number + 1}/{pages}", fontsize=16)
+        page.insert_image(fitz.Rect(400, 30, 545, 80), stream=logo)
+        fill_text(page, rng, 90, 480)
+        page.draw_line((30, 520), (565, 520), dashes="[3] 0")
+        page.insert_text((50, 545), "UPN – univerzalni plačilni nalog", fontsize=11)
+        payload = make_payload(rng)
+        x, y = rng.randint(40, 120), rng.randint(600, 700)
+        rect = fitz.Rect(x, y, x + QR_SIZE_PT, y + QR_SIZE_PT)
+        if rng.random() < vector_ratio:
+            draw_vector_qr(page, qr_matrix(payload), rect)
+        else:
+            page.insert_image(rect, stream=raster_qr(qr_matrix(payload), QR_SIZE_PT, dpi, 0.0, rng))
+        expected.append(payload)
+
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return {"file": os.path.basename(path), "pages": pages, "statement": True, "expected_qr": expected}
+
+
+def generate_corpus(output_dir, count, seed=0, broken_ratio=0.1, vector_ratio=0.2):
+    """Writes count invoice PDFs plus a corpus.json manifest to output_dir and returns the manifest."""
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    for i in range(count):
+        broken = rng.choice(BROKEN_KINDS) if rng.random() < broken_ratio else None
+        entry = make_invoice_pdf(
+            os.path.join(output_dir, f"invoice_{i:05d}.pdf"), rng,
+            pages=rng.choice([1, 1, 1, 2, 3, 5]),
+            images=rng.choice([0, 0, 1, 1, 2, 4]),
+            placement="vector" if rng.random() < vector_ratio else "raster",
+            dpi=rng.choice(DPIS),
+            noise=rng.choice(NOISE_LEVELS),
+            broken=broken,
+        )
+        files.append(entry)
+
+    manifest = {"seed": seed, "count": count, "broken_ratio": broken_ratio,
+                "vector_ratio": vector_ratio, "files": files}
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir")
+    parser.add_argument("-n", "--invoices", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--broken", type=float, default=0.1, help="Share of invoices with a broken payload")
+    parser.add_argument("--vector", type=float, default=0.2, help="Share of QR codes drawn as vector paths")
+    parser.add_argument("--statement", type=int, metavar="PAGES",
+                        help="Also write statement.pdf with one UPN slip on each of PAGES pages")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.output_dir, args.invoices, args.seed, args.broken, args.vector)
+    print(f"Wrote {len(manifest['files'])} invoices to {args.output_dir}")
+    if args.statement:
+        entry = make_statement_pdf(os.path.join(args.output_dir, "statement.pdf"), random.Random(args.seed),
+                                   args.statement, args.vector)
+        with open(os.path.join(args.output_dir, "statement.json"), "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        print(f"Wrote a {args.statement} page statement to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,11 @@ import argparse
 import os
 import sys
 import logging
-from datetime import datetime
-import inquirer
-from src.pdf_handler.handler import extract_images
-from src.qr_code_processor.processor import decode_qr_code, parse_upnqr_data
-from src.xml_generator.generator import generate_eslog_xml, map_upnqr_to_eslog
+import multiprocessing
+# Only what --help and argument parsing need is imported here; each mode
+# imports its own modules, so e.g. --serve never loads inquirer and --help
+# loads neither PyMuPDF, Pillow, pyzbar nor lxml
+from src.watch.watcher import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL
 
 # Configure logging
 logging.basicConfig(
@@ -18,15 +18,155 @@ logger = logging.getLogger(__name__)
 def main():
     parser = argparse.ArgumentParser(
         description="Convert PDF invoices with UPNQR codes to e-SLOG 2.0 XML format.",
-        epilog="Example: python main.py invoice.pdf"
+        epilog="Example: python main.py invoices/*.pdf -j 8 --output-dir xml/"
     )
     parser.add_argument("-o", "--output", help="Output XML file path (default: same as input with .xml extension)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
+    parser.add_argument("inputs", nargs="*", help="PDF files, directories or glob patterns to convert without prompting (batch mode)")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of worker processes in batch and service mode (default: number of CPUs)")
+    parser.add_argument("--output-dir", help="Directory for XML files in batch mode (default: next to each PDF)")
+    parser.add_argument("--archive", help="Stream all XML files of a batch into one .zip/.tar/.tar.gz archive, a directory with a manifest, or '-' for stdout")
+    parser.add_argument("--summary", help="Write a JSON summary of the batch run to this path")
+    parser.add_argument("--cache-dir", help="Directory of a persistent result cache used in batch and service mode")
+    parser.add_argument("--cache-size", type=int, default=256, help="Maximum cache size in MB (default: 256)")
+    parser.add_argument("--fast-xml", action="store_true", help="Render XML from a pre-compiled template instead of lxml in batch mode (identical output)")
+    parser.add_argument("--validate", action="store_true", help="Validate every generated invoice against the e-SLOG 2.0 XSD and report the errors")
+    parser.add_argument("--strict", action="store_true", help="Like --validate, but treat an invoice that fails validation as a failed conversion")
+    parser.add_argument("--schema", help="Path to the e-SLOG 2.0 XSD (default: src/xml_generator/schemas/eSLOG20_INVOIC_v200.xsd)")
+    parser.add_argument("--suppliers", help="CSV file or SQLite database of suppliers with their VAT ID, legal ID and default tax rate")
+    parser.add_argument("--export", help="Also write every parsed UPNQR payload as one row of a .csv file or .parquet dataset (batch mode)")
+    parser.add_argument("--export-append", action="store_true", help="Add the rows to an existing --export file instead of replacing it")
+    parser.add_argument("--metrics", action="store_true", help="Time every pipeline stage and log one structured metrics record per document")
+    parser.add_argument("--metrics-file", help="Write the batch metrics in the Prometheus text format to this path (implies --metrics)")
+    parser.add_argument("--statsd", metavar="HOST:PORT", help="Send per-document metrics to a StatsD server (implies --metrics)")
+    parser.add_argument("--profile-dir", help="Write a cProfile .prof file per document to this directory (implies --metrics)")
+    parser.add_argument("--trace-memory", action="store_true", help="Record the peak Python memory of each document with tracemalloc (implies --metrics)")
+    parser.add_argument("--statement", action="store_true", help="Find every UPNQR slip in each PDF (e.g. a consolidated statement) and write one invoice per slip, scanning pages in parallel")
+    parser.add_argument("--journal", help="Run the batch as a resumable job: journal every file's outcome to this JSONL file, convert each PDF in an isolated worker, and skip what an earlier run finished")
+    parser.add_argument("--retries", type=int, default=2, help="With --journal, attempts after the first for a failed PDF, with doubling delays (default: 2)")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="With --journal, seconds before the first retry (default: 1)")
+    parser.add_argument("--quarantine", help="With --journal, move PDFs that failed every attempt to this directory")
+    parser.add_argument("--max-memory", type=int, default=1024, help="With --journal, address space limit of a worker in MB, 0 for none (default: 1024)")
+    parser.add_argument("--watch", action="store_true", help="Watch the input directories and convert new or changed PDFs as they arrive")
+    parser.add_argument("--once", action="store_true", help="With --watch, convert the new and changed PDFs once and exit instead of watching")
+    parser.add_argument("--poll", action="store_true", help="With --watch, detect new files by rescanning instead of inotify")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help=f"Seconds between rescans with --poll (default: {DEFAULT_POLL_INTERVAL:g})")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help=f"Seconds a file must stay unchanged before --watch converts it (default: {DEFAULT_DEBOUNCE:g})")
+    parser.add_argument("--index", help="Index of converted files for --watch (default: .eslog-index.sqlite3 in the first directory)")
+    parser.add_argument("--serve", action="store_true", help="Run as an HTTP conversion service (POST a PDF to /convert)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the HTTP service listens on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port the HTTP service listens on (default: 8080)")
+    parser.add_argument("--max-queue", type=int, default=32, help="Requests allowed to wait for a worker before the service answers 503 (default: 32)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a conversion request is answered with 504, or a --journal worker is stopped (default: 30)")
+    parser.add_argument("--max-body-size", type=int, default=20, help="Largest accepted PDF upload in MB (default: 20)")
     
     args = parser.parse_args()
     
     if args.verbose:
-        logger.setLevel(logging.DEBUG)
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    metrics_options = None
+    if args.metrics or args.metrics_file or args.statsd or args.profile_dir or args.trace_memory:
+        metrics_options = {"profile_dir": args.profile_dir, "trace_memory": args.trace_memory}
+
+    validation = 'strict' if args.strict else 'report' if args.validate else None
+    if validation:
+        from src.xml_generator.validation import load_schema, SchemaNotFoundError
+        try:
+            load_schema(args.schema)
+        except SchemaNotFoundError as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+    if args.suppliers:
+        import sqlite3
+        from src.suppliers.registry import load_registry, SupplierRegistryError
+        try:
+            load_registry(args.suppliers)
+        except (SupplierRegistryError, OSError, sqlite3.Error) as e:
+            logger.error(f"Cannot load the supplier registry: {e}")
+            sys.exit(1)
+
+    # ─── HTTP service mode ───
+    if args.serve:
+        from src.server.app import run_server
+        run_server(host=args.host, port=args.port, workers=args.jobs, max_queue=args.max_queue,
+                   timeout=args.timeout, max_body_bytes=args.max_body_size * 1024 * 1024,
+                   cache_dir=args.cache_dir, cache_max_bytes=args.cache_size * 1024 * 1024,
+                   metrics_options=metrics_options, statsd=args.statsd, suppliers_path=args.suppliers)
+        return
+
+    # ─── Watch mode ───
+    if args.watch:
+        if not args.inputs:
+            logger.error("--watch needs at least one directory to watch.")
+            sys.exit(1)
+        from src.watch.watcher import InboxWatcher
+        try:
+            watcher = InboxWatcher(args.inputs, output_dir=args.output_dir, jobs=args.jobs, index_path=args.index,
+                                   debounce=args.debounce, poll=args.poll, poll_interval=args.poll_interval,
+                                   cache_dir=args.cache_dir, cache_max_bytes=args.cache_size * 1024 * 1024,
+                                   fast_xml=args.fast_xml, validation=validation, schema_path=args.schema,
+                                   metrics_options=metrics_options, suppliers_path=args.suppliers)
+        except NotADirectoryError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        result = watcher.run(once=args.once)
+        logger.info(f"Converted {result['converted']} files, {result['failed']} failed")
+        sys.exit(1 if args.once and result["failed"] else 0)
+
+    # ─── Statement mode: one invoice per slip ───
+    if args.statement:
+        if not args.inputs:
+            logger.error("--statement needs at least one PDF file or directory.")
+            sys.exit(1)
+        from src.pipeline.statement import run_statements
+        summary = run_statements(args.inputs, jobs=args.jobs, output_dir=args.output_dir, summary_path=args.summary,
+                                 fast_xml=args.fast_xml, validation=validation, schema_path=args.schema,
+                                 suppliers_path=args.suppliers)
+        if not summary["documents"]:
+            logger.error("No PDF files matched the given inputs.")
+            sys.exit(1)
+        sys.exit(1 if summary["failed"] else 0)
+
+    # ─── Resumable job mode ───
+    if args.journal:
+        if not args.inputs:
+            logger.error("--journal needs at least one PDF file or directory.")
+            sys.exit(1)
+        if args.archive or args.export:
+            logger.error("--journal cannot be combined with --archive or --export, which cannot be resumed.")
+            sys.exit(1)
+        from src.pipeline.jobs import run_job
+        try:
+            summary = run_job(args.inputs, args.journal, jobs=args.jobs, output_dir=args.output_dir,
+                              summary_path=args.summary, retries=args.retries, retry_delay=args.retry_delay,
+                              timeout=args.timeout, max_memory=args.max_memory * 1024 * 1024,
+                              quarantine_dir=args.quarantine, cache_dir=args.cache_dir,
+                              cache_max_bytes=args.cache_size * 1024 * 1024, fast_xml=args.fast_xml,
+                              validation=validation, schema_path=args.schema, metrics_options=metrics_options,
+                              metrics_file=args.metrics_file, statsd=args.statsd, suppliers_path=args.suppliers)
+        except KeyboardInterrupt:
+            sys.exit(1)
+        if not summary["total"]:
+            logger.error("No PDF files matched the given inputs.")
+            sys.exit(1)
+        sys.exit(1 if summary["failed"] or summary["quarantined"] else 0)
+
+    # ─── Headless batch mode ───
+    if args.inputs:
+        from src.pipeline.batch import run_batch
+        summary = run_batch(args.inputs, jobs=args.jobs, output_dir=args.output_dir, summary_path=args.summary,
+                            cache_dir=args.cache_dir, cache_max_bytes=args.cache_size * 1024 * 1024,
+                            fast_xml=args.fast_xml, archive=args.archive,
+                            validation=validation, schema_path=args.schema,
+                            metrics_options=metrics_options, metrics_file=args.metrics_file, statsd=args.statsd,
+                            export_path=args.export, export_append=args.export_append,
+                            suppliers_path=args.suppliers)
+        if not summary["total"]:
+            logger.error("No PDF files matched the given inputs.")
+            sys.exit(1)
+        sys.exit(1 if summary["failed"] else 0)
 
      # ─── Determine the “base” folder ───
     if getattr(sys, 'frozen', False):
@@ -39,6 +179,15 @@ def main():
     os.chdir(base_dir)
     logger.debug(f"Working directory set to: {base_dir}")
 
+    # ─── Interactive mode ───
+    import inquirer
+    from src.qr_code_processor.upnqr import parse_upnqr_data
+    from src.xml_generator.generator import build_eslog_tree, serialize_eslog_tree, map_upnqr_to_eslog
+    from src.xml_generator.validation import validate_tree
+    from src.suppliers.registry import load_registry
+    from src.pipeline.converter import find_qr_data
+    from src.metrics import registry as metrics
+
     # ─── List PDF files from that folder ───
     pdf_files = [f for f in os.listdir(base_dir) if f.lower().endswith('.pdf')]
 
@@ -57,78 +206,82 @@ def main():
 
 
     logger.info(f"Processing {pdf_file}...")
+    if metrics_options is not None:
+        metrics.enable(**metrics_options)
     
     try:
-        # 1. Extract images from PDF
-        logger.info("Extracting images from PDF...")
-        pdf_images = extract_images(pdf_file)
-        logger.info(f"Found {len(pdf_images)} images in PDF")
+        with metrics.document(pdf_file):
+            # 1-2. Extract images from PDF and decode the first QR code found
+            logger.info("Searching PDF images for a QR code...")
+            qr_data = find_qr_data(pdf_file)
         
-        # 2. Find and decode QR code
-        qr_data = None
-        for i, image in enumerate(pdf_images):
-            logger.debug(f"Trying to decode QR code from image {i+1}...")
-            qr_data = decode_qr_code(image)
-            if qr_data:
-                logger.info(f"Successfully decoded QR code from image {i+1}")
-                break
+            if not qr_data:
+                logger.error("Error: No QR code found in the PDF.")
+                logger.info("Make sure the PDF contains a valid UPNQR code.")
+                sys.exit(1)
         
-        if not qr_data:
-            logger.error("Error: No QR code found in the PDF.")
-            logger.info("Make sure the PDF contains a valid UPNQR code.")
-            sys.exit(1)
-        
-        logger.debug(f"QR data:\n{qr_data}")
-        
-        # 3. Parse UPNQR data
-        logger.info("Parsing UPNQR data...")
-        upnqr_data = parse_upnqr_data(qr_data)
-        if not upnqr_data:
-            logger.error("Error: Could not parse UPNQR data. Invalid format.")
-            sys.exit(1)
+            logger.debug(f"QR data:\n{qr_data}")
         
-        logger.info(f"Successfully parsed UPNQR data:")
-        logger.info(f"  - Payer: {upnqr_data.get('ime_placnika', 'N/A')}")
-        logger.info(f"  - Receiver: {upnqr_data.get('ime_prejemnika', 'N/A')}")
-        logger.info(f"  - Amount: €{upnqr_data.get('znesek', 0):.2f}")
-        logger.info(f"  - Due date: {upnqr_data.get('rok_placila', 'N/A')}")
+            # 3. Parse UPNQR data
+            logger.info("Parsing UPNQR data...")
+            with metrics.stage("parse"):
+                upnqr_data = parse_upnqr_data(qr_data)
+            if not upnqr_data:
+                logger.error("Error: Could not parse UPNQR data. Invalid format.")
+                sys.exit(1)
         
-        # 4. Map UPNQR data to e-SLOG fields
-        logger.info("Mapping UPNQR data to e-SLOG format...")
-        eslog_data = map_upnqr_to_eslog(upnqr_data)
+            logger.info(f"Successfully parsed UPNQR data:")
+            logger.info(f"  - Payer: {upnqr_data.get('ime_placnika', 'N/A')}")
+            logger.info(f"  - Receiver: {upnqr_data.get('ime_prejemnika', 'N/A')}")
+            logger.info(f"  - Amount: €{upnqr_data.get('znesek', 0):.2f}")
+            logger.info(f"  - Due date: {upnqr_data.get('rok_placila', 'N/A')}")
         
-        # 5. Log final data summary
-        logger.info(f"Final invoice data:")
-        logger.info(f"  - Invoice Number: {eslog_data.get('InvoiceNumber', 'N/A')}")
-        logger.info(f"  - Seller: {eslog_data.get('SellerName', 'N/A')}")
-        logger.info(f"  - Seller VAT ID: {eslog_data.get('SellerVATID', 'N/A')}")
-        logger.info(f"  - Buyer: {eslog_data.get('BuyerName', 'N/A')}")
-        logger.info(f"  - Amount: €{eslog_data.get('Amount', 0):.2f}")
-        logger.info(f"  - Due Date: {eslog_data.get('DueDate', 'N/A')}")
+            # 4. Map UPNQR data to e-SLOG fields
+            logger.info("Mapping UPNQR data to e-SLOG format...")
+            with metrics.stage("map"):
+                eslog_data = map_upnqr_to_eslog(upnqr_data, load_registry(args.suppliers))
         
-        # 6. Generate e-SLOG XML
-        logger.info("Generating e-SLOG 2.0 XML...")
-        xml_output = generate_eslog_xml(eslog_data)
+            # 5. Log final data summary
+            logger.info(f"Final invoice data:")
+            logger.info(f"  - Invoice Number: {eslog_data.get('InvoiceNumber', 'N/A')}")
+            logger.info(f"  - Seller: {eslog_data.get('SellerName', 'N/A')}")
+            logger.info(f"  - Seller VAT ID: {eslog_data.get('SellerVATID', 'N/A')}")
+            logger.info(f"  - Buyer: {eslog_data.get('BuyerName', 'N/A')}")
+            logger.info(f"  - Amount: €{eslog_data.get('Amount', 0):.2f}")
+            logger.info(f"  - Due Date: {eslog_data.get('DueDate', 'N/A')}")
         
-        # 7. Save the XML file
-        output_filename = args.output or os.path.splitext(pdf_file)[0] + ".xml"
+            # 6. Generate e-SLOG XML
+            logger.info("Generating e-SLOG 2.0 XML...")
+            with metrics.stage("generate"):
+                root = build_eslog_tree(eslog_data)
+
+            # Validate the invoice tree against the XSD before it is written
+            if validation:
+                with metrics.stage("validate"):
+                    report = validate_tree(root, args.schema)
+                if report["valid"]:
+                    logger.info("Generated XML is valid e-SLOG 2.0")
+                else:
+                    for error in report["errors"]:
+                        logger.warning(f"XSD validation: {error['path']}: {error['message']}")
+                    if validation == 'strict':
+                        logger.error("Error: Generated XML does not validate against the e-SLOG 2.0 schema.")
+                        sys.exit(1)
+
+            with metrics.stage("generate"):
+                xml_output = serialize_eslog_tree(root)
         
-        logger.info(f"Saving XML to {output_filename}...")
-        with open(output_filename, "w", encoding="utf-8") as f:
-            f.write(xml_output)
+            # 7. Save the XML file
+            output_filename = args.output or os.path.splitext(pdf_file)[0] + ".xml"
         
-        logger.info(f"Successfully generated {output_filename}")
-        logger.info(f"File size: {os.path.getsize(output_filename)} bytes")
+            logger.info(f"Saving XML to {output_filename}...")
+            with metrics.stage("write"), open(output_filename, "w", encoding="utf-8") as f:
+                f.write(xml_output)
         
-        # Optional: Validate the generated XML
-        try:
-            from lxml import etree
-            doc = etree.fromstring(xml_output.encode('utf-8'))
-            logger.info("Generated XML is well-formed")
-        except Exception as e:
-            logger.warning(f"XML validation warning: {e}")
+            logger.info(f"Successfully generated {output_filename}")
+            logger.info(f"File size: {os.path.getsize(output_filename)} bytes")
         
-        logger.info("✓ Generated e-SLOG 2.0 compliant XML")
+            logger.info("✓ Generated e-SLOG 2.0 compliant XML")
         
     except KeyboardInterrupt:
         logger.info("Operation cancelled by user")
@@ -138,4 +291,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Needed for the batch process pool in PyInstaller builds
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -8,6 +8,11 @@ from PyInstaller.utils.hooks import copy_metadata
 # Collect metadata for required packages
 datas = copy_metadata('readchar') + copy_metadata('inquirer')
 
+# Bundle the e-SLOG XSD for --validate if it has been placed in the source tree
+schema_dir = os.path.join('src', 'xml_generator', 'schemas')
+if os.path.isdir(schema_dir):
+    datas.append((schema_dir, schema_dir))
+
 # Add ZBar DLLs for Windows
 binaries = []
 if sys.platform == 'win32':
@@ -59,6 +64,9 @@ a = Analysis(
     pathex=[],
     binaries=binaries,  # Include the ZBar DLLs
     datas=datas,
+    # fitz, PIL, pyzbar, lxml and inquirer are imported inside the functions that
+    # use them so the executable starts quickly; PyInstaller still finds those
+    # imports, pyzbar is listed because it loads libzbar through ctypes
     hiddenimports=[
         'pyzbar', 
         'pyzbar.pyzbar', 
@@ -69,7 +77,8 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Standard library packages nothing in the tool uses, kept out of the archive
+    excludes=['tkinter', 'unittest', 'pydoc', 'test'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -0,0 +1,13 @@
+__version__ = "1.1.0"
+
+# Version of what a conversion produces (the parsed record and the XML).
+# Bump it with every change to either; cached results carry it and entries
+# of another output version are not served.
+#   2: UPNQR records replaced the parsed dicts
+#   3: amounts in integer cents with EN 16931 rounding
+OUTPUT_VERSION = 3
+
+# Version of the QR decoding (image extraction, decoders and the retry
+# ladder). Cached QR payloads carry it instead of OUTPUT_VERSION, since a
+# decoded payload does not depend on the XML that is generated from it.
+DECODER_VERSION = 1
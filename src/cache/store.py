@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from functools import lru_cache
+from src import __version__, DECODER_VERSION, OUTPUT_VERSION
+
+# Default upper bound for the cache database contents
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Stored with every document entry; entries of another converter or output version are misses
+CACHE_VERSION = f"{__version__}/{OUTPUT_VERSION}"
+
+# Stored with every QR payload entry; entries of another decoder version are misses
+PAYLOAD_VERSION = str(DECODER_VERSION)
+
+# Fraction of max_bytes the cache is trimmed down to when it overflows
+EVICT_TARGET = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    pdf_hash TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    upnqr_data TEXT NOT NULL,
+    xml TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS qr_payloads (
+    image_hash TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    payload TEXT,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    retried INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS documents_last_access ON documents (last_access);
+CREATE INDEX IF NOT EXISTS qr_payloads_last_access ON qr_payloads (last_access);
+"""
+
+
+def hash_bytes(data):
+    """Returns the hex SHA-256 digest of a bytes-like object."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Returns the hex SHA-256 digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Persistent two-level conversion cache stored in SQLite under cache_dir.
+
+    Level 1 maps a PDF content hash to the parsed UPNQR data and the
+    generated XML. Level 2 maps an embedded image hash to its decoded QR
+    payload, or to None for images known not to contain a QR code.
+
+    Documents written by another converter version or output version
+    (CACHE_VERSION), and payloads written by another decoder version
+    (PAYLOAD_VERSION), are treated as misses.
+    When the stored data grows past max_bytes, the least recently used
+    entries are evicted. The database runs in WAL mode so that several
+    batch worker processes can share it.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, version=CACHE_VERSION,
+                 payload_version=PAYLOAD_VERSION):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "cache.sqlite3")
+        self.max_bytes = max_bytes
+        self.version = version
+        self.payload_version = payload_version
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._size = self._total_size()
+
+    def _migrate(self):
+        # Older databases lack the retried column; their payload rows
+        # carry an old version string and are never served anyway
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(qr_payloads)")]
+        if "retried" not in columns:
+            try:
+                self._conn.execute(
+                    "ALTER TABLE qr_payloads ADD COLUMN retried INTEGER NOT NULL DEFAULT 0"
+                )
+            except sqlite3.OperationalError:
+                pass  # Added by another worker in the meantime
+
+    def _total_size(self):
+        query = ("SELECT (SELECT COALESCE(SUM(size), 0) FROM documents) + "
+                 "(SELECT COALESCE(SUM(size), 0) FROM qr_payloads)")
+        return self._conn.execute(query).fetchone()[0]
+
+    def get_document(self, pdf_hash):
+        """Returns {'upnqr_data': dict, 'xml': str} for a PDF hash, or None."""
+        row = self._conn.execute(
+            "SELECT upnqr_data, xml FROM documents WHERE pdf_hash = ? AND version = ?",
+            (pdf_hash, self.version),
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE documents SET last_access = ? WHERE pdf_hash = ?", (time.time(), pdf_hash)
+        )
+        return {"upnqr_data": json.loads(row[0]), "xml": row[1]}
+
+    def put_document(self, pdf_hash, upnqr_data, xml):
+        """Stores the parsed UPNQR data and generated XML for a PDF hash."""
+        upnqr_json = json.dumps(dict(upnqr_data), ensure_ascii=False)
+        size = len(upnqr_json.encode("utf-8")) + len(xml.encode("utf-8"))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+            (pdf_hash, self.version, upnqr_json, xml, size, time.time()),
+        )
+        self._grow(size)
+
+    def get_qr_payload(self, image_hash, retried=False):
+        """Returns (found, payload) for an image hash. payload is None for images without a QR code.
+
+        With retried, an image without a QR code is only found if it also
+        went through the preprocessing retry ladder.
+        """
+        row = self._conn.execute(
+            "SELECT payload, retried FROM qr_payloads WHERE image_hash = ? AND version = ?",
+            (image_hash, self.payload_version),
+        ).fetchone()
+        if row is None or (retried and row[0] is None and not row[1]):
+            return False, None
+        self._conn.execute(
+            "UPDATE qr_payloads SET last_access = ? WHERE image_hash = ?", (time.time(), image_hash)
+        )
+        return True, row[0]
+
+    def put_qr_payload(self, image_hash, payload, retried=False):
+        """Stores the decoded QR payload (or None) for an image hash.
+
+        retried records that the preprocessing retry ladder ran on the image.
+        """
+        size = len(image_hash) + (len(payload.encode("utf-8")) if payload else 0)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO qr_payloads VALUES (?, ?, ?, ?, ?, ?)",
+            (image_hash, self.payload_version, payload, size, time.time(), int(retried)),
+        )
+        self._grow(size)
+
+    def _grow(self, size):
+        self._size += size
+        if self._size > self.max_bytes:
+            # Other workers write to the same database, so recount before evicting
+            self._size = self._total_size()
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def evict(self, target_bytes=None):
+        """Deletes least recently used entries until the cache holds at most target_bytes."""
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * EVICT_TARGET)
+        rows = self._conn.execute(
+            "SELECT 'documents', pdf_hash, size, last_access FROM documents "
+            "UNION ALL SELECT 'qr_payloads', image_hash, size, last_access FROM qr_payloads "
+            "ORDER BY last_access"
+        )
+        to_delete = []
+        size = self._size
+        for table, key, entry_size, _ in rows:
+            if size <= target_bytes:
+                break
+            to_delete.append((table, key))
+            size -= entry_size
+        rows.close()
+
+        self._conn.execute("BEGIN")
+        for table, key in to_delete:
+            column = "pdf_hash" if table == "documents" else "image_hash"
+            self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+        self._conn.execute("COMMIT")
+        self._size = size
+
+    def close(self):
+        self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def open_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Returns the ResultCache for cache_dir, opened once per process."""
+    return ResultCache(cache_dir, max_bytes)
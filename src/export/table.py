@@ -0,0 +1,174 @@
+"""Bulk export of parsed UPNQR payloads as one table for analytics.
+
+Records are accumulated into per-column lists and written in chunks of
+chunk_rows rows, so memory use is bounded by the chunk size and not by
+the number of invoices. Two formats are supported:
+
+    *.csv      one CSV file with a header row
+    *.parquet  a Parquet dataset directory (needs pyarrow); every writer
+               session adds one part file of chunk_rows sized row groups.
+               pandas.read_parquet / pyarrow.dataset read the directory
+               as one table.
+
+Both formats write the same values: dates as YYYY-MM-DD, and dates the
+payload did not carry in a valid DD.MM.YYYY form as empty (CSV) or null
+(Parquet).
+
+With append, a daily run adds its rows to the existing CSV file or
+dataset instead of replacing it, so a monthly report never has to go back
+to the PDFs.
+"""
+import os
+import csv
+import glob
+from datetime import date
+
+# Exported columns: (name, type) with type 'string', 'int' (amount in cents) or 'date' (YYYY-MM-DD)
+COLUMNS = (
+    ("source", "string"),
+    ("stevilka_racuna", "string"),
+    ("znesek_centi", "int"),
+    ("koda_namena", "string"),
+    ("namen", "string"),
+    ("rok_placila", "date"),
+    ("datum_placila", "date"),
+    ("iban_placnika", "string"),
+    ("referenca_placnika", "string"),
+    ("ime_placnika", "string"),
+    ("ulica_placnika", "string"),
+    ("kraj_placnika", "string"),
+    ("iban_prejemnika", "string"),
+    ("referenca_prejemnika", "string"),
+    ("ime_prejemnika", "string"),
+    ("ulica_prejemnika", "string"),
+    ("kraj_prejemnika", "string"),
+    ("nujno", "string"),
+    ("polog", "string"),
+    ("dvig", "string"),
+)
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+DEFAULT_CHUNK_ROWS = 10000
+
+
+def detect_format(path):
+    """Returns the export format ('csv' or 'parquet') for a target path."""
+    lower = path.lower().rstrip("/\\")
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith(".parquet"):
+        return "parquet"
+    raise ValueError(f"Cannot tell the export format of {path}; use a .csv or .parquet path")
+
+
+def _parse_date(value):
+    """Returns a date for YYYY-MM-DD, or None (dates the payload did not carry in DD.MM.YYYY)."""
+    if not value or len(value) != 10:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class InvoiceTableWriter:
+    """Accumulates parsed UPNQR records into column arrays and writes them in chunks.
+
+    Usage:
+        with InvoiceTableWriter("invoices.csv", append=True) as table:
+            for pdf_path, record in parsed:
+                table.add(record, source=pdf_path)
+    """
+
+    def __init__(self, path, output_format=None, chunk_rows=DEFAULT_CHUNK_ROWS, append=False):
+        self.path = path
+        self.format = output_format or detect_format(path)
+        self.chunk_rows = chunk_rows
+        self.append = append
+        self.rows = 0
+        self._columns = {name: [] for name in COLUMN_NAMES}
+        self._file = None
+        self._csv = None
+        self._parquet = None
+        self._arrow_schema = None
+
+        if self.format == "csv":
+            self._open_csv()
+        elif self.format == "parquet":
+            self._open_parquet()
+        else:
+            raise ValueError(f"Unknown export format: {self.format}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open_csv(self):
+        exists = self.append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        if exists:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), None)
+            if header != COLUMN_NAMES:
+                raise ValueError(f"Cannot append to {self.path}: its columns differ from the export columns")
+        self._file = open(self.path, "a" if exists else "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+        if not exists:
+            self._csv.writerow(COLUMN_NAMES)
+
+    def _open_parquet(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from None
+
+        types = {"string": pa.string(), "int": pa.int64(), "date": pa.date32()}
+        self._arrow_schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+        os.makedirs(self.path, exist_ok=True)
+        if not self.append:
+            for part in glob.glob(os.path.join(self.path, "part-*.parquet")):
+                os.remove(part)
+        # Part files sort by creation time; the pid keeps parallel writers apart
+        existing = len(glob.glob(os.path.join(self.path, "part-*.parquet")))
+        part_path = os.path.join(self.path, f"part-{existing:05d}-{os.getpid()}.parquet")
+        self._parquet = pq.ParquetWriter(part_path, self._arrow_schema, compression="zstd")
+
+    def add(self, record, source=None):
+        """Adds one parsed UPNQR record (UpnqrRecord or dict) as a row."""
+        columns = self._columns
+        columns["source"].append(source)
+        for name, kind in COLUMNS[1:]:
+            value = record.get(name)
+            if kind == "int":
+                value = int(value) if value else None
+            elif kind == "date":
+                value = _parse_date(value)
+            columns[name].append(value)
+        if len(columns["source"]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes the accumulated rows as one chunk."""
+        columns = self._columns
+        count = len(columns["source"])
+        if not count:
+            return
+        if self._csv is not None:
+            self._csv.writerows(zip(*(columns[name] for name in COLUMN_NAMES)))
+            self._file.flush()
+        else:
+            import pyarrow as pa
+            self._parquet.write_table(pa.table(columns, schema=self._arrow_schema))
+        self.rows += count
+        self._columns = {name: [] for name in COLUMN_NAMES}
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
@@ -0,0 +1,138 @@
+"""Exports pipeline metrics as Prometheus text or StatsD packets.
+
+prometheus_text renders a MetricsRegistry in the Prometheus text
+exposition format, for the service's /metrics endpoint or a file picked up
+by node_exporter's textfile collector (write_prometheus_file).
+StatsdClient sends each document record as StatsD timers and counters
+over UDP as it arrives.
+"""
+import os
+import socket
+import logging
+from src.metrics.registry import BUCKETS
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "pdf2eslog"
+
+# Keep StatsD datagrams below the common 512 byte safe UDP payload
+STATSD_PACKET_BYTES = 512
+
+
+def _histogram_lines(name, labels, histogram):
+    cumulative = 0
+    for bound, hits in zip(BUCKETS, histogram["buckets"]):
+        cumulative += hits
+        yield f'{name}_bucket{{{labels}le="{bound:g}"}} {cumulative}'
+    yield f'{name}_bucket{{{labels}le="+Inf"}} {histogram["count"]}'
+    labels = f'{{{labels.rstrip(",")}}}' if labels else ""
+    yield f'{name}_sum{labels} {histogram["sum"]:.6f}'
+    yield f'{name}_count{labels} {histogram["count"]}'
+
+
+def prometheus_text(registry, prefix=PREFIX):
+    """Returns the registry in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {prefix}_documents_total Documents converted, by status.",
+        f"# TYPE {prefix}_documents_total counter",
+    ]
+    with registry._lock:
+        for status, value in sorted(registry.documents.items()):
+            lines.append(f'{prefix}_documents_total{{status="{status}"}} {value}')
+
+        lines += [
+            f"# HELP {prefix}_document_seconds Wall time per document.",
+            f"# TYPE {prefix}_document_seconds histogram",
+        ]
+        lines.extend(_histogram_lines(f"{prefix}_document_seconds", "", registry.document_seconds))
+
+        lines += [
+            f"# HELP {prefix}_stage_seconds Wall time per document spent in each pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for name, entry in sorted(registry.stages.items()):
+            lines.extend(_histogram_lines(f"{prefix}_stage_seconds", f'stage="{name}",', entry))
+
+        lines += [
+            f"# HELP {prefix}_stage_cpu_seconds_total CPU time spent in each pipeline stage.",
+            f"# TYPE {prefix}_stage_cpu_seconds_total counter",
+        ]
+        for name, entry in sorted(registry.stages.items()):
+            lines.append(f'{prefix}_stage_cpu_seconds_total{{stage="{name}"}} {entry["cpu"]:.6f}')
+
+        lines += [
+            f"# HELP {prefix}_stage_calls_total Calls of each pipeline stage.",
+            f"# TYPE {prefix}_stage_calls_total counter",
+        ]
+        for name, entry in sorted(registry.stages.items()):
+            lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {entry["calls"]}')
+
+        for name, value in sorted(registry.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_file(registry, path, prefix=PREFIX):
+    """Writes prometheus_text to path atomically, so a collector never reads a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(registry, prefix))
+    os.replace(tmp_path, path)
+
+
+def parse_address(address, default_port=8125):
+    """Splits 'host:port' (or just 'host') into a (host, port) tuple."""
+    host, _, port = address.rpartition(":")
+    if not host:
+        return port, default_port
+    return host, int(port)
+
+
+class StatsdClient:
+    """Sends document records to a StatsD server over UDP.
+
+    Sending is fire-and-forget: a missing or unreachable server never
+    slows down or fails a conversion.
+    """
+
+    def __init__(self, address, prefix=PREFIX):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send_record(self, record):
+        p = self.prefix
+        lines = [
+            f"{p}.documents.{record['status']}:1|c",
+            f"{p}.document:{record['wall'] * 1000:.3f}|ms",
+        ]
+        for name, stats in record["stages"].items():
+            lines.append(f"{p}.stage.{name}:{stats['wall'] * 1000:.3f}|ms")
+            lines.append(f"{p}.stage_cpu.{name}:{stats['cpu'] * 1000:.3f}|ms")
+        for name, value in record["counters"].items():
+            lines.append(f"{p}.{name}:{value}|c")
+        self._send(lines)
+
+    def send_failure(self):
+        """Counts a failed document that has no metrics record."""
+        self._send([f"{self.prefix}.documents.failed:1|c"])
+
+    def _send(self, lines):
+        packet = ""
+        for line in lines:
+            if packet and len(packet) + len(line) + 1 > STATSD_PACKET_BYTES:
+                self._sendto(packet)
+                packet = ""
+            packet = f"{packet}\n{line}" if packet else line
+        if packet:
+            self._sendto(packet)
+
+    def _sendto(self, packet):
+        try:
+            self._socket.sendto(packet.encode("ascii", "replace"), self.address)
+        except OSError as e:
+            logger.debug(f"StatsD send failed: {e}")
+
+    def close(self):
+        self._socket.close()
@@ -0,0 +1,214 @@
+"""Per-stage timing and counters for the conversion pipeline.
+
+Instrumentation is off unless enable() is called in the process. While it
+is off, stage() returns a shared no-op context manager and count()
+returns right away, so the calls left in the pipeline cost a global
+lookup each.
+
+When it is on, every conversion run inside a document() block gets a
+record:
+
+    {"document": name, "status": "ok" | "failed", "wall": s, "cpu": s,
+     "stages": {stage: {"calls": n, "wall": s, "cpu": s}},
+     "counters": {name: n},
+     "peak_memory": bytes, "profile": path}   (with trace_memory / profile_dir)
+
+The record is logged as one structured line (logger "src.metrics.registry",
+with the record in the "metrics" attribute of the log record) and
+returned, so worker processes can hand it to the parent process, which
+merges it into a MetricsRegistry for export (see exporters.py).
+
+State is per process and assumes one document is converted at a time,
+which is how the batch and service workers run.
+"""
+import os
+import json
+import time
+import logging
+import cProfile
+import itertools
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the duration histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_options = None
+_current = None
+_NULL_STAGE = nullcontext()
+_profile_ids = itertools.count(1)
+
+
+def enable(profile_dir=None, trace_memory=False):
+    """Turns instrumentation on in this process.
+
+    profile_dir dumps a cProfile .prof file per document there.
+    trace_memory records each document's peak Python memory with tracemalloc.
+    """
+    global _options
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    _options = {"profile_dir": profile_dir, "trace_memory": trace_memory}
+
+
+def disable():
+    global _options
+    _options = None
+
+
+def enabled():
+    return _options is not None
+
+
+class _Stage:
+    __slots__ = ("stats", "wall", "cpu")
+
+    def __init__(self, record, name):
+        self.stats = record["stages"].get(name)
+        if self.stats is None:
+            self.stats = record["stages"][name] = {"calls": 0, "wall": 0.0, "cpu": 0.0}
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats["calls"] += 1
+        self.stats["wall"] += time.perf_counter() - self.wall
+        self.stats["cpu"] += time.process_time() - self.cpu
+        return False
+
+
+def stage(name):
+    """Returns a context manager timing one pipeline stage (wall and CPU time) of the current document."""
+    if _current is None:
+        return _NULL_STAGE
+    return _Stage(_current, name)
+
+
+def count(name, n=1):
+    """Adds n to a counter of the current document."""
+    if _current is not None:
+        counters = _current["counters"]
+        counters[name] = counters.get(name, 0) + n
+
+
+def _profile_path(name):
+    base = os.path.splitext(os.path.basename(name))[0] or "document"
+    return os.path.join(_options["profile_dir"], f"{base}-{os.getpid()}-{next(_profile_ids)}.prof")
+
+
+@contextmanager
+def document(name):
+    """Collects the stages and counters of one document conversion.
+
+    Yields the document's record, or None when instrumentation is off.
+    """
+    global _current
+    if _options is None:
+        yield None
+        return
+
+    record = {"document": name, "status": "ok", "stages": {}, "counters": {}}
+    profiler = None
+    if _options["profile_dir"]:
+        profiler = cProfile.Profile()
+    tracing = _options["trace_memory"] and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    previous, _current = _current, record
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "failed"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record["wall"] = round(time.perf_counter() - wall, 6)
+        record["cpu"] = round(time.process_time() - cpu, 6)
+        for stats in record["stages"].values():
+            stats["wall"] = round(stats["wall"], 6)
+            stats["cpu"] = round(stats["cpu"], 6)
+        _current = previous
+        if tracing:
+            record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if profiler is not None:
+            record["profile"] = _profile_path(name)
+            profiler.dump_stats(record["profile"])
+        logger.info(f"metrics {json.dumps(record, ensure_ascii=False)}", extra={"metrics": record})
+
+
+def _histogram():
+    return {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0}
+
+
+def _observe(histogram, value):
+    histogram["count"] += 1
+    histogram["sum"] += value
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram["buckets"][i] += 1
+            break
+
+
+class MetricsRegistry:
+    """Aggregates document records, e.g. from many worker processes, for export.
+
+    Per stage it keeps a histogram of the wall time spent in the stage per
+    document plus total CPU time and calls; counters are summed.
+    Histogram buckets are stored non-cumulatively.
+    """
+
+    def __init__(self):
+        self.documents = {"ok": 0, "failed": 0}
+        self.document_seconds = _histogram()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.documents[record["status"]] = self.documents.get(record["status"], 0) + 1
+            _observe(self.document_seconds, record["wall"])
+            for name, stats in record["stages"].items():
+                entry = self.stages.get(name)
+                if entry is None:
+                    entry = self.stages[name] = dict(_histogram(), cpu=0.0, calls=0)
+                _observe(entry, stats["wall"])
+                entry["cpu"] += stats["cpu"]
+                entry["calls"] += stats["calls"]
+            for name, value in record["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_failure(self):
+        """Counts a failed document whose record was lost with its worker."""
+        with self._lock:
+            self.documents["failed"] += 1
+
+    def snapshot(self):
+        """Returns a JSON-serializable summary: documents, per-stage totals and counters."""
+        with self._lock:
+            return {
+                "documents": dict(self.documents),
+                "document_seconds": round(self.document_seconds["sum"], 6),
+                "stages": {
+                    name: {
+                        "documents": entry["count"],
+                        "calls": entry["calls"],
+                        "wall": round(entry["sum"], 6),
+                        "cpu": round(entry["cpu"], 6),
+                    }
+                    for name, entry in self.stages.items()
+                },
+                "counters": dict(self.counters),
+            }
@@ -1,17 +1,165 @@
-import fitz  # PyMuPDF
-from PIL import Image
 import io
+import os
+import mmap
+import stat
+from src.pdf_handler.ranking import rank_images
+from src.metrics import registry as metrics
+
+# Largest PDF opened by default; bigger inputs are rejected before they are read
+MAX_PDF_BYTES = 256 * 1024 * 1024
+
+class PdfTooLargeError(ValueError):
+    """Raised when a PDF input is larger than the allowed maximum."""
+
+def check_pdf_size(name, size, max_bytes=MAX_PDF_BYTES):
+    """Raises PdfTooLargeError if size is larger than max_bytes (None for no limit)."""
+    if max_bytes is not None and size > max_bytes:
+        raise PdfTooLargeError(f"{name} is larger than the {max_bytes / 1048576:.1f} MB limit")
+
+def _map_or_read(stream, max_bytes):
+    """Memory-maps a file object backed by a regular file, or reads any other stream once."""
+    try:
+        fd = stream.fileno()
+        info = os.fstat(fd)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        info = None
+    if info is not None and stat.S_ISREG(info.st_mode) and info.st_size:
+        check_pdf_size(getattr(stream, "name", "PDF"), info.st_size, max_bytes)
+        return memoryview(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))
+    # Pipes, sockets and in-memory streams: read at most one byte past the limit
+    return stream.read(-1 if max_bytes is None else max_bytes + 1)
+
+def pdf_source(pdf, max_bytes=MAX_PDF_BYTES):
+    """Returns a PDF input as a file path or a buffer fitz can open without copying it.
+
+    pdf may be a path, bytes, bytearray, memoryview, mmap or a binary file
+    object. bytearray, mmap and BytesIO contents are wrapped in a memoryview
+    (fitz would copy bytearray and BytesIO); file objects of regular files
+    are memory-mapped, so the OS pages the PDF in as MuPDF reads it. Other
+    streams, e.g. an email attachment, are read once.
+
+    Raises PdfTooLargeError if the PDF is larger than max_bytes (None for no limit).
+    """
+    if isinstance(pdf, (str, os.PathLike)):
+        path = os.fspath(pdf)
+        check_pdf_size(path, os.path.getsize(path), max_bytes)
+        return path
+    if isinstance(pdf, bytes):
+        source = pdf
+    elif isinstance(pdf, (bytearray, memoryview, mmap.mmap)):
+        source = memoryview(pdf)
+    elif isinstance(pdf, io.BytesIO):
+        # No copy for a BytesIO that was written to, e.g. by an email or HTTP parser
+        source = pdf.getbuffer()
+    elif hasattr(pdf, "read"):
+        source = _map_or_read(pdf, max_bytes)
+    else:
+        raise TypeError(f"Cannot open a PDF from {type(pdf).__name__}")
+    if isinstance(source, memoryview) and source.format != "B":
+        source = source.cast("B")
+    check_pdf_size("PDF", len(source), max_bytes)
+    return source
+
+def open_pdf(pdf, max_bytes=MAX_PDF_BYTES):
+    """Opens a PDF given as a file path, its contents or a file object; see pdf_source."""
+    import fitz  # PyMuPDF
+    source = pdf_source(pdf, max_bytes)
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def iter_images(pdf_path):
+    """Yields the images embedded in a PDF file one at a time.
+
+    Only the image currently being looked at is decoded. The document is
+    closed as soon as the generator is exhausted or closed (e.g. when the
+    caller stops at the first QR code), not when it is garbage collected.
+    """
+    from PIL import Image
+    with open_pdf(pdf_path) as doc:
+        for page in doc:
+            for img in page.get_images(full=True):
+                xref = img[0]
+                base_image = doc.extract_image(xref)
+                image_bytes = base_image["image"]
+                yield Image.open(io.BytesIO(image_bytes))
 
 def extract_images(pdf_path):
     """Extracts images from a PDF file."""
-    doc = fitz.open(pdf_path)
-    images = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        for img_index, img in enumerate(page.get_images(full=True)):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            image = Image.open(io.BytesIO(image_bytes))
-            images.append(image)
-    return images
\ No newline at end of file
+    return list(iter_images(pdf_path))
+
+def pixmap_to_gray(pix):
+    """Returns a pixmap as an 8-bit grayscale (pixels, width, height) tuple.
+
+    This is the raw buffer format pyzbar decodes directly, so no PIL image
+    is created and pyzbar does not have to convert or copy it again.
+    """
+    import fitz
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+
+    samples = pix.samples
+    if pix.stride != pix.width:
+        # Drop row padding so the buffer is exactly width * height bytes
+        samples = b"".join(
+            samples[y * pix.stride:y * pix.stride + pix.width] for y in range(pix.height)
+        )
+    return samples, pix.width, pix.height
+
+def _decode_gray_image(doc, xref):
+    import fitz
+    try:
+        return pixmap_to_gray(fitz.Pixmap(doc, xref))
+    except (RuntimeError, ValueError):
+        # Formats MuPDF cannot turn into a pixmap directly go through PIL
+        from PIL import Image
+        base_image = doc.extract_image(xref)
+        image = Image.open(io.BytesIO(base_image["image"])).convert("L")
+        return image.tobytes(), image.width, image.height
+
+def extract_gray_image(doc, xref):
+    """Decodes an embedded image straight into a grayscale (pixels, width, height) tuple."""
+    with metrics.stage("extract"):
+        image = _decode_gray_image(doc, xref)
+    metrics.count("images_extracted")
+    metrics.count("image_bytes", len(image[0]))
+    return image
+
+def image_fingerprint(doc, xref):
+    """Returns bytes identifying an embedded image without decoding it.
+
+    This is the still-compressed image stream plus its dimensions, so the
+    same image reprinted in another PDF gets the same fingerprint.
+    """
+    header = "/".join(
+        doc.xref_get_key(xref, key)[1] for key in ("Width", "Height", "BitsPerComponent", "Filter")
+    )
+    return header.encode("ascii", "replace") + b"\n" + doc.xref_stream_raw(xref)
+
+def iter_qr_candidate_sources(pdf_path):
+    """Like iter_qr_candidates, but yields (fingerprint, load) pairs.
+
+    load() decodes the image into a grayscale (pixels, width, height)
+    tuple. Callers that recognise the fingerprint can skip decoding.
+    """
+    with metrics.stage("open"):
+        doc = open_pdf(pdf_path)
+    with doc:
+        with metrics.stage("rank"):
+            xrefs = rank_images(doc)
+        for xref in xrefs:
+            yield image_fingerprint(doc, xref), lambda xref=xref: extract_gray_image(doc, xref)
+
+def iter_qr_candidates(pdf_path):
+    """Yields the images of a PDF file ordered by how likely they are to be a QR code.
+
+    Ranking only looks at image metadata (see ranking.rank_images), so the
+    likely UPNQR symbol is decoded first and images that cannot hold a QR
+    code are never decoded. Images are yielded as grayscale
+    (pixels, width, height) tuples that decode_qr_code accepts as-is.
+    """
+    with open_pdf(pdf_path) as doc:
+        for xref in rank_images(doc):
+            yield extract_gray_image(doc, xref)
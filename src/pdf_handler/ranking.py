@@ -0,0 +1,103 @@
+"""Cheap pre-scoring of embedded PDF images as UPNQR candidates.
+
+Scores are computed purely from the image dictionary returned by
+``page.get_images(full=True)`` and the placement rectangles from
+``page.get_image_rects``, so no pixel data is decoded while ranking.
+"""
+
+# Smallest image that can hold a QR code (version 1 is 21x21 modules)
+MIN_QR_PIXELS = 21
+
+# Printed UPNQR symbols are roughly 30-60 mm wide (~85-170 pt)
+MIN_QR_POINTS = 40
+MAX_QR_POINTS = 250
+
+# Images larger than this are usually full-page scans, logos or banners
+MAX_QR_PIXELS = 1500
+
+# Filters used for bitonal images, which is how QR codes are usually stored
+BITONAL_FILTERS = ('CCITTFaxDecode', 'JBIG2Decode')
+
+
+def score_image(img, rects=(), page_rect=None):
+    """Returns a likelihood score that an image is a UPNQR symbol, or None.
+
+    img is an entry of page.get_images(full=True):
+    (xref, smask, width, height, bpc, colorspace, alt_colorspace, name, filter, referencer).
+    None means the image cannot be a QR code at all and should be skipped.
+    """
+    width, height, bpc, colorspace, image_filter = img[2], img[3], img[4], img[5], img[8]
+
+    if min(width, height) < MIN_QR_PIXELS:
+        return None
+
+    score = 0.0
+
+    # QR codes are square; logos, banners and signatures rarely are
+    aspect = max(width, height) / min(width, height)
+    if aspect <= 1.1:
+        score += 4
+    elif aspect <= 1.5:
+        score += 1
+    else:
+        score -= 4
+
+    # Pure black and white images are the common encoding for QR codes
+    if bpc == 1:
+        score += 2
+    if colorspace == 'DeviceGray':
+        score += 1
+    if image_filter in BITONAL_FILTERS:
+        score += 1
+    elif image_filter == 'DCTDecode':
+        # JPEG is typically used for photos and scans
+        score -= 1
+
+    if max(width, height) > MAX_QR_PIXELS:
+        score -= 2
+
+    # Placement on the page: size of the printed symbol and the UPN slip,
+    # which sits in the lower half of the page
+    for rect in rects:
+        side = max(rect.width, rect.height)
+        if MIN_QR_POINTS <= side <= MAX_QR_POINTS:
+            score += 1
+        if page_rect is not None and (rect.y0 + rect.y1) / 2 > page_rect.height / 2:
+            score += 1
+        break
+
+    return score
+
+
+def rank_images(doc):
+    """Returns the xrefs of all candidate images in doc, most likely QR code first.
+
+    Images used on several pages (logos, letterheads) are listed once.
+    Ties keep document order.
+    """
+    candidates = {}
+    seen = set()
+    for page in doc:
+        for img in page.get_images(full=True):
+            xref = img[0]
+            if xref in seen:
+                continue
+            seen.add(xref)
+            score = score_image(img, page.get_image_rects(xref), page.rect)
+            if score is not None:
+                candidates[xref] = (score, len(seen))
+
+    return sorted(candidates, key=lambda xref: (-candidates[xref][0], candidates[xref][1]))
+
+
+def rank_page_images(page):
+    """Returns the xrefs of the candidate images on one page, most likely QR code first."""
+    candidates = {}
+    for img in page.get_images(full=True):
+        xref = img[0]
+        if xref not in candidates:
+            score = score_image(img, page.get_image_rects(xref), page.rect)
+            if score is not None:
+                candidates[xref] = (score, len(candidates))
+
+    return sorted(candidates, key=lambda xref: (-candidates[xref][0], candidates[xref][1]))
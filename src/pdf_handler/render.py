@@ -0,0 +1,205 @@
+"""Render-and-crop fallback for QR codes drawn as vector paths.
+
+Such codes are not image XObjects, so extract_images never sees them.
+Each page is rendered once at a low resolution, the three QR finder
+patterns are located on that preview, and only the clip around them is
+rendered again at a resolution high enough for decoding.
+"""
+import re
+from itertools import combinations
+from src.pdf_handler.handler import open_pdf, pixmap_to_gray
+from src.metrics import registry as metrics
+
+# Resolution of the preview used to locate finder patterns. UPNQR symbols
+# are ~40 mm wide with 77 modules, which gives modules of ~2 px at 96 DPI.
+LOW_DPI = 96
+
+# Resolution the located QR region is re-rendered at before decoding
+HIGH_DPI = 300
+
+# Gray level below which a preview pixel counts as dark
+DARK_THRESHOLD = 128
+
+# Quiet zone and half a finder pattern, in modules, added around the finder centers
+CLIP_MARGIN_MODULES = 8
+
+# Finder pattern candidates tried by locate_qr_region. Every triple is
+# checked, so a busy page (tables, barcodes, dense text) must be capped;
+# 24 candidates are ~2000 triples.
+MAX_FINDER_CANDIDATES = 24
+
+_DARK_TABLE = bytes(1 if value < DARK_THRESHOLD else 0 for value in range(256))
+_RUN_PATTERN = re.compile(rb'\x01+|\x00+')
+
+
+def _ratio_ok(a, b, c, d, e):
+    """Checks run lengths against the 1:1:3:1:1 finder pattern ratio and returns the module size, or None."""
+    module = (a + b + c + d + e) / 7.0
+    if module < 1:
+        return None
+    # At preview resolution a module is only a pixel or two, so allow half a module of error
+    tolerance = max(module / 2, 1)
+    if (abs(a - module) <= tolerance and abs(b - module) <= tolerance and
+            abs(d - module) <= tolerance and abs(e - module) <= tolerance and
+            abs(c - 3 * module) <= 3 * tolerance):
+        return module
+    return None
+
+
+def _column_center(samples, stride, height, x, y):
+    """Cross-checks a finder pattern candidate along column x and returns its vertical center, or None."""
+    def dark(yy):
+        return samples[yy * stride + x] < DARK_THRESHOLD
+
+    if not dark(y):
+        return None
+    runs = []
+    for step in (-1, 1):
+        yy = y
+        counts = []
+        for want_dark in (True, False, True):
+            count = 0
+            while 0 <= yy < height and dark(yy) == want_dark:
+                count += 1
+                yy += step
+            counts.append(count)
+        runs.append(counts)
+    (up_c, up_b, up_a), (down_c, down_d, down_e) = runs
+    c = up_c + down_c - 1
+    if _ratio_ok(up_a, up_b, c, down_d, down_e) is None:
+        return None
+    return y - up_c + 1 + c / 2.0
+
+
+def _row_finder_hits(row, y):
+    """Returns (x, y, module) for every dark:light:dark:light:dark run of ratio 1:1:3:1:1 in a row."""
+    runs = [(m.start(), m.end() - m.start(), row[m.start()]) for m in _RUN_PATTERN.finditer(row)]
+    hits = []
+    for i in range(len(runs) - 4):
+        if not runs[i][2]:
+            continue
+        a, b, c, d, e = (runs[i + k][1] for k in range(5))
+        module = _ratio_ok(a, b, c, d, e)
+        if module is not None:
+            hits.append((runs[i + 2][0] + c / 2.0, y, module))
+    return hits
+
+
+def find_finder_patterns(samples, width, height, stride=None):
+    """Locates QR finder pattern centers in an 8-bit grayscale buffer.
+
+    Returns a list of (x, y, module) tuples in pixel coordinates, the
+    centers confirmed on the most rows first. A center must be confirmed by
+    hits on at least two neighbouring rows and by the same ratio along its
+    column, which filters out matches inside text and inside the QR data area.
+    """
+    stride = stride or width
+    finished = []
+    active = []  # [x_sum, y_sum, module_sum, count, last_y]
+    for y in range(height):
+        row = samples[y * stride:y * stride + width].translate(_DARK_TABLE)
+        if active and active[0][4] < y - 2:
+            finished.extend(c for c in active if c[4] < y - 2)
+            active = [c for c in active if c[4] >= y - 2]
+        if b'\x01' not in row:
+            continue
+        for x, _, module in _row_finder_hits(row, y):
+            for cluster in active:
+                count = cluster[3]
+                if abs(cluster[0] / count - x) <= cluster[2] / count * 1.5:
+                    cluster[0] += x
+                    cluster[1] += y
+                    cluster[2] += module
+                    cluster[3] += 1
+                    cluster[4] = y
+                    break
+            else:
+                active.append([x, y, module, 1, y])
+    finished.extend(active)
+
+    patterns = []
+    for x_sum, y_sum, module_sum, count, _ in finished:
+        if count < 2:
+            continue
+        x = x_sum / count
+        y = _column_center(samples, stride, height, int(x), int(round(y_sum / count)))
+        if y is not None:
+            patterns.append((count, (x, y, module_sum / count)))
+    # A real finder pattern is hit on ~3 modules' worth of rows, stray matches on fewer
+    patterns.sort(key=lambda item: -item[0])
+    return [pattern for _, pattern in patterns]
+
+
+def locate_qr_region(patterns):
+    """Picks three finder patterns that form a QR symbol and returns its pixel bbox, or None.
+
+    The three centers must have similar module sizes and form a right
+    isosceles triangle, as the top-left, top-right and bottom-left finder
+    patterns of a QR code do. When several triples qualify, the most
+    regular one wins. Only the first MAX_FINDER_CANDIDATES patterns are
+    considered, so they should be ordered best first.
+    """
+    best = None
+    for triple in combinations(patterns[:MAX_FINDER_CANDIDATES], 3):
+        modules = [p[2] for p in triple]
+        if max(modules) > 1.6 * min(modules):
+            continue
+        module = sum(modules) / 3
+        for corner in triple:
+            a, b = [p for p in triple if p is not corner]
+            ax, ay = a[0] - corner[0], a[1] - corner[1]
+            bx, by = b[0] - corner[0], b[1] - corner[1]
+            len_a = (ax * ax + ay * ay) ** 0.5
+            len_b = (bx * bx + by * by) ** 0.5
+            # Finder centers of a version 1-40 symbol are 14-170 modules apart;
+            # len_b is 0 when the same pattern was detected twice
+            if not len_b or not (14 * module <= len_a <= 170 * module):
+                continue
+            length_error = abs(len_a - len_b) / max(len_a, len_b)
+            angle_error = abs(ax * bx + ay * by) / (len_a * len_b)
+            if length_error > 0.15 or angle_error > 0.2:
+                continue
+            xs = [p[0] for p in triple] + [a[0] + b[0] - corner[0]]
+            ys = [p[1] for p in triple] + [a[1] + b[1] - corner[1]]
+            margin = CLIP_MARGIN_MODULES * module
+            region = (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+            error = length_error + angle_error
+            if best is None or error < best[0]:
+                best = (error, region)
+    return best[1] if best else None
+
+
+def render_qr_region(page, low_dpi=LOW_DPI, high_dpi=HIGH_DPI):
+    """Renders the QR region of a page at high_dpi as a grayscale (pixels, width, height) tuple, or None.
+
+    The page is first rendered at low_dpi to find the finder patterns; when
+    none are found the page is not rendered again.
+    """
+    import fitz  # PyMuPDF
+    metrics.count("pages_rendered")
+    with metrics.stage("render"):
+        preview = page.get_pixmap(dpi=low_dpi, colorspace=fitz.csGRAY, alpha=False)
+    with metrics.stage("locate"):
+        patterns = find_finder_patterns(preview.samples, preview.width, preview.height, preview.stride)
+        region = locate_qr_region(patterns)
+    if region is None:
+        return None
+
+    # Preview pixels -> page coordinates (undoing any page rotation)
+    clip = fitz.Rect(region) * (72.0 / low_dpi) * page.derotation_matrix
+    clip = clip & page.rect
+    if clip.is_empty:
+        return None
+
+    with metrics.stage("render"):
+        pix = page.get_pixmap(dpi=high_dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+        return pixmap_to_gray(pix)
+
+
+def iter_rendered_qr_regions(pdf_path, low_dpi=LOW_DPI, high_dpi=HIGH_DPI):
+    """Yields a high resolution crop of every page that appears to contain a QR code."""
+    with open_pdf(pdf_path) as doc:
+        for page in doc:
+            image = render_qr_region(page, low_dpi, high_dpi)
+            if image is not None:
+                yield image
@@ -0,0 +1,246 @@
+import os
+import glob
+import json
+import time
+import logging
+from functools import partial
+from src.pipeline.converter import convert_document, convert_pdf
+from src.pipeline.staged import run_pipeline
+from src.xml_generator.stream import EslogStreamWriter
+from src.export.table import InvoiceTableWriter
+from src.xml_generator.validation import load_schema
+from src.suppliers.registry import load_registry
+from src.cache.store import open_cache, DEFAULT_MAX_BYTES
+from src.metrics import registry as metrics
+from src.metrics.registry import MetricsRegistry
+from src.metrics.exporters import StatsdClient, write_prometheus_file
+
+logger = logging.getLogger(__name__)
+
+
+def expand_inputs(inputs):
+    """Expands paths, directories and glob patterns into a sorted list of PDF files."""
+    pdf_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, f) for f in os.listdir(item)]
+        else:
+            candidates = glob.glob(item) or [item]
+        pdf_files.extend(
+            os.path.normpath(path) for path in candidates
+            if path.lower().endswith('.pdf')
+        )
+    # Keep the order stable and drop duplicates from overlapping patterns
+    return sorted(set(pdf_files))
+
+
+def output_path_for(pdf_path, output_dir=None):
+    """Returns the XML path for a PDF, optionally placed in output_dir."""
+    xml_name = os.path.splitext(os.path.basename(pdf_path))[0] + ".xml"
+    if output_dir:
+        return os.path.join(output_dir, xml_name)
+    return os.path.join(os.path.dirname(pdf_path), xml_name)
+
+
+def convert_one(pdf_path, output_dir=None, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+                fast_xml=False, streaming=False, validation=None, schema_path=None, metrics_options=None,
+                export=False, data=None, suppliers_path=None):
+    """Converts a single PDF and returns a picklable per-file report.
+
+    Runs inside the worker processes, so every error is caught and reported
+    instead of propagating and tearing down the pool. Each worker opens the
+    cache in cache_dir once and reuses it for all its files.
+
+    With streaming, no XML is written; the report carries the serialized
+    XML as "xml_bytes" (UTF-8) and the mapped "eslog_data" for the parent
+    process to copy into its output stream.
+
+    validation ('report' or 'strict') adds the XSD validation report of the
+    invoice as "validation"; see convert_document.
+
+    metrics_options (the keyword arguments of metrics.enable) turns on
+    instrumentation; the document's metrics record is added as "metrics".
+
+    With export, the parsed UpnqrRecord is added as "upnqr_data" for the
+    parent's table export.
+
+    With data (the PDF contents, read by the caller), the PDF is converted
+    from memory and no file is touched: the report carries the XML as "xml"
+    for the caller to write to report["output"].
+
+    suppliers_path names the supplier registry for the seller IDs.
+    """
+    started = time.perf_counter()
+    report = {"input": pdf_path, "output": None, "status": "ok", "error": None}
+    record = None
+    if metrics_options is not None:
+        metrics.enable(**metrics_options)
+    try:
+        with metrics.document(pdf_path) as record:
+            cache = open_cache(cache_dir, cache_max_bytes) if cache_dir else None
+            if streaming or data is not None:
+                result = convert_document(pdf_path if data is None else data, cache, fast_xml, validation,
+                                          schema_path, suppliers_path)
+                upnqr_data, eslog_data = result["upnqr_data"], result["eslog_data"]
+                if streaming:
+                    report["eslog_data"] = eslog_data
+                    report["xml_bytes"] = result["xml"].encode("utf-8")
+                else:
+                    report["output"] = output_path_for(pdf_path, output_dir)
+                    report["xml"] = result["xml"]
+                report["cached"] = result["cached"]
+                metrics.count("xml_bytes", len(result["xml"]))
+                if validation:
+                    report["validation"] = result["validation"]
+            else:
+                result = convert_pdf(pdf_path, output_path_for(pdf_path, output_dir), cache, fast_xml,
+                                     validation, schema_path, suppliers_path)
+                upnqr_data, eslog_data = result["upnqr_data"], result["eslog_data"]
+                report["output"] = result["output"]
+                report["cached"] = result["cached"]
+                if validation:
+                    report["validation"] = result["validation"]
+            if export:
+                report["upnqr_data"] = upnqr_data
+            report["invoice_number"] = eslog_data.get('InvoiceNumber', '')
+            report["amount"] = eslog_data.get('Amount', 0.0)
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = f"{type(e).__name__}: {e}"
+    report["elapsed"] = round(time.perf_counter() - started, 4)
+    if record is not None:
+        report["metrics"] = record
+    return report
+
+
+def record_metrics(report, registry, statsd_client=None):
+    """Adds a report's metrics record to registry (and StatsD); a failure without one counts as failed."""
+    if report.get("metrics"):
+        registry.add(report["metrics"])
+        if statsd_client is not None:
+            statsd_client.send_record(report["metrics"])
+    elif report["status"] != "ok":
+        # Failed before a worker recorded it, e.g. the PDF could not be read
+        registry.add_failure()
+        if statsd_client is not None:
+            statsd_client.send_failure()
+
+
+def add_metrics_summary(summary, registry, metrics_file=None):
+    """Adds the registry totals to summary as "metrics", writes them to metrics_file and logs the stages."""
+    summary["metrics"] = registry.snapshot()
+    if metrics_file:
+        write_prometheus_file(registry, metrics_file)
+        logger.info(f"Metrics written to {metrics_file}")
+    for name, stats in sorted(summary["metrics"]["stages"].items(), key=lambda item: -item[1]["wall"]):
+        logger.info(f"  {name:<10} {stats['wall']:>9.3f}s wall {stats['cpu']:>9.3f}s cpu "
+                    f"{stats['calls']:>7} calls")
+
+
+def run_batch(inputs, jobs=None, output_dir=None, summary_path=None,
+              cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, fast_xml=False, archive=None,
+              validation=None, schema_path=None, metrics_options=None, metrics_file=None, statsd=None,
+              export_path=None, export_append=False, suppliers_path=None):
+    """Converts every PDF matched by inputs across a process pool.
+
+    Files are read and XML is written on I/O threads while the workers
+    decode, so disk latency overlaps with the CPU work (see staged.py).
+    jobs defaults to the number of CPUs. Returns the summary dict, which is
+    also written as JSON to summary_path when given. With cache_dir, results
+    are looked up in and stored to a persistent ResultCache. fast_xml uses
+    the template serializer instead of lxml.
+
+    With archive, all invoices are streamed into one ZIP/tar archive, a
+    directory with a manifest, or stdout ('-') as they complete (see
+    EslogStreamWriter) instead of one XML file next to each PDF.
+
+    validation ('report' or 'strict') validates every invoice against the
+    e-SLOG XSD. The schema is compiled here once, before the pool starts,
+    so forked workers share it.
+
+    metrics_options (the keyword arguments of metrics.enable) instruments
+    every conversion. The per-document records are merged into the
+    summary's "metrics", written in the Prometheus text format to
+    metrics_file and sent to the StatsD server at statsd ('host:port').
+
+    export_path writes every parsed UPNQR payload as one row of a CSV file
+    or Parquet dataset (see InvoiceTableWriter); export_append adds to an
+    existing export instead of replacing it.
+
+    suppliers_path names the supplier registry (CSV or SQLite) that fills
+    in the seller IDs. Like the schema, it is loaded here once before the
+    pool starts.
+    """
+    if validation:
+        load_schema(schema_path)
+    if suppliers_path:
+        logger.info(f"Loaded {len(load_registry(suppliers_path))} suppliers from {suppliers_path}")
+
+    pdf_files = expand_inputs(inputs)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    logger.info(f"Converting {len(pdf_files)} PDF files with {jobs or os.cpu_count()} workers...")
+    started = time.perf_counter()
+    reports = []
+    registry = MetricsRegistry() if metrics_options is not None else None
+    statsd_client = StatsdClient(statsd) if statsd and registry is not None else None
+
+    writer = EslogStreamWriter(archive) if archive else None
+    table = InvoiceTableWriter(export_path, append=export_append) if export_path else None
+    try:
+        def on_report(report):
+            if registry is not None:
+                record_metrics(report, registry, statsd_client)
+            if writer is not None and report["status"] == "ok":
+                name = os.path.splitext(os.path.basename(report["input"]))[0] + ".xml"
+                member = writer.write_xml(name, report.pop("xml_bytes"), report.pop("eslog_data"),
+                                          source=report["input"])
+                report["output"] = f"{archive}:{member}"
+            upnqr_data = report.pop("upnqr_data", None)
+            if table is not None and report["status"] == "ok":
+                table.add(upnqr_data, source=report["input"])
+            reports.append(report)
+            if report["status"] == "ok":
+                logger.info(f"✓ {report['input']} -> {report['output']}")
+                for error in (report.get("validation") or {}).get("errors", []):
+                    logger.warning(f"  {error['path']}: {error['message']}")
+            else:
+                logger.error(f"✗ {report['input']}: {report['error']}")
+
+        convert = partial(convert_one, output_dir=output_dir, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                          fast_xml=fast_xml, streaming=writer is not None, validation=validation,
+                          schema_path=schema_path, metrics_options=metrics_options, export=table is not None,
+                          suppliers_path=suppliers_path)
+        run_pipeline(pdf_files, convert, on_report, jobs=jobs)
+    finally:
+        if writer is not None:
+            writer.close()
+        if table is not None:
+            table.close()
+            logger.info(f"Exported {table.rows} invoices to {export_path}")
+        if statsd_client is not None:
+            statsd_client.close()
+
+    reports.sort(key=lambda r: r["input"])
+    succeeded = sum(1 for r in reports if r["status"] == "ok")
+    summary = {
+        "total": len(reports),
+        "succeeded": succeeded,
+        "failed": len(reports) - succeeded,
+        "cached": sum(1 for r in reports if r.get("cached")),
+        "invalid": sum(1 for r in reports if r.get("validation") and not r["validation"]["valid"]),
+        "elapsed": round(time.perf_counter() - started, 4),
+        "files": reports,
+    }
+    if registry is not None:
+        add_metrics_summary(summary, registry, metrics_file)
+
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Summary written to {summary_path}")
+
+    logger.info(f"Done: {summary['succeeded']} succeeded, {summary['failed']} failed "
+                f"in {summary['elapsed']:.2f}s")
+    return summary
@@ -0,0 +1,237 @@
+import os
+import logging
+from contextlib import closing
+from src.pdf_handler.handler import iter_qr_candidate_sources, pdf_source
+from src.pdf_handler.render import iter_rendered_qr_regions
+from src.qr_code_processor.record import UpnqrRecord
+from src.qr_code_processor.processor import decode_qr_code, decode_qr_code_retry
+from src.qr_code_processor.upnqr import parse_upnqr_data
+from src.xml_generator.generator import (
+    build_eslog_tree, generate_eslog_xml, map_upnqr_to_eslog, serialize_eslog_tree,
+)
+from src.xml_generator.validation import validate_tree
+from src.suppliers.registry import load_registry
+from src.xml_generator.template import render_eslog_xml
+from src.cache.store import hash_bytes, hash_file
+from src.metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Top ranked images that get the preprocessing retry ladder when the plain decode fails
+RETRY_CANDIDATES = 2
+
+
+class ConversionError(Exception):
+    """Raised when a PDF cannot be converted to e-SLOG XML."""
+
+
+def find_qr_data(pdf_path, cache=None):
+    """Returns the payload of the first decodable QR code in the PDF, or None.
+
+    Images are extracted lazily, most likely QR code first, and the search
+    stops at the first hit, so the remaining images are never decoded. If no
+    embedded image holds a QR code, pages are rendered to catch codes that
+    are drawn as vector paths.
+
+    Every image is first decoded as is. Only if none decodes, the top
+    RETRY_CANDIDATES images go through the preprocessing retry ladder
+    (decode_qr_code_retry), so easy images and decoys never pay for it.
+
+    With a ResultCache, images that were decoded before (in this or any
+    other PDF) are looked up by fingerprint instead of being decoded again.
+    For the top RETRY_CANDIDATES images a cached miss only counts if the
+    retry ladder already ran on the image.
+    """
+    retry = []
+    with closing(iter_qr_candidate_sources(pdf_path)) as sources:
+        for i, (fingerprint, load_image) in enumerate(sources):
+            image_hash = None
+            if cache is not None:
+                image_hash = hash_bytes(fingerprint)
+                found, qr_data = cache.get_qr_payload(image_hash, retried=i < RETRY_CANDIDATES)
+                metrics.count("qr_cache_hits" if found else "qr_cache_misses")
+                if found:
+                    logger.debug(f"Image {i+1} found in cache")
+                    if qr_data:
+                        return qr_data
+                    continue
+
+            logger.debug(f"Trying to decode QR code from image {i+1}...")
+            image = load_image()
+            metrics.count("decode_attempts")
+            with metrics.stage("decode"):
+                qr_data = decode_qr_code(image)
+            if not qr_data and i < RETRY_CANDIDATES:
+                retry.append((i, image_hash, image))
+                continue
+            if image_hash is not None:
+                cache.put_qr_payload(image_hash, qr_data)
+            if qr_data:
+                logger.debug(f"Successfully decoded QR code from image {i+1}")
+                return qr_data
+
+    for i, image_hash, image in retry:
+        logger.debug(f"Retrying image {i+1} with preprocessing...")
+        metrics.count("decode_retries")
+        with metrics.stage("decode_retry"):
+            qr_data = decode_qr_code_retry(image)
+        if image_hash is not None:
+            cache.put_qr_payload(image_hash, qr_data, retried=True)
+        if qr_data:
+            logger.debug(f"Successfully decoded QR code from preprocessed image {i+1}")
+            return qr_data
+
+    logger.debug("No QR code in embedded images, rendering pages...")
+    with closing(iter_rendered_qr_regions(pdf_path)) as regions:
+        for region in regions:
+            metrics.count("decode_attempts")
+            with metrics.stage("decode"):
+                qr_data = decode_qr_code(region)
+            if qr_data:
+                logger.debug("Successfully decoded QR code from rendered page region")
+                return qr_data
+    return None
+
+
+def map_payload(qr_data, suppliers_path=None):
+    """Runs the parse -> map part of the pipeline for one QR payload.
+
+    Returns (upnqr_data, eslog_data). Raises ConversionError if qr_data is
+    not a UPNQR payload.
+    """
+    problems = []
+    with metrics.stage("parse"):
+        upnqr_data = parse_upnqr_data(qr_data, problems)
+    if not upnqr_data:
+        raise ConversionError("Could not parse UPNQR data. Invalid format.")
+    if problems:
+        # Reported, not rejected: the invoice data itself is still usable
+        metrics.count("upnqr_problems", len(problems))
+        for problem in problems:
+            logger.warning(f"UPNQR payload: {problem}")
+
+    with metrics.stage("map"):
+        eslog_data = map_upnqr_to_eslog(upnqr_data, load_registry(suppliers_path))
+    return upnqr_data, eslog_data
+
+
+def extract_invoice(pdf_path, cache=None, suppliers_path=None):
+    """Runs the extract -> decode -> parse -> map part of the pipeline for one PDF.
+
+    Seller IDs are looked up in the supplier registry at suppliers_path
+    (see suppliers.registry), or in the built-in one.
+
+    Returns (qr_data, upnqr_data, eslog_data). Raises ConversionError on failure.
+    """
+    qr_data = find_qr_data(pdf_path, cache)
+    if not qr_data:
+        raise ConversionError("No QR code found in the PDF.")
+    return (qr_data, *map_payload(qr_data, suppliers_path))
+
+
+def generate_invoice_xml(eslog_data, fast_xml=False, validation=None, schema_path=None):
+    """Runs the generate step for mapped e-SLOG fields; returns (xml, validation report or None).
+
+    See convert_document for fast_xml and validation.
+    """
+    report = None
+    if validation:
+        with metrics.stage("generate"):
+            root = build_eslog_tree(eslog_data)
+        with metrics.stage("validate"):
+            report = validate_tree(root, schema_path)
+        if validation == 'strict' and not report["valid"]:
+            first = report["errors"][0]["message"] if report["errors"] else "unknown error"
+            raise ConversionError(f"Invoice is not valid e-SLOG 2.0: {first}")
+        with metrics.stage("generate"):
+            xml_output = serialize_eslog_tree(root)
+    else:
+        with metrics.stage("generate"):
+            xml_output = render_eslog_xml(eslog_data) if fast_xml else generate_eslog_xml(eslog_data)
+    return xml_output, report
+
+
+def convert_document(pdf_path, cache=None, fast_xml=False, validation=None, schema_path=None, suppliers_path=None):
+    """Runs the extract -> decode -> parse -> map -> generate pipeline for one PDF.
+
+    pdf_path may also be the PDF contents (bytes, bytearray, memoryview,
+    mmap) or a binary file object, opened without copying or a temporary
+    file (see pdf_handler.handler.pdf_source). Returns a dict with the
+    raw QR payload, the parsed UPNQR data, the mapped e-SLOG fields and the
+    generated XML. Raises ConversionError on failure.
+
+    With a ResultCache, a PDF whose contents were converted before costs a
+    hash and one lookup; "cached" is then True and "qr_data" is None.
+
+    fast_xml renders the XML with the pre-rendered template serializer
+    instead of building an lxml tree; the output is identical.
+
+    validation='report' validates the invoice tree against the e-SLOG XSD
+    before serializing it and adds the report as "validation";
+    validation='strict' also raises ConversionError for invalid invoices.
+    Validating runs skip the document-level cache lookup, since cached XML
+    may come from a run that did not validate.
+
+    suppliers_path names the supplier registry for the seller IDs. Cached
+    documents are keyed by the registry contents as well, so editing the
+    registry does not serve XML with outdated seller data.
+    """
+    # A file object can only be read once, so it is mapped or read here for all stages
+    pdf_path = pdf_source(pdf_path)
+    in_memory = not isinstance(pdf_path, str)
+    if metrics.enabled():
+        metrics.count("pdf_bytes", len(pdf_path) if in_memory else os.path.getsize(pdf_path))
+
+    pdf_hash = None
+    if cache is not None:
+        with metrics.stage("cache"):
+            if in_memory:
+                pdf_hash = hash_bytes(pdf_path)
+            else:
+                pdf_hash = hash_file(pdf_path)
+            if suppliers_path:
+                pdf_hash = hash_bytes(f"{pdf_hash}:{load_registry(suppliers_path).fingerprint}".encode())
+            cached = None if validation else cache.get_document(pdf_hash)
+        metrics.count("document_cache_hits" if cached else "document_cache_misses")
+        if cached:
+            upnqr_data = UpnqrRecord.from_mapping(cached["upnqr_data"])
+            return {
+                "qr_data": None,
+                "upnqr_data": upnqr_data,
+                "eslog_data": map_upnqr_to_eslog(upnqr_data, load_registry(suppliers_path)),
+                "xml": cached["xml"],
+                "cached": True,
+                "validation": None,
+            }
+
+    qr_data, upnqr_data, eslog_data = extract_invoice(pdf_path, cache, suppliers_path)
+
+    xml_output, report = generate_invoice_xml(eslog_data, fast_xml, validation, schema_path)
+
+    if pdf_hash is not None:
+        with metrics.stage("cache"):
+            cache.put_document(pdf_hash, upnqr_data, xml_output)
+
+    return {
+        "qr_data": qr_data,
+        "upnqr_data": upnqr_data,
+        "eslog_data": eslog_data,
+        "xml": xml_output,
+        "cached": False,
+        "validation": report,
+    }
+
+
+def convert_pdf(pdf_path, output_path=None, cache=None, fast_xml=False, validation=None, schema_path=None,
+                suppliers_path=None):
+    """Converts a PDF invoice and writes the e-SLOG XML next to it (or to output_path)."""
+    result = convert_document(pdf_path, cache, fast_xml, validation, schema_path, suppliers_path)
+
+    output_path = output_path or os.path.splitext(pdf_path)[0] + ".xml"
+    with metrics.stage("write"):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(result["xml"])
+    metrics.count("xml_bytes", len(result["xml"]))
+
+    result["output"] = output_path
+    return result
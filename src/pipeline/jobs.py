@@ -0,0 +1,489 @@
+"""Resumable batch jobs: a journal of per-file outcomes and crash-isolated workers.
+
+A batch that dies halfway (a PDF that crashes MuPDF, an out-of-memory
+kill, a stopped container) leaves run_batch with nothing to resume from.
+run_job converts the same inputs, but:
+
+- every outcome is appended to a JSONL journal as it happens, and a
+  restarted job skips the files the journal already settled, so a 10,000
+  file job never starts from zero
+- each document is converted in a worker process with an address space
+  limit (max_memory) and a wall time limit (timeout); a worker that
+  crashes or overruns is killed and replaced, and only its document fails
+- a failed document is retried with exponential backoff, and after its
+  last attempt moved to the quarantine directory, if one is given; errors
+  in PERMANENT_ERRORS (no QR code, an invalid payload, a file that is not
+  a PDF or is too large) would only fail again, so they fail the document
+  at once
+
+Workers take one document at a time over a pipe, so a dead worker is
+always attributed to the right file. The journal records each attempt
+before it starts, so a document that takes the whole job down (e.g. the
+container's OOM killer) also uses up an attempt and is quarantined
+instead of crashing every restart.
+
+Journal lines are JSON objects with the input path, its size and mtime,
+the attempt number and a status:
+
+    started      an attempt began
+    done         converted; "output" is the XML path
+    failed       the attempt failed with "error"; retried unless it was the last or permanent
+    quarantined  failed on every attempt and moved to "quarantine"
+    skipped      the input disappeared before its turn
+    cancelled    the job was interrupted during the attempt; not counted
+
+Each line is flushed as it is written, so the journal survives a killed
+process or container; a crash of the whole machine may lose the last
+lines, whose files are then converted again.
+"""
+import os
+import json
+import time
+import heapq
+import shutil
+import signal
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from functools import partial
+from src.pipeline.batch import expand_inputs, convert_one, add_metrics_summary, record_metrics
+from src.xml_generator.validation import load_schema
+from src.suppliers.registry import load_registry
+from src.cache.store import DEFAULT_MAX_BYTES
+from src.metrics.registry import MetricsRegistry
+from src.metrics.exporters import StatsdClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_DELAY = 1.0
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_MEMORY = 1024 * 1024 * 1024
+
+# Longest wait between two attempts of a document
+MAX_RETRY_DELAY = 60.0
+
+# Errors that come from the document's contents and would fail again, so they are not retried
+# (FileDataError: PyMuPDF cannot read the file as a PDF)
+PERMANENT_ERRORS = ("ConversionError", "FileDataError", "PdfTooLargeError")
+
+# Statuses after which a file is not converted again while it is unchanged
+SETTLED = ("done", "quarantined")
+
+
+class JobJournal:
+    """Append-only JSONL journal of a job; see the module docstring.
+
+    The journal is read once on open; entries maps every input path to its
+    last record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        ends_with_newline = True
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for number, line in enumerate(f, 1):
+                    ends_with_newline = line.endswith(b"\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line of a journal whose process was killed mid-write
+                        logger.warning(f"{path}:{number}: ignoring a damaged journal line")
+                        continue
+                    self.entries[record["input"]] = record
+        self._file = open(path, "a", encoding="utf-8")
+        if not ends_with_newline:
+            self._file.write("\n")
+
+    def record(self, input_path, status, **fields):
+        """Appends a record for input_path and returns it."""
+        record = {"time": round(time.time(), 3), "input": input_path, "status": status, **fields}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.entries[input_path] = record
+        return record
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+def file_stat(path):
+    """Returns (size, mtime_ns) of a file; raises FileNotFoundError when it is gone."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def retry_delay(attempt, base=DEFAULT_RETRY_DELAY):
+    """Returns the seconds to wait before the attempt after attempt (1-based): base, 2 x base, 4 x base, ..."""
+    return min(base * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+
+
+def limit_memory(max_bytes):
+    """Caps the address space of the current process, so a runaway document fails with MemoryError."""
+    try:
+        import resource
+    except ImportError:
+        # Windows has no rlimits; the wall time limit still applies
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+def quarantine(pdf_path, quarantine_dir):
+    """Moves a PDF into quarantine_dir, numbering it if the name is taken; returns the new path."""
+    os.makedirs(quarantine_dir, exist_ok=True)
+    stem, extension = os.path.splitext(os.path.basename(pdf_path))
+    target = os.path.join(quarantine_dir, stem + extension)
+    number = 1
+    while os.path.exists(target):
+        number += 1
+        target = os.path.join(quarantine_dir, f"{stem}_{number}{extension}")
+    return shutil.move(pdf_path, target)
+
+
+def _work(conn, convert, max_memory):
+    """Worker process: converts one path per message until the pipe closes or None arrives."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if max_memory:
+        limit_memory(max_memory)
+    while True:
+        try:
+            pdf_path = conn.recv()
+        except EOFError:
+            return
+        if pdf_path is None:
+            return
+        try:
+            report = convert(pdf_path)
+        except Exception as e:
+            # convert_one reports its own errors; this catches e.g. a MemoryError while it reports
+            report = {"input": pdf_path, "output": None, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+        conn.send(report)
+
+
+class _Worker:
+    """A worker process and the document it is converting."""
+
+    def __init__(self, convert, max_memory):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work, args=(child_conn, convert, max_memory), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.deadline = None
+
+    def submit(self, task, timeout):
+        self.conn.send(task[0])
+        self.task = task
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def result(self):
+        """Returns the report of the current document, or raises EOFError if the worker died."""
+        report = self.conn.recv()
+        self.task = self.deadline = None
+        return report
+
+    def exit_reason(self):
+        """Describes how a dead worker exited, e.g. 'killed by SIGSEGV'."""
+        self.process.join(5)
+        code = self.process.exitcode
+        if code is not None and code < 0:
+            try:
+                return f"killed by {signal.Signals(-code).name}"
+            except ValueError:
+                pass
+        return f"exited with status {code}"
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class JobRunner:
+    """Converts PDFs on crash-isolated workers, journaling every outcome.
+
+    convert is called in the workers with a PDF path and returns a
+    convert_one report. At most retries + 1 attempts are made per
+    document, base_delay seconds apart, doubling after each attempt.
+    on_report, if given, is called with the final report of every
+    document as it settles.
+    """
+
+    def __init__(self, convert, journal, jobs=None, retries=DEFAULT_RETRIES, base_delay=DEFAULT_RETRY_DELAY,
+                 timeout=DEFAULT_TIMEOUT, max_memory=DEFAULT_MAX_MEMORY, quarantine_dir=None, on_report=None):
+        self.convert = convert
+        self.journal = journal
+        self.jobs = jobs or os.cpu_count() or 1
+        self.attempts = retries + 1
+        self.base_delay = base_delay
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.quarantine_dir = quarantine_dir
+        self.on_report = on_report
+        self.reports = []
+        self.resumed = 0
+
+    def plan(self, pdf_files):
+        """Returns the (path, stat, attempt) tasks of the files the journal has not settled.
+
+        A settled file that is gone, e.g. moved to quarantine by an earlier
+        run, stays settled rather than being journaled as skipped.
+        """
+        tasks = []
+        for pdf_path in pdf_files:
+            entry = self.journal.entries.get(pdf_path)
+            try:
+                stat = file_stat(pdf_path)
+            except FileNotFoundError:
+                if entry is not None and self._settled(entry):
+                    self.resumed += 1
+                else:
+                    self._skipped(pdf_path)
+                continue
+            if entry is None or (entry.get("size"), entry.get("mtime_ns")) != stat:
+                tasks.append((pdf_path, stat, 1))
+                continue
+            attempt = entry["attempt"]
+            if self._settled(entry):
+                self.resumed += 1
+            elif entry["status"] == "cancelled":
+                tasks.append((pdf_path, stat, attempt))
+            elif entry["status"] == "started":
+                # The job stopped during this attempt, possibly because of the document itself
+                if self._failed((pdf_path, stat, attempt), "Interrupted: the job stopped during the conversion"):
+                    tasks.append((pdf_path, stat, attempt + 1))
+            else:
+                tasks.append((pdf_path, stat, attempt + 1))
+        return tasks
+
+    def run(self, pdf_files):
+        """Converts the unsettled files; returns this run's reports in completion order."""
+        ready = self.plan(pdf_files)
+        ready.reverse()
+        delayed = []
+        workers = []
+        try:
+            while ready or delayed or any(w.task for w in workers):
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    ready.append(heapq.heappop(delayed)[2])
+
+                for worker in workers:
+                    if worker.task is None:
+                        self._start(worker, ready)
+                while ready and len(workers) < self.jobs:
+                    workers.append(_Worker(self.convert, self.max_memory))
+                    self._start(workers[-1], ready)
+
+                busy = [w for w in workers if w.task]
+                deadlines = [w.deadline for w in busy if w.deadline] + [t for t, _, _ in delayed[:1]]
+                timeout = max(0.0, min(deadlines) - now) if deadlines else None
+                if not busy:
+                    if delayed:
+                        time.sleep(timeout)
+                    continue
+                finished = wait([w.conn for w in busy], timeout)
+                for index, worker in enumerate(workers):
+                    if worker.task is None:
+                        continue
+                    task = worker.task
+                    if worker.conn in finished:
+                        try:
+                            report = worker.result()
+                        except (EOFError, OSError):
+                            error = f"WorkerCrashed: the worker process {worker.exit_reason()}"
+                        else:
+                            self._finished(task, report, delayed)
+                            continue
+                    elif worker.deadline and time.monotonic() >= worker.deadline:
+                        error = f"TimeoutError: no result after {self.timeout:g}s"
+                    else:
+                        continue
+                    worker.kill()
+                    workers[index] = _Worker(self.convert, self.max_memory)
+                    self._retry_or_fail(task, error, delayed)
+        except KeyboardInterrupt:
+            for worker in workers:
+                if worker.task:
+                    path, stat, attempt = worker.task
+                    self.journal.record(path, "cancelled", size=stat[0], mtime_ns=stat[1], attempt=attempt)
+            logger.info("Job stopped; run it again with the same journal to resume")
+            raise
+        finally:
+            for worker in workers:
+                worker.stop()
+        return self.reports
+
+    def _start(self, worker, ready):
+        """Submits the next task of ready whose file still exists to an idle worker."""
+        while ready:
+            path, stat, attempt = task = ready.pop()
+            if not os.path.exists(path):
+                self._skipped(path)
+                continue
+            self.journal.record(path, "started", size=stat[0], mtime_ns=stat[1], attempt=attempt)
+            worker.submit(task, self.timeout)
+            return
+
+    def _retryable(self, record):
+        return record["attempt"] < self.attempts and record["error"].split(":")[0] not in PERMANENT_ERRORS
+
+    def _settled(self, entry):
+        return entry["status"] in SETTLED or (entry["status"] == "failed" and not self._retryable(entry))
+
+    def _finished(self, task, report, delayed):
+        if report["status"] == "ok":
+            path, stat, attempt = task
+            report["attempts"] = attempt
+            self.journal.record(path, "done", size=stat[0], mtime_ns=stat[1], attempt=attempt,
+                                output=report["output"])
+            self._report(report)
+            logger.info(f"✓ {path} -> {report['output']}")
+            for error in (report.get("validation") or {}).get("errors", []):
+                logger.warning(f"  {error['path']}: {error['message']}")
+        else:
+            self._retry_or_fail(task, report["error"], delayed)
+
+    def _retry_or_fail(self, task, error, delayed):
+        path, stat, attempt = task
+        if not self._failed(task, error):
+            return
+        delay = retry_delay(attempt, self.base_delay)
+        logger.warning(f"↻ {path}: {error}; attempt {attempt + 1} of {self.attempts} in {delay:g}s")
+        heapq.heappush(delayed, (time.monotonic() + delay, path, (path, stat, attempt + 1)))
+
+    def _failed(self, task, error):
+        """Journals a failed attempt; returns True if the document gets another one."""
+        path, stat, attempt = task
+        if self._retryable({"attempt": attempt, "error": error}):
+            self.journal.record(path, "failed", size=stat[0], mtime_ns=stat[1], attempt=attempt, error=error)
+            return True
+        if self.quarantine_dir:
+            try:
+                target = quarantine(path, self.quarantine_dir)
+            except OSError as e:
+                logger.error(f"Cannot quarantine {path}: {e}")
+            else:
+                self._finish(path, stat, attempt, "quarantined", error=error, quarantine=target)
+                return False
+        self._finish(path, stat, attempt, "failed", error=error)
+        return False
+
+    def _report(self, report):
+        self.reports.append(report)
+        if self.on_report is not None:
+            self.on_report(report)
+
+    def _skipped(self, path):
+        self._finish(path, None, 0, "skipped", error="FileNotFoundError: the input disappeared")
+
+    def _finish(self, path, stat, attempt, status, **fields):
+        """Journals the final outcome of a document that was not converted."""
+        size, mtime_ns = stat or (None, None)
+        self.journal.record(path, status, size=size, mtime_ns=mtime_ns, attempt=attempt, **fields)
+        self._report({"input": path, "output": None, "status": status, "error": fields["error"],
+                      "attempts": attempt, "quarantine": fields.get("quarantine")})
+        if status == "skipped":
+            logger.warning(f"- {path}: skipped, the file disappeared")
+        elif status == "quarantined":
+            logger.error(f"✗ {path}: {fields['error']} (quarantined to {fields['quarantine']})")
+        else:
+            logger.error(f"✗ {path}: {fields['error']}")
+
+
+def run_job(inputs, journal_path, jobs=None, output_dir=None, summary_path=None, retries=DEFAULT_RETRIES,
+            retry_delay=DEFAULT_RETRY_DELAY, timeout=DEFAULT_TIMEOUT, max_memory=DEFAULT_MAX_MEMORY,
+            quarantine_dir=None, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, fast_xml=False,
+            validation=None, schema_path=None, metrics_options=None, metrics_file=None, statsd=None,
+            suppliers_path=None):
+    """Converts every PDF matched by inputs as a resumable job journaled to journal_path.
+
+    Running it again with the same journal converts only the files that
+    were not settled yet (or changed since). See JobRunner for retries,
+    timeout and max_memory (bytes, 0 for no limit); the remaining options
+    are those of run_batch. Returns the summary dict, which is also written
+    as JSON to summary_path when given; "files" lists this run's reports
+    and "resumed" counts the files settled by earlier runs.
+
+    With metrics_options, the metrics of this run's documents are merged
+    into the summary's "metrics", written to metrics_file and sent to
+    statsd as in run_batch. Each document counts once: with the record of
+    its successful attempt, or as one failure.
+    """
+    if validation:
+        load_schema(schema_path)
+    if suppliers_path:
+        logger.info(f"Loaded {len(load_registry(suppliers_path))} suppliers from {suppliers_path}")
+
+    pdf_files = expand_inputs(inputs)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    convert = partial(convert_one, output_dir=output_dir, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                      fast_xml=fast_xml, validation=validation, schema_path=schema_path,
+                      metrics_options=metrics_options, suppliers_path=suppliers_path)
+    registry = MetricsRegistry() if metrics_options is not None else None
+    statsd_client = StatsdClient(statsd) if statsd and registry is not None else None
+
+    def on_report(report):
+        if registry is not None and report["status"] != "skipped":
+            record_metrics(report, registry, statsd_client)
+
+    journal = JobJournal(journal_path)
+    runner = JobRunner(convert, journal, jobs, retries, retry_delay, timeout, max_memory, quarantine_dir,
+                       on_report)
+    started = time.perf_counter()
+    try:
+        if journal.entries:
+            logger.info(f"Resuming the job in {journal_path}")
+        logger.info(f"Converting {len(pdf_files)} PDF files with {runner.jobs} workers...")
+        reports = runner.run(pdf_files)
+    finally:
+        journal.close()
+        if statsd_client is not None:
+            statsd_client.close()
+
+    reports.sort(key=lambda r: r["input"])
+    counts = {status: sum(1 for r in reports if r["status"] == status)
+              for status in ("ok", "failed", "quarantined", "skipped")}
+    summary = {
+        "total": len(pdf_files),
+        "resumed": runner.resumed,
+        "succeeded": counts["ok"],
+        "failed": counts["failed"],
+        "quarantined": counts["quarantined"],
+        "skipped": counts["skipped"],
+        "retried": sum(1 for r in reports if r["attempts"] > 1),
+        "invalid": sum(1 for r in reports if r.get("validation") and not r["validation"]["valid"]),
+        "elapsed": round(time.perf_counter() - started, 4),
+        "files": reports,
+    }
+    if registry is not None:
+        add_metrics_summary(summary, registry, metrics_file)
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Summary written to {summary_path}")
+
+    logger.info(f"Done: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+                f"{summary['quarantined']} quarantined, {summary['resumed']} already done "
+                f"in {summary['elapsed']:.2f}s")
+    return summary
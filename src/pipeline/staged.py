@@ -0,0 +1,158 @@
+"""Staged batch pipeline: overlaps file I/O with decoding and XML generation.
+
+Each PDF passes through three stages connected by bounded asyncio queues:
+
+    read     the PDF bytes are read on a thread pool (io_workers threads)
+    convert  decode, parse, map and XML generation run on a process pool
+             from memory (fitz.open(stream=...)), see convert_one(data=...)
+    write    the XML is written on the thread pool, then the report is
+             handed to on_report in the event loop thread
+
+While the workers decode one PDF, the next ones are already being read and
+finished XML is being written, so on a network share the disk latency
+overlaps with the CPU work instead of adding to it. The queues hold at
+most queue_size PDFs each, which bounds the memory of PDFs read ahead.
+PDFs larger than MAX_PDF_BYTES fail without being read.
+
+A worker that dies (e.g. MuPDF crashing on a PDF) breaks the process pool
+and fails every conversion running in it. The pool is replaced, and each
+of those PDFs is converted again on its own in a one-off worker, so only
+the PDF that crashes again is reported as failed.
+"""
+import os
+import time
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.pdf_handler.handler import PdfTooLargeError, check_pdf_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IO_WORKERS = 4
+
+_DONE = object()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        check_pdf_size(path, os.fstat(f.fileno()).st_size)
+        return f.read()
+
+
+def _write(path, xml):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(xml)
+
+
+def _add_stage(report, name, wall, cpu):
+    """Adds a stage timed in the parent process to the report's metrics record."""
+    record = report.get("metrics")
+    if record is None:
+        return
+    stats = record["stages"].setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+    stats["calls"] += 1
+    stats["wall"] = round(stats["wall"] + wall, 6)
+    stats["cpu"] = round(stats["cpu"] + cpu, 6)
+
+
+def _failed(pdf_path, error):
+    return {"input": pdf_path, "output": None, "status": "failed", "error": f"{type(error).__name__}: {error}"}
+
+
+async def _run(pdf_files, convert, on_report, jobs, io_workers, queue_size):
+    loop = asyncio.get_running_loop()
+    paths = iter(pdf_files)
+    read_queue = asyncio.Queue(queue_size)
+    write_queue = asyncio.Queue(queue_size)
+
+    cpu_pool = ProcessPoolExecutor(jobs)
+    with ThreadPoolExecutor(io_workers, thread_name_prefix="pipeline-io") as io_pool:
+
+        async def reader():
+            for pdf_path in paths:
+                started = time.perf_counter()
+                try:
+                    data = await loop.run_in_executor(io_pool, _read, pdf_path)
+                except (OSError, PdfTooLargeError) as e:
+                    await write_queue.put((_failed(pdf_path, e), 0.0))
+                    continue
+                await read_queue.put((pdf_path, data, time.perf_counter() - started))
+
+        async def convert_alone(job):
+            solo = ProcessPoolExecutor(1)
+            try:
+                return await loop.run_in_executor(solo, job)
+            finally:
+                solo.shutdown(wait=False)
+
+        async def converter():
+            nonlocal cpu_pool
+            while (item := await read_queue.get()) is not _DONE:
+                pdf_path, data, read_time = item
+                job = partial(convert, pdf_path, data=data)
+                pool = cpu_pool
+                try:
+                    report = await loop.run_in_executor(pool, job)
+                except BrokenProcessPool:
+                    if pool is cpu_pool:
+                        logger.error("A worker process died; restarting the worker pool")
+                        pool.shutdown(wait=False)
+                        cpu_pool = ProcessPoolExecutor(jobs)
+                    try:
+                        report = await convert_alone(job)
+                    except BrokenProcessPool as e:
+                        report = _failed(pdf_path, e)
+                await write_queue.put((report, read_time))
+
+        async def writer():
+            while (item := await write_queue.get()) is not _DONE:
+                report, read_time = item
+                _add_stage(report, "read", read_time, 0.0)
+                xml = report.pop("xml", None)
+                if xml is not None:
+                    started = time.perf_counter()
+                    try:
+                        await loop.run_in_executor(io_pool, _write, report["output"], xml)
+                    except OSError as e:
+                        report.update(_failed(report["input"], e))
+                        if report.get("metrics") is not None:
+                            report["metrics"]["status"] = "failed"
+                    _add_stage(report, "write", time.perf_counter() - started, 0.0)
+                on_report(report)
+
+        async def stage(tasks, queue, count):
+            # Tell the next stage to stop once this one has drained
+            await asyncio.gather(*tasks)
+            for _ in range(count):
+                await queue.put(_DONE)
+
+        converters = max(1, jobs or os.cpu_count() or 1)
+        readers = [asyncio.create_task(reader()) for _ in range(io_workers)]
+        converting = [asyncio.create_task(converter()) for _ in range(converters)]
+        writers = [asyncio.create_task(writer()) for _ in range(io_workers)]
+        tasks = readers + converting + writers
+        try:
+            await asyncio.gather(
+                stage(readers, read_queue, converters),
+                stage(converting, write_queue, io_workers),
+                *writers,
+            )
+        finally:
+            for task in tasks:
+                task.cancel()
+            cpu_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_pipeline(pdf_files, convert, on_report, jobs=None, io_workers=DEFAULT_IO_WORKERS, queue_size=None):
+    """Converts pdf_files through the read -> convert -> write stages.
+
+    convert(pdf_path, data=...) runs in the worker processes and returns a
+    picklable report; convert_one with the batch options bound by
+    functools.partial fits. A report with "xml" has it written to report["output"]. Every
+    report is passed to on_report(report) as its file completes, in
+    completion order. queue_size defaults to twice the number of workers.
+    """
+    queue_size = queue_size or 2 * (jobs or os.cpu_count() or 1)
+    asyncio.run(_run(pdf_files, convert, on_report, jobs, io_workers, queue_size))
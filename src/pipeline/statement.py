@@ -0,0 +1,296 @@
+"""Statement mode: one e-SLOG invoice per UPNQR slip of a multi-page PDF.
+
+Consolidated statements hold one UPN slip per page, often for hundreds of
+pages, while the regular pipeline stops at the first QR code of a PDF.
+Here every page is scanned:
+
+- the page range of a PDF is split into chunks that worker processes scan
+  in parallel, each with its own fitz document handle
+- each page's embedded images are decoded most likely QR code first, with
+  the preprocessing retry ladder and the vector rendering fallback only
+  for pages where no UPNQR payload decoded
+- the chunks are merged back in page order, and each distinct UPNQR
+  payload is parsed, mapped and written as <name>_p<page>.xml
+- a chunk that crashes its worker (e.g. a MuPDF segfault) is scanned
+  again in a worker of its own, and only fails if it crashes there too
+
+Parsing, mapping and XML generation take a fraction of a millisecond per
+slip, so they run in the parent process; the workers only decode.
+"""
+import os
+import json
+import time
+import logging
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.pdf_handler.handler import open_pdf, extract_gray_image
+from src.pdf_handler.ranking import rank_page_images
+from src.pdf_handler.render import render_qr_region
+from src.pipeline.batch import expand_inputs
+from src.pipeline.converter import map_payload, generate_invoice_xml, ConversionError, RETRY_CANDIDATES
+from src.qr_code_processor.processor import decode_qr_code, decode_qr_code_retry
+from src.qr_code_processor.upnqr import parse_upnqr_data
+from src.xml_generator.validation import load_schema
+from src.suppliers.registry import load_registry
+from src.metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Chunks per worker, so a worker that draws slow pages does not hold up the rest
+TASKS_PER_WORKER = 4
+
+# Fewest pages per chunk; smaller chunks would spend more time opening the PDF than scanning
+MIN_PAGES_PER_TASK = 4
+
+
+def _has_upnqr(payloads):
+    return any(parse_upnqr_data(payload) is not None for payload in payloads)
+
+
+def scan_page(page, decoded):
+    """Returns the distinct QR payloads on a page, most likely QR code first.
+
+    decoded maps image xrefs to their payload (or None) and is shared by
+    the pages of a chunk, so a logo repeated on every page is decoded once.
+    Other QR codes, such as a link to the vendor's portal, are returned
+    too, but do not stop the retry ladder and the rendering fallback from
+    looking for the slip.
+    """
+    payloads = []
+    retry = []
+    for xref in rank_page_images(page):
+        if xref not in decoded:
+            image = extract_gray_image(page.parent, xref)
+            metrics.count("decode_attempts")
+            with metrics.stage("decode"):
+                qr_data = decode_qr_code(image)
+            if not qr_data and len(retry) < RETRY_CANDIDATES:
+                retry.append((xref, image))
+                continue
+            decoded[xref] = qr_data
+        if decoded[xref] and decoded[xref] not in payloads:
+            payloads.append(decoded[xref])
+
+    for xref, image in retry:
+        if _has_upnqr(payloads):
+            decoded[xref] = None
+            continue
+        metrics.count("decode_retries")
+        with metrics.stage("decode_retry"):
+            decoded[xref] = decode_qr_code_retry(image)
+        if decoded[xref]:
+            payloads.append(decoded[xref])
+
+    if not _has_upnqr(payloads):
+        region = render_qr_region(page)
+        if region is not None:
+            metrics.count("decode_attempts")
+            with metrics.stage("decode"):
+                qr_data = decode_qr_code(region)
+            if qr_data and qr_data not in payloads:
+                payloads.append(qr_data)
+    return payloads
+
+
+def scan_pages(pdf_path, start, stop):
+    """Returns [(page_number, payload), ...] for pages start to stop - 1 (0-based) of a PDF.
+
+    Runs in the worker processes, each opening the PDF on its own; page
+    numbers in the result are 1-based.
+    """
+    decoded = {}
+    found = []
+    with open_pdf(pdf_path) as doc:
+        for number in range(start, min(stop, doc.page_count)):
+            found.extend((number + 1, payload) for payload in scan_page(doc[number], decoded))
+    return found
+
+
+def page_ranges(page_count, workers):
+    """Splits page_count pages into (start, stop) chunks for workers processes."""
+    size = max(MIN_PAGES_PER_TASK, -(-page_count // (workers * TASKS_PER_WORKER)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def submit_scan(executor, pdf_path, workers):
+    """Submits the page chunks of a PDF to executor; returns [start, stop, future] per chunk in page order."""
+    with open_pdf(pdf_path) as doc:
+        page_count = doc.page_count
+    return [[start, stop, executor.submit(scan_pages, pdf_path, start, stop)]
+            for start, stop in page_ranges(page_count, workers)]
+
+
+def _resubmit(executor, pending):
+    """Submits the chunks of (pdf_path, chunks) pairs that have no result yet to executor again."""
+    for pdf_path, chunks in pending:
+        if isinstance(chunks, Exception):
+            continue
+        for chunk in chunks:
+            start, stop, future = chunk
+            if not (future.done() and not future.cancelled() and future.exception() is None):
+                chunk[2] = executor.submit(scan_pages, pdf_path, start, stop)
+
+
+def _scan_alone(pdf_path, start, stop):
+    """Scans a page chunk in a one-off worker process, so a crash there fails no other chunk."""
+    with ProcessPoolExecutor(1) as solo:
+        return solo.submit(scan_pages, pdf_path, start, stop).result()
+
+
+def slip_output_path(pdf_path, page, index, width, output_dir=None):
+    """Returns the XML path of the index-th slip (0-based) on a page of a statement.
+
+    The page number is zero-padded to width digits, so the files sort in page order.
+    """
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    suffix = f"_{index + 1}" if index else ""
+    xml_name = f"{stem}_p{page:0{width}d}{suffix}.xml"
+    return os.path.join(output_dir or os.path.dirname(pdf_path), xml_name)
+
+
+def convert_slips(pdf_path, slips, output_dir=None, fast_xml=False, validation=None, schema_path=None,
+                  suppliers_path=None):
+    """Converts the (page_number, payload) slips of a statement; returns one report per slip.
+
+    Payloads that are not UPNQR codes (e.g. a link to the vendor's portal)
+    are skipped, as are slips repeated on a later page.
+    """
+    reports = []
+    seen = set()
+    per_page = {}
+    width = len(str(max((page for page, _ in slips), default=1)))
+    for page, qr_data in slips:
+        if not qr_data.lstrip().startswith("UPNQR"):
+            logger.debug(f"{pdf_path} page {page}: skipping a QR code that is not a UPNQR payload")
+            continue
+        if qr_data in seen:
+            logger.debug(f"{pdf_path} page {page}: skipping a repeated slip")
+            continue
+        seen.add(qr_data)
+        index = per_page.get(page, 0)
+        per_page[page] = index + 1
+
+        report = {"input": pdf_path, "page": page, "output": None, "status": "ok", "error": None}
+        try:
+            _, eslog_data = map_payload(qr_data, suppliers_path)
+            xml, validation_report = generate_invoice_xml(eslog_data, fast_xml, validation, schema_path)
+            output_path = slip_output_path(pdf_path, page, index, width, output_dir)
+            with metrics.stage("write"), open(output_path, "w", encoding="utf-8") as f:
+                f.write(xml)
+            report["output"] = output_path
+            report["invoice_number"] = eslog_data.get('InvoiceNumber', '')
+            report["amount"] = eslog_data.get('Amount', 0.0)
+            if validation:
+                report["validation"] = validation_report
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = f"{type(e).__name__}: {e}"
+        reports.append(report)
+
+    if not reports:
+        reports.append(_failed(pdf_path, ConversionError("No UPNQR code found in the PDF.")))
+    return reports
+
+
+def _failed(pdf_path, error):
+    return {"input": pdf_path, "page": None, "output": None, "status": "failed",
+            "error": f"{type(error).__name__}: {error}"}
+
+
+def _log_report(report):
+    if report["status"] == "ok":
+        logger.info(f"✓ {report['input']} p. {report['page']} -> {report['output']}")
+        for error in (report.get("validation") or {}).get("errors", []):
+            logger.warning(f"  {error['path']}: {error['message']}")
+    else:
+        page = f" p. {report['page']}" if report["page"] else ""
+        logger.error(f"✗ {report['input']}{page}: {report['error']}")
+
+
+def run_statements(inputs, jobs=None, output_dir=None, summary_path=None, fast_xml=False,
+                   validation=None, schema_path=None, suppliers_path=None):
+    """Converts every UPNQR slip of every PDF matched by inputs; returns the summary dict.
+
+    The pages of all PDFs are scanned on one process pool of jobs workers
+    (default: number of CPUs), and each PDF is converted as soon as all of
+    its pages are scanned, in input order. The summary counts slips, not
+    PDFs, and is also written as JSON to summary_path when given.
+
+    When a worker crashes, the pool is restarted and the chunks it still
+    owed are submitted again; the chunk being waited on is scanned alone,
+    so a page range that crashes every time fails on its own.
+    """
+    if validation:
+        load_schema(schema_path)
+    if suppliers_path:
+        logger.info(f"Loaded {len(load_registry(suppliers_path))} suppliers from {suppliers_path}")
+
+    pdf_files = expand_inputs(inputs)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    workers = jobs or os.cpu_count() or 1
+    logger.info(f"Scanning {len(pdf_files)} PDF files for UPNQR slips with {workers} workers...")
+    started = time.perf_counter()
+    reports = []
+    convert = partial(convert_slips, output_dir=output_dir, fast_xml=fast_xml, validation=validation,
+                      schema_path=schema_path, suppliers_path=suppliers_path)
+
+    executor = ProcessPoolExecutor(workers)
+    try:
+        # All PDFs are submitted up front, so the pool stays busy while earlier ones are converted
+        pending = []
+        for pdf_path in pdf_files:
+            try:
+                pending.append((pdf_path, submit_scan(executor, pdf_path, workers)))
+            except Exception as e:
+                pending.append((pdf_path, e))
+        for i, (pdf_path, chunks) in enumerate(pending):
+            slips, failures = [], []
+            try:
+                if isinstance(chunks, Exception):
+                    raise chunks
+                for j, (start, stop, future) in enumerate(chunks):
+                    try:
+                        slips.extend(future.result())
+                        continue
+                    except BrokenProcessPool:
+                        pass
+                    # Chunks still owed by the broken pool go to a new one; this one runs alone
+                    logger.error("A worker process died; restarting the worker pool")
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(workers)
+                    _resubmit(executor, [(pdf_path, chunks[j + 1:])] + pending[i + 1:])
+                    try:
+                        slips.extend(_scan_alone(pdf_path, start, stop))
+                    except BrokenProcessPool as e:
+                        failures.append(_failed(pdf_path, BrokenProcessPool(f"{e} (pages {start + 1}-{stop})")))
+            except Exception as e:
+                document_reports = [_failed(pdf_path, e)]
+            else:
+                document_reports = (convert(pdf_path, slips) if slips or not failures else []) + failures
+            for report in document_reports:
+                _log_report(report)
+            reports.extend(document_reports)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    succeeded = sum(1 for r in reports if r["status"] == "ok")
+    summary = {
+        "documents": len(pdf_files),
+        "total": len(reports),
+        "succeeded": succeeded,
+        "failed": len(reports) - succeeded,
+        "invalid": sum(1 for r in reports if r.get("validation") and not r["validation"]["valid"]),
+        "elapsed": round(time.perf_counter() - started, 4),
+        "invoices": reports,
+    }
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Summary written to {summary_path}")
+
+    logger.info(f"Done: {summary['succeeded']} invoices from {summary['documents']} PDFs, "
+                f"{summary['failed']} failed in {summary['elapsed']:.2f}s")
+    return summary
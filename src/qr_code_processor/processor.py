@@ -1,93 +1,163 @@
-from pyzbar.pyzbar import decode
-from datetime import datetime
+import time
+import threading
+from src.metrics import registry as metrics
+# Parsing moved to upnqr.py; imported here for existing callers
+from src.qr_code_processor.upnqr import parse_upnqr_data  # noqa: F401
+
+# Upscaled variants are skipped when they would exceed this many pixels per side
+MAX_UPSCALED_SIDE = 4000
+
+# Ladder runs before the tier order starts adapting to the observed statistics
+ADAPT_AFTER_RUNS = 20
 
 def decode_qr_code(image):
-    """Decodes a QR code from an image and returns the data."""
-    decoded_objects = decode(image)
+    """Decodes a QR code from an image and returns the data.
+
+    image can be a PIL image or an 8-bit grayscale (pixels, width, height)
+    tuple, which pyzbar scans without any conversion.
+    """
+    # pyzbar loads libzbar through ctypes, so it is only imported for the first decode
+    from pyzbar.pyzbar import decode, ZBarSymbol
+    # Only scan for QR codes instead of every symbology zbar supports
+    decoded_objects = decode(image, symbols=[ZBarSymbol.QRCODE])
     if not decoded_objects:
         return None
     return decoded_objects[0].data.decode("utf-8")
 
-def parse_upnqr_data(data):
-    """Parses UPNQR data into a structured format according to official specification."""
-    lines = data.strip().split('\n')
-    
-    # UPNQR format validation - must have exactly 20 lines
-    if len(lines) < 20 or lines[0] != "UPNQR":
-        return None
-    
-    try:
-        # Parse amount (field 9, in cents)
-        amount_str = lines[8].strip()
-        if amount_str:
-            amount = int(amount_str) / 100.0
-        else:
-            amount = 0.0
-        
-        # Parse payment date (field 10) - convert from DD.MM.YYYY to ISO format
-        payment_date_str = lines[9].strip()
-        payment_date = None
-        if payment_date_str:
-            try:
-                payment_date = datetime.strptime(payment_date_str, "%d.%m.%Y").strftime("%Y-%m-%d")
-            except ValueError:
-                payment_date = payment_date_str
-        
-        # Parse payment deadline (field 14) - convert from DD.MM.YYYY to ISO format
-        due_date_str = lines[13].strip()
-        due_date = None
-        if due_date_str:
-            try:
-                due_date = datetime.strptime(due_date_str, "%d.%m.%Y").strftime("%Y-%m-%d")
-            except ValueError:
-                due_date = due_date_str
-        
-        data_dict = {
-            # Header
-            "format": lines[0].strip(),                  # Should be "UPNQR"
-            
-            # Payer (Plačnik) information - fields 2-8
-            "iban_placnika": lines[1].strip(),          # Payer IBAN (field 2)
-            "polog": lines[2].strip(),                  # Deposit flag (field 3)
-            "dvig": lines[3].strip(),                   # Withdrawal flag (field 4)
-            "referenca_placnika": lines[4].strip(),     # Payer reference (field 5)
-            "ime_placnika": lines[5].strip(),           # Payer name (field 6)
-            "ulica_placnika": lines[6].strip(),         # Payer street (field 7)
-            "kraj_placnika": lines[7].strip(),          # Payer city (field 8)
-            
-            # Payment information - fields 9-14
-            "znesek": amount,                           # Amount in EUR (field 9)
-            "znesek_centi": amount_str,                 # Amount in cents (original)
-            "datum_placila": payment_date,              # Payment date formatted (field 10)
-            "datum_placila_original": payment_date_str, # Payment date original
-            "nujno": lines[10].strip(),                 # Urgent flag (field 11)
-            "koda_namena": lines[11].strip(),           # Purpose code (field 12)
-            "namen": lines[12].strip(),                 # Payment purpose (field 13)
-            "rok_placila": due_date,                    # Due date formatted (field 14)
-            "rok_placila_original": due_date_str,       # Due date original
-            
-            # Receiver (Prejemnik) information - fields 15-19
-            "iban_prejemnika": lines[14].strip(),       # Receiver IBAN (field 15)
-            "referenca_prejemnika": lines[15].strip(),  # Receiver reference (field 16)
-            "ime_prejemnika": lines[16].strip(),        # Receiver name (field 17)
-            "ulica_prejemnika": lines[17].strip(),      # Receiver street (field 18)
-            "kraj_prejemnika": lines[18].strip().replace('鬚', 'Ž'), # Receiver city (field 19)
-            
-            # Checksum
-            "checksum": lines[19].strip() if len(lines) > 19 else "",  # Sum of lengths (field 20)
-        }
-        
-        # Extract invoice number from payment purpose if present
-        namen = data_dict["namen"]
-        if "računa št.:" in namen or "računa št:" in namen:
-            invoice_num = namen.split("računa št")[-1].strip(":. ")
-            data_dict["stevilka_racuna"] = invoice_num
-        else:
-            # Use receiver reference as fallback
-            data_dict["stevilka_racuna"] = data_dict["referenca_prejemnika"]
-        
-        return data_dict
-        
-    except (ValueError, IndexError) as e:
-        print(f"Error parsing UPNQR data: {e}")
-        return None
\ No newline at end of file
+def _gray_image(image):
+    """Returns a PIL grayscale image for a PIL image or a (pixels, width, height) tuple."""
+    from PIL import Image
+    if isinstance(image, tuple):
+        pixels, width, height = image
+        return Image.frombytes("L", (width, height), bytes(pixels))
+    return image if image.mode == "L" else image.convert("L")
+
+def _otsu_threshold(image):
+    """Returns the Otsu threshold of a grayscale image from its histogram."""
+    histogram = image.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    sum_below = weight_below = 0
+    best, threshold = -1.0, 127
+    for t, h in enumerate(histogram):
+        weight_below += h
+        if not weight_below:
+            continue
+        weight_above = total - weight_below
+        if not weight_above:
+            break
+        sum_below += t * h
+        mean_below = sum_below / weight_below
+        mean_above = (sum_all - sum_below) / weight_above
+        between = weight_below * weight_above * (mean_below - mean_above) ** 2
+        if between > best:
+            best, threshold = between, t
+    return threshold
+
+def _binarize(image):
+    t = _otsu_threshold(image)
+    return image.point([0] * (t + 1) + [255] * (255 - t))
+
+def _tier_threshold(image):
+    yield _binarize(image)
+
+def _upscale(factor):
+    def tier(image):
+        from PIL import Image
+        if max(image.size) * factor <= MAX_UPSCALED_SIDE:
+            upscaled = image.resize((image.width * factor, image.height * factor), Image.BICUBIC)
+            yield upscaled
+            yield _binarize(upscaled)
+    return tier
+
+def _tier_sharpen(image):
+    from PIL import ImageFilter, ImageOps
+    sharpened = ImageOps.autocontrast(image, cutoff=1).filter(ImageFilter.UnsharpMask(radius=2, percent=200, threshold=0))
+    yield sharpened
+    yield _binarize(sharpened)
+
+def _tier_rotate(image):
+    from PIL import Image
+    for angle in (15, 30, 45):
+        yield image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+# Preprocessing tiers after the plain decode, cheapest first. Each yields image variants to decode.
+DEFAULT_TIERS = (
+    ("threshold", _tier_threshold),
+    ("upscale2", _upscale(2)),
+    ("upscale3", _upscale(3)),
+    ("sharpen", _tier_sharpen),
+    ("rotate", _tier_rotate),
+)
+
+class DecodeLadder:
+    """Retries a failed QR decode on preprocessed variants of the image, cheapest tier first.
+
+    The tiers run in order and the ladder stops at the first variant that
+    decodes. Attempts, successes and time spent are recorded per tier.
+    With adaptive ordering, once ADAPT_AFTER_RUNS images went through the
+    ladder, tiers are tried in order of observed successes per second
+    spent, so the tiers that actually rescue this kind of input move up.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, adaptive=True):
+        self.tiers = dict(tiers)
+        self.adaptive = adaptive
+        self.runs = 0
+        self._stats = {name: {"attempts": 0, "successes": 0, "seconds": 0.0} for name in self.tiers}
+        self._lock = threading.Lock()
+
+    def order(self):
+        """Returns the tier names in the order the next image will try them."""
+        names = list(self.tiers)
+        if not self.adaptive or self.runs < ADAPT_AFTER_RUNS:
+            return names
+        with self._lock:
+            def rate(name):
+                stats = self._stats[name]
+                # Laplace smoothed success rate per second of average tier cost
+                mean_seconds = (stats["seconds"] + 1e-3) / (stats["attempts"] + 1)
+                return (stats["successes"] + 1) / (stats["attempts"] + 2) / mean_seconds
+            return sorted(names, key=rate, reverse=True)
+
+    def decode(self, image):
+        """Returns the payload decoded from the first tier that succeeds, or None."""
+        gray = _gray_image(image)
+        try:
+            for name in self.order():
+                started = time.perf_counter()
+                qr_data = None
+                for variant in self.tiers[name](gray):
+                    qr_data = decode_qr_code((variant.tobytes(), variant.width, variant.height))
+                    if qr_data:
+                        break
+                self._record(name, qr_data is not None, time.perf_counter() - started)
+                if qr_data:
+                    metrics.count(f"decode_tier_{name}")
+                    return qr_data
+            return None
+        finally:
+            with self._lock:
+                self.runs += 1
+
+    def _record(self, name, success, seconds):
+        with self._lock:
+            stats = self._stats[name]
+            stats["attempts"] += 1
+            stats["successes"] += success
+            stats["seconds"] += seconds
+
+    def stats(self):
+        """Returns {tier: {"attempts", "successes", "seconds"}} collected so far."""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+_ladder = DecodeLadder()
+
+def decode_qr_code_retry(image):
+    """Decodes a QR code that the plain decode_qr_code missed, using the process-wide DecodeLadder."""
+    return _ladder.decode(image)
+
+def decode_ladder_stats():
+    """Returns the per-tier statistics of the process-wide DecodeLadder."""
+    return _ladder.stats()
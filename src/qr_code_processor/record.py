@@ -0,0 +1,150 @@
+from collections.abc import Mapping
+from calendar import isleap
+from datetime import datetime
+
+# Raw UPNQR fields 1-20 in payload order, stored as stripped strings
+RAW_FIELDS = (
+    "format",                   # Should be "UPNQR" (field 1)
+    "iban_placnika",            # Payer IBAN (field 2)
+    "polog",                    # Deposit flag (field 3)
+    "dvig",                     # Withdrawal flag (field 4)
+    "referenca_placnika",       # Payer reference (field 5)
+    "ime_placnika",             # Payer name (field 6)
+    "ulica_placnika",           # Payer street (field 7)
+    "kraj_placnika",            # Payer city (field 8)
+    "znesek_centi",             # Amount in cents (field 9)
+    "datum_placila_original",   # Payment date DD.MM.YYYY (field 10)
+    "nujno",                    # Urgent flag (field 11)
+    "koda_namena",              # Purpose code (field 12)
+    "namen",                    # Payment purpose (field 13)
+    "rok_placila_original",     # Due date DD.MM.YYYY (field 14)
+    "iban_prejemnika",          # Receiver IBAN (field 15)
+    "referenca_prejemnika",     # Receiver reference (field 16)
+    "ime_prejemnika",           # Receiver name (field 17)
+    "ulica_prejemnika",         # Receiver street (field 18)
+    "kraj_prejemnika",          # Receiver city (field 19)
+    "checksum",                 # Sum of lengths (field 20)
+)
+
+# Keys of the dict parse_upnqr_data used to return, in their original order
+KEYS = (
+    "format", "iban_placnika", "polog", "dvig", "referenca_placnika", "ime_placnika",
+    "ulica_placnika", "kraj_placnika", "znesek", "znesek_centi", "datum_placila",
+    "datum_placila_original", "nujno", "koda_namena", "namen", "rok_placila",
+    "rok_placila_original", "iban_prejemnika", "referenca_prejemnika", "ime_prejemnika",
+    "ulica_prejemnika", "kraj_prejemnika", "checksum", "stevilka_racuna",
+)
+_KEY_SET = frozenset(KEYS)
+
+_MONTH_DAYS = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def iso_date(value):
+    """Converts DD.MM.YYYY to YYYY-MM-DD; returns None for an empty value and unknown formats unchanged."""
+    if not value:
+        return None
+    # Fast path for the canonical form; anything else goes through strptime
+    if len(value) == 10 and value[2] == "." and value[5] == ".":
+        digits = value[:2] + value[3:5] + value[6:]
+        if digits.isdecimal():
+            day, month, year = int(digits[:2]), int(digits[2:4]), int(digits[4:])
+            if year and 1 <= month <= 12 and 1 <= day <= (29 if month == 2 and isleap(year) else _MONTH_DAYS[month]):
+                return f"{year}-{month:02d}-{day:02d}"
+            return value
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return value
+
+
+class UpnqrRecord(Mapping):
+    """Parsed UPNQR payment order.
+
+    Only the 20 raw fields are stored, in slots. The amount in EUR, the ISO
+    dates and the invoice number are derived from them on access, so a
+    record takes a fraction of the memory of the old 24-key dict.
+
+    The record is a read-only Mapping with the old dict keys, so
+    record['znesek'] and record.get('rok_placila') keep working;
+    as_dict() returns the plain dict.
+    """
+
+    __slots__ = RAW_FIELDS
+
+    def __init__(self, format="", iban_placnika="", polog="",
+                 dvig="", referenca_placnika="", ime_placnika="",
+                 ulica_placnika="", kraj_placnika="", znesek_centi="",
+                 datum_placila_original="", nujno="", koda_namena="",
+                 namen="", rok_placila_original="", iban_prejemnika="",
+                 referenca_prejemnika="", ime_prejemnika="", ulica_prejemnika="",
+                 kraj_prejemnika="", checksum=""):
+        # Spelled out instead of a setattr loop, which made up half of the parse time
+        self.format = format
+        self.iban_placnika = iban_placnika
+        self.polog = polog
+        self.dvig = dvig
+        self.referenca_placnika = referenca_placnika
+        self.ime_placnika = ime_placnika
+        self.ulica_placnika = ulica_placnika
+        self.kraj_placnika = kraj_placnika
+        self.znesek_centi = znesek_centi
+        self.datum_placila_original = datum_placila_original
+        self.nujno = nujno
+        self.koda_namena = koda_namena
+        self.namen = namen
+        self.rok_placila_original = rok_placila_original
+        self.iban_prejemnika = iban_prejemnika
+        self.referenca_prejemnika = referenca_prejemnika
+        self.ime_prejemnika = ime_prejemnika
+        self.ulica_prejemnika = ulica_prejemnika
+        self.kraj_prejemnika = kraj_prejemnika
+        self.checksum = checksum
+
+    @classmethod
+    def from_mapping(cls, data):
+        """Builds a record from a mapping with the raw field keys, e.g. an as_dict() result."""
+        return cls(*(data.get(name) or "" for name in RAW_FIELDS))
+
+    @property
+    def znesek(self):
+        """Amount in EUR."""
+        return int(self.znesek_centi) / 100.0 if self.znesek_centi else 0.0
+
+    @property
+    def datum_placila(self):
+        """Payment date as YYYY-MM-DD, or None."""
+        return iso_date(self.datum_placila_original)
+
+    @property
+    def rok_placila(self):
+        """Due date as YYYY-MM-DD, or None."""
+        return iso_date(self.rok_placila_original)
+
+    @property
+    def stevilka_racuna(self):
+        """Invoice number from the payment purpose, falling back to the receiver reference."""
+        namen = self.namen
+        if "računa št.:" in namen or "računa št:" in namen:
+            return namen.split("računa št")[-1].strip(":. ")
+        return self.referenca_prejemnika
+
+    def __getitem__(self, key):
+        if key not in _KEY_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __len__(self):
+        return len(KEYS)
+
+    def __reduce__(self):
+        return (UpnqrRecord, tuple(getattr(self, name) for name in RAW_FIELDS))
+
+    def __repr__(self):
+        return f"UpnqrRecord(stevilka_racuna={self.stevilka_racuna!r}, znesek={self.znesek!r}, ime_prejemnika={self.ime_prejemnika!r})"
+
+    def as_dict(self):
+        """Returns the record as the plain dict parse_upnqr_data used to return."""
+        return {key: getattr(self, key) for key in KEYS}
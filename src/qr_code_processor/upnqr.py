@@ -0,0 +1,134 @@
+"""UPNQR payload parsing and validation.
+
+parse_upnqr_data turns the text of a UPN QR code into an UpnqrRecord. It
+splits the payload once, strips the 20 fields and checks the amount
+without any per-field parsing: dates and the amount in EUR are derived
+lazily by the record. parse_many runs the same parser over a list of
+payloads for bulk jobs.
+
+Pass an errors list to also check the payload against the UPN QR
+specification; each problem is appended as a message and the record is
+still returned:
+
+- field 20 must equal the length of fields 1-19 plus their 19 separators
+- the payer and receiver IBANs must pass the ISO 13616 mod-97 check
+- the references must be SIxx (model and up to 22 digits and hyphens)
+  or RFxx (ISO 11649, mod-97 checked)
+
+Importing this module does not load pyzbar, so parsing works without the
+ZBar library.
+"""
+import gc
+import re
+import logging
+from string import ascii_uppercase
+from src.qr_code_processor.record import UpnqrRecord
+
+logger = logging.getLogger(__name__)
+
+FIELD_COUNT = 20
+
+# ZBar reads some ISO-8859-2 letters of the receiver city as CJK characters
+_MOJIBAKE = str.maketrans({"鬚": "Ž"})
+
+# Letters of IBANs and RF references become two digit numbers (A=10 ... Z=35) for mod-97
+_MOD97_DIGITS = str.maketrans({letter: str(i) for i, letter in enumerate(ascii_uppercase, 10)})
+
+_IBAN = re.compile(r"[A-Z]{2}[0-9]{2}[A-Z0-9]{11,30}")
+_SI_REFERENCE = re.compile(r"SI[0-9]{2}[0-9-]{0,22}")
+_RF_REFERENCE = re.compile(r"RF[0-9]{2}[A-Z0-9]{1,21}")
+
+
+def _mod97(value):
+    """Returns the ISO 7064 mod 97-10 remainder of an IBAN or RF reference."""
+    tail = value[4:]
+    if not tail.isdecimal():
+        tail = tail.translate(_MOD97_DIGITS)
+    return int(tail + value[:2].translate(_MOD97_DIGITS) + value[2:4]) % 97
+
+
+def iban_valid(iban):
+    """Returns whether iban (without spaces) has a valid format and check digits."""
+    return _IBAN.fullmatch(iban) is not None and _mod97(iban) == 1
+
+
+def reference_valid(reference):
+    """Returns whether reference is a well-formed SIxx or a check-digit valid RFxx reference.
+
+    SI models with their own control digit (e.g. SI12) are only checked for
+    their format.
+    """
+    if reference.startswith("RF"):
+        return _RF_REFERENCE.fullmatch(reference) is not None and _mod97(reference) == 1
+    return _SI_REFERENCE.fullmatch(reference) is not None
+
+
+def checksum(lines):
+    """Returns the expected field 20 for the raw lines of fields 1-19."""
+    return sum(map(len, lines[:FIELD_COUNT - 1])) + FIELD_COUNT - 1
+
+
+def _check(lines, fields, errors):
+    expected = checksum(lines)
+    if not fields[19].isdecimal() or int(fields[19]) != expected:
+        errors.append(f"Checksum {fields[19]!r} does not match the payload length {expected:03d}")
+    for label, iban in (("Payer", fields[1]), ("Receiver", fields[14])):
+        if iban and not iban_valid(iban):
+            errors.append(f"{label} IBAN {iban} is not valid")
+    for label, reference in (("Payer", fields[4]), ("Receiver", fields[15])):
+        if reference and not reference_valid(reference):
+            errors.append(f"{label} reference {reference} is not valid")
+
+
+def parse_upnqr_data(data, errors=None):
+    """Parses UPNQR data into an UpnqrRecord according to the official specification.
+
+    Returns None if data is not a UPNQR payload. The record is a read-only
+    mapping with the keys of the dict this function used to return;
+    record.as_dict() gives that dict. With an errors list, the payload is
+    also validated and every problem is appended to it.
+    """
+    lines = data.strip().split("\n", FIELD_COUNT)
+
+    # UPNQR format validation - must have exactly 20 lines
+    if len(lines) < FIELD_COUNT or lines[0] != "UPNQR":
+        return None
+
+    fields = [line.strip() for line in lines[:FIELD_COUNT]]
+    # Amount (field 9) must be a whole number of cents
+    amount = fields[8]
+    if amount and not amount.isdecimal():
+        try:
+            int(amount)
+        except ValueError as e:
+            logger.warning(f"Error parsing UPNQR data: {e}")
+            return None
+    # Receiver city (field 19)
+    fields[18] = fields[18].translate(_MOJIBAKE)
+
+    if errors is not None:
+        _check(lines, fields, errors)
+    return UpnqrRecord(*fields)
+
+
+def parse_many(payloads, errors=None):
+    """Parses a list of UPNQR payloads; returns a list of UpnqrRecord or None per payload.
+
+    With an errors list, one list of problems per payload is appended to it.
+    """
+    # Records only hold strings and cannot form cycles, but keeping a million of
+    # them alive makes the cyclic garbage collector rescan them again and again
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if errors is None:
+            return [parse_upnqr_data(payload) for payload in payloads]
+        records = []
+        for payload in payloads:
+            problems = []
+            records.append(parse_upnqr_data(payload, problems))
+            errors.append(problems)
+        return records
+    finally:
+        if gc_was_enabled:
+            gc.enable()
@@ -0,0 +1,355 @@
+"""Long-running HTTP conversion service.
+
+POST a PDF body to /convert and the e-SLOG XML comes back. Conversions run
+in a pool of worker processes that import PyMuPDF, pyzbar (libzbar) and
+lxml once at startup, so a request only pays for the conversion itself.
+
+Endpoints:
+    POST /convert  PDF in the request body -> application/xml
+    GET  /health   JSON with the number of running and queued conversions
+    GET  /metrics  Prometheus text metrics (when started with metrics_options)
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.pipeline.converter import convert_document, ConversionError
+from src.pdf_handler.handler import PdfTooLargeError
+from src.cache.store import open_cache, DEFAULT_MAX_BYTES
+from src.suppliers.registry import load_registry
+from src.metrics import registry as metrics
+from src.metrics.registry import MetricsRegistry
+from src.metrics.exporters import StatsdClient, prometheus_text
+
+logger = logging.getLogger(__name__)
+
+# Largest accepted request body
+DEFAULT_MAX_BODY_BYTES = 20 * 1024 * 1024
+
+# Largest accepted request line plus headers
+MAX_HEADER_BYTES = 16 * 1024
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+# Set in each worker process by _warm_up
+_worker_cache = None
+_worker_suppliers_path = None
+
+
+def _warm_up(cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, metrics_options=None, suppliers_path=None):
+    """Worker initializer: loads the heavy libraries before the first request arrives."""
+    global _worker_cache, _worker_suppliers_path
+    import fitz  # noqa: F401
+    import pyzbar.pyzbar  # noqa: F401  (loads libzbar)
+    from lxml import etree  # noqa: F401
+    if cache_dir:
+        _worker_cache = open_cache(cache_dir, cache_max_bytes)
+    if metrics_options is not None:
+        metrics.enable(**metrics_options)
+    if suppliers_path:
+        load_registry(suppliers_path)
+        _worker_suppliers_path = suppliers_path
+
+
+def _convert_bytes(pdf_bytes):
+    """Converts PDF contents in a worker process.
+
+    Returns the XML as UTF-8 bytes and the metrics record of the conversion
+    (None unless metrics are enabled).
+    """
+    import fitz
+    with metrics.document("request") as record:
+        try:
+            result = convert_document(pdf_bytes, _worker_cache, suppliers_path=_worker_suppliers_path)
+        except fitz.FileDataError as e:
+            raise ConversionError(f"Not a readable PDF: {e}")
+        except PdfTooLargeError as e:
+            raise ConversionError(str(e))
+    return result["xml"].encode("utf-8"), record
+
+
+def _pool_context():
+    """Returns the multiprocessing context of the worker pools.
+
+    Replacement pools are started while client connections are open;
+    forked workers would inherit those sockets and keep them open after the
+    server closes them. A fork server starts workers from a clean process.
+    PyInstaller builds keep the default start method.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods() and not getattr(sys, "frozen", False):
+        return multiprocessing.get_context("forkserver")
+    return None
+
+
+class HttpError(Exception):
+    """Aborts a request with the given HTTP status."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ConversionServer:
+    """asyncio HTTP server that hands PDF conversions to warmed worker processes.
+
+    At most max_concurrency conversions run at once and at most max_queue
+    more wait for a free worker; further requests get 503 right away
+    instead of piling up. A conversion that takes longer than timeout
+    seconds is answered with 504.
+
+    Every worker process runs in its own single-process executor, so a
+    worker that crashes (e.g. a MuPDF segfault) or overruns the timeout is
+    killed and replaced on its own while the other workers carry on. Its
+    slot is only freed once the replacement is started, so timeouts cannot
+    oversubscribe the workers. A request whose worker crashed gets 503.
+
+    With metrics_options (the keyword arguments of metrics.enable), the
+    workers instrument every conversion; the records are aggregated here,
+    served on /metrics and sent to the StatsD server at statsd ('host:port').
+
+    suppliers_path names the supplier registry for the seller IDs; each
+    worker loads it once at startup.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=None, max_concurrency=None,
+                 max_queue=32, timeout=30.0, max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                 cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, metrics_options=None, statsd=None,
+                 suppliers_path=None):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count()
+        self.max_concurrency = max_concurrency or self.workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.metrics_options = metrics_options
+        self.suppliers_path = suppliers_path
+        self.registry = MetricsRegistry() if metrics_options is not None else None
+        self.statsd = StatsdClient(statsd) if statsd and self.registry is not None else None
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = None
+        # Single-process executors: all of them, and those free for the next conversion
+        self._workers = set()
+        self._idle = None
+
+    def _start_worker(self):
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=_pool_context(),
+            initializer=_warm_up,
+            initargs=(self.cache_dir, self.cache_max_bytes, self.metrics_options, self.suppliers_path),
+        )
+        # Starts the process and loads the libraries before a request needs them
+        executor.submit(os.getpid)
+        self._workers.add(executor)
+        return executor
+
+    def _replace_worker(self, executor):
+        """Kills the process of a stuck or crashed worker and makes a fresh one available."""
+        self._workers.discard(executor)
+        # shutdown() drops the process table, so keep it for killing the worker
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+        self._idle.put_nowait(self._start_worker())
+
+    async def serve_forever(self):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._idle = asyncio.Queue()
+        try:
+            for _ in range(self.workers):
+                self._idle.put_nowait(self._start_worker())
+            # Wait until every worker is warm rather than making the first requests wait
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, os.getpid) for executor in self._workers
+            ))
+            server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            logger.info(f"Listening on http://{self.host}:{self.port} with {self.workers} workers")
+            async with server:
+                await server.serve_forever()
+        finally:
+            for executor in self._workers:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._respond_error(writer, e, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, content_type, payload = await self._dispatch(method, path, body)
+                    await self._respond(writer, status, content_type, payload, keep_alive=keep_alive)
+                except HttpError as e:
+                    await self._respond_error(writer, e, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Returns (method, path, headers, body), or None when the client closed the connection."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "Request headers too large")
+        if len(head) > MAX_HEADER_BYTES:
+            raise HttpError(400, "Request headers too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        # Bodies of other methods are read too (and ignored) so the next request starts in the right place
+        if "transfer-encoding" in headers or (method == "POST" and "content-length" not in headers):
+            raise HttpError(411, "Content-Length is required")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > self.max_body_bytes:
+            raise HttpError(413, f"Request body exceeds {self.max_body_bytes} bytes")
+        body = await reader.readexactly(length)
+        return method, path, headers, body
+
+    async def _dispatch(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if method != "GET":
+                raise HttpError(405, "Use GET")
+            payload = json.dumps({"status": "ok", "in_flight": self.in_flight, "queued": self.queued})
+            return 200, "application/json", payload.encode("utf-8")
+        if path == "/metrics":
+            if self.registry is None:
+                raise HttpError(404, "Metrics are not enabled")
+            if method != "GET":
+                raise HttpError(405, "Use GET")
+            return 200, "text/plain; version=0.0.4", prometheus_text(self.registry).encode("utf-8")
+        if path == "/convert":
+            if method != "POST":
+                raise HttpError(405, "Use POST")
+            if not body:
+                raise HttpError(400, "Empty request body")
+            return 200, "application/xml; charset=utf-8", await self._convert(body)
+        raise HttpError(404, f"Unknown path {path}")
+
+    async def _convert(self, pdf_bytes):
+        if self._slots.locked() and self.queued >= self.max_queue:
+            raise HttpError(503, "Too many pending conversions", {"Retry-After": "1"})
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            executor = await self._idle.get()
+            future = asyncio.get_running_loop().run_in_executor(executor, _convert_bytes, pdf_bytes)
+        except BaseException:
+            self.in_flight -= 1
+            self._slots.release()
+            raise
+
+        def release(done):
+            # Also marks the error as retrieved when the request timed out and no longer awaits it
+            crashed = not done.cancelled() and isinstance(done.exception(), BrokenProcessPool)
+            if executor in self._workers:  # Otherwise it was replaced after a timeout
+                if crashed:
+                    logger.error("A worker process died; replacing it")
+                    self._replace_worker(executor)
+                else:
+                    self._idle.put_nowait(executor)
+            self.in_flight -= 1
+            self._slots.release()
+
+        future.add_done_callback(release)
+        if self.registry is not None:
+            future.add_done_callback(self._record_metrics)
+        try:
+            xml, _ = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            return xml
+        except asyncio.TimeoutError:
+            logger.warning(f"Conversion did not finish within {self.timeout:g}s; replacing its worker")
+            self._replace_worker(executor)
+            raise HttpError(504, f"Conversion did not finish within {self.timeout:g}s")
+        except BrokenProcessPool:
+            raise HttpError(503, "Conversion worker crashed", {"Retry-After": "1"})
+        except ConversionError as e:
+            raise HttpError(422, str(e))
+        except Exception as e:
+            logger.error(f"Conversion failed: {e}", exc_info=True)
+            raise HttpError(500, f"{type(e).__name__}: {e}")
+
+    def _record_metrics(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.registry.add_failure()
+            return
+        _, record = future.result()
+        self.registry.add(record)
+        if self.statsd is not None:
+            self.statsd.send_record(record)
+
+    async def _respond_error(self, writer, error, keep_alive):
+        payload = json.dumps({"error": str(error)}, ensure_ascii=False).encode("utf-8")
+        await self._respond(writer, error.status, "application/json", payload, error.headers, keep_alive)
+
+    async def _respond(self, writer, status, content_type, payload, headers=None, keep_alive=True):
+        lines = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+
+def run_server(**options):
+    """Runs a ConversionServer until interrupted. Takes the ConversionServer arguments."""
+    try:
+        asyncio.run(ConversionServer(**options).serve_forever())
+    except KeyboardInterrupt:
+        logger.info("Server stopped")
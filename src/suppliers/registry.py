@@ -0,0 +1,225 @@
+"""Supplier master data: VAT ID, legal ID and default tax rate per invoice issuer.
+
+UPNQR codes carry the receiver's IBAN and name but no tax data, so the
+e-SLOG seller VAT and legal IDs come from a supplier registry. A registry
+is loaded from a CSV file or an SQLite database into memory once per
+process and indexed three ways:
+
+- by IBAN (a supplier may list several)
+- by normalized name: case, accents, punctuation and legal forms such
+  as "d.o.o." are ignored, so "NGEN d.o.o." and "Ngen doo" are one key
+- by name token, for fuzzy matches of names that differ slightly from the
+  registry (typos, a short word more or less); a name that only shares
+  words with a supplier, e.g. a subsidiary, does not match
+
+Name lookups go through an LRU cache, since the same suppliers come back
+on every batch, so a repeated name costs neither normalization nor fuzzy
+matching again.
+
+IBAN and exact name lookups are dictionary hits, so mapping an invoice
+costs the same with 20 or 20,000 suppliers.
+
+CSV files need a header row with the columns name, vat_id, legal_id,
+iban and tax_rate (only name is required; ',' or ';' separated, several
+IBANs separated by spaces or ';'). SQLite databases need a suppliers table
+with the same columns.
+
+The built-in suppliers (BUILTIN_SUPPLIERS) are part of every registry;
+entries loaded from a file take precedence. As before there was a
+registry, NGEN is also matched by any receiver name that contains "NGEN"
+(BUILTIN_NAME_WORDS) when no other supplier matches.
+"""
+import os
+import re
+import csv
+import sqlite3
+import logging
+import unicodedata
+from collections import namedtuple
+from difflib import SequenceMatcher
+from functools import lru_cache
+from src.cache.store import hash_file
+
+logger = logging.getLogger(__name__)
+
+# ibans is a tuple; tax_rate is None when the supplier has no default rate
+Supplier = namedtuple("Supplier", "name vat_id legal_id ibans tax_rate")
+
+BUILTIN_SUPPLIERS = (
+    Supplier("NGEN d.o.o.", "SI24576239", "8209901000", (), None),
+)
+
+# Built-in suppliers matched by a word anywhere in the uppercased receiver
+# name, such as "NGEN d.o.o. Ljubljana", when no name matches otherwise
+BUILTIN_NAME_WORDS = {"NGEN": BUILTIN_SUPPLIERS[0].name}
+
+# Legal form abbreviations, after normalization (dots removed)
+LEGAL_FORMS = frozenset({"doo", "dd", "sp", "dno", "kd", "zoo", "kdd", "so", "ltd", "gmbh", "ag", "srl", "spa"})
+
+# Minimum SequenceMatcher ratio of a fuzzy name match
+FUZZY_THRESHOLD = 0.85
+
+# Name lookups remembered per registry
+NAME_CACHE_SIZE = 4096
+
+# Tokens shared by more suppliers than this (e.g. "elektro") do not select fuzzy candidates
+MAX_TOKEN_SUPPLIERS = 500
+
+SQLITE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+
+
+class SupplierRegistryError(ValueError):
+    """Raised when a supplier file cannot be read."""
+
+
+def normalize_name(name):
+    """Returns the lookup key of a company name: lowercase ASCII words without legal forms."""
+    text = unicodedata.normalize("NFKD", name.casefold().replace(".", ""))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(token for token in re.findall(r"[a-z0-9]+", text)
+                    if len(token) > 1 and token not in LEGAL_FORMS)
+
+
+def normalize_iban(iban):
+    return iban.replace(" ", "").upper()
+
+
+class SupplierRegistry:
+    """In-memory supplier index; see the module docstring."""
+
+    def __init__(self, suppliers=(), fingerprint=""):
+        self.fingerprint = fingerprint
+        self._by_iban = {}
+        self._by_name = {}
+        self._by_token = {}
+        self._lookup_name = lru_cache(maxsize=NAME_CACHE_SIZE)(self._match_name)
+        for supplier in BUILTIN_SUPPLIERS:
+            self.add(supplier)
+        for supplier in suppliers:
+            self.add(supplier)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def add(self, supplier):
+        self._lookup_name.cache_clear()
+        for iban in supplier.ibans:
+            self._by_iban[normalize_iban(iban)] = supplier
+        key = normalize_name(supplier.name)
+        if key:
+            self._by_name[key] = supplier
+            for token in key.split():
+                self._by_token.setdefault(token, set()).add(key)
+
+    def lookup(self, iban="", name=""):
+        """Returns the Supplier for a receiver IBAN and name, or None.
+
+        The IBAN is tried first, then the exact normalized name, then the
+        closest fuzzy name match.
+        """
+        if iban:
+            supplier = self._by_iban.get(normalize_iban(iban))
+            if supplier is not None:
+                return supplier
+        return self._lookup_name(name) if name else None
+
+    def _match_name(self, name):
+        """Returns the supplier with the same normalized name, or the closest fuzzy match, or None.
+
+        Fuzzy candidates share at least one distinctive word with the name,
+        and the SequenceMatcher ratio of the two names must reach
+        FUZZY_THRESHOLD. Sharing words is not enough: "Petrol Plin" is a
+        different company than "Petrol", so it gets no IDs rather than
+        Petrol's, and a warning is logged. Names without a match still get
+        the built-in supplier of a BUILTIN_NAME_WORDS word they contain.
+        """
+        key = normalize_name(name)
+        if key in self._by_name or not key:
+            return self._by_name.get(key)
+
+        supplier = self._match_fuzzy(key, name)
+        if supplier is None:
+            upper = name.upper()
+            for word, builtin in BUILTIN_NAME_WORDS.items():
+                if word in upper:
+                    return self._by_name.get(normalize_name(builtin))
+        return supplier
+
+    def _match_fuzzy(self, key, name):
+
+        tokens = key.split()
+        postings = [self._by_token[token] for token in tokens if token in self._by_token]
+        candidates = set().union(*(p for p in postings if len(p) <= MAX_TOKEN_SUPPLIERS))
+        if not candidates and postings:
+            candidates = min(postings, key=len)
+
+        best, best_score = None, (0.0, 0)
+        for candidate in sorted(candidates):
+            score = (SequenceMatcher(None, key, candidate).ratio(), len(candidate.split()))
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is None:
+            return None
+        if best_score[0] < FUZZY_THRESHOLD:
+            if not any(word in name.upper() for word in BUILTIN_NAME_WORDS):
+                logger.warning(f"No supplier matches {name!r} (closest: {self._by_name[best].name!r}, "
+                               f"similarity {best_score[0]:.2f}); the seller VAT and legal IDs are left empty")
+            return None
+        return self._by_name[best]
+
+
+def _parse_row(row, source):
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise SupplierRegistryError(f"{source}: supplier without a name: {dict(row)}")
+    tax_rate = row.get("tax_rate")
+    try:
+        tax_rate = float(str(tax_rate).replace(",", ".")) if tax_rate not in (None, "") else None
+    except ValueError:
+        raise SupplierRegistryError(f"{source}: invalid tax_rate {tax_rate!r} for {name}") from None
+    ibans = tuple(iban for iban in re.split(r"[;\s]+", row.get("iban") or "") if iban)
+    return Supplier(name, (row.get("vat_id") or "").strip(), (row.get("legal_id") or "").strip(), ibans, tax_rate)
+
+
+def read_csv(path):
+    """Returns the suppliers of a CSV file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = f.readline()
+        f.seek(0)
+        delimiter = ";" if header.count(";") > header.count(",") else ","
+        reader = csv.DictReader(f, delimiter=delimiter)
+        if "name" not in (reader.fieldnames or ()):
+            raise SupplierRegistryError(f"{path}: the CSV header has no 'name' column")
+        return [_parse_row(row, path) for row in reader]
+
+
+def read_sqlite(path):
+    """Returns the suppliers of the suppliers table of an SQLite database."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(suppliers)")}
+        if "name" not in columns:
+            raise SupplierRegistryError(f"{path}: no suppliers table with a name column")
+        selected = ", ".join(c if c in columns else f"NULL AS {c}"
+                             for c in ("name", "vat_id", "legal_id", "iban", "tax_rate"))
+        return [_parse_row(dict(row), path) for row in conn.execute(f"SELECT {selected} FROM suppliers")]
+    finally:
+        conn.close()
+
+
+@lru_cache(maxsize=None)
+def load_registry(path=None):
+    """Returns the SupplierRegistry of a CSV or SQLite file, loading it only on the first call per path.
+
+    Without a path, the registry holds the built-in suppliers only.
+    """
+    if not path:
+        return SupplierRegistry()
+    if not os.path.exists(path):
+        raise SupplierRegistryError(f"Supplier registry not found: {path}")
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        suppliers = read_sqlite(path)
+    else:
+        suppliers = read_csv(path)
+    return SupplierRegistry(suppliers, fingerprint=hash_file(path))
@@ -0,0 +1,91 @@
+import os
+import time
+import sqlite3
+from src.cache.store import hash_file
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    processed_at REAL NOT NULL
+);
+"""
+
+
+class FileIndex:
+    """Persistent record of the PDFs a watcher has already converted, stored in SQLite.
+
+    Each path maps to the size, mtime and content hash it had when it was
+    converted, plus the outcome ("ok" or "failed"), the output path and the
+    error. A file only needs converting again when it is new or its
+    contents changed: an unchanged size and mtime settle that with a stat,
+    and a touched file whose content hash still matches is not converted
+    again either.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def stats(self):
+        """Returns {path: (size, mtime_ns)} of every indexed file, for a fast startup scan."""
+        return {path: (size, mtime_ns) for path, size, mtime_ns
+                in self._conn.execute("SELECT path, size, mtime_ns FROM files")}
+
+    def get(self, path):
+        """Returns the index entry of a path as a dict, or None."""
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, content_hash, status, output, error, processed_at FROM files WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("size", "mtime_ns", "content_hash", "status", "output", "error", "processed_at")
+        return dict(zip(keys, row))
+
+    def check(self, path, stat=None):
+        """Returns (needs_processing, content_hash) for a file on disk.
+
+        The content hash is only computed when size or mtime differ from
+        the index; it is None when the stat alone shows the file is unchanged.
+        """
+        stat = stat or os.stat(path)
+        entry = self.get(path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return False, None
+        content_hash = hash_file(path)
+        if entry is not None and entry["content_hash"] == content_hash:
+            # Touched or copied over with the same contents: remember the new stat only
+            self._conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                (stat.st_size, stat.st_mtime_ns, path),
+            )
+            return False, content_hash
+        return True, content_hash
+
+    def record(self, path, stat, content_hash, status, output=None, error=None):
+        """Stores the outcome of converting a file."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, content_hash, status, output, error, time.time()),
+        )
+
+    def forget(self, path):
+        self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def counts(self):
+        """Returns {status: number of files}."""
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status"))
+
+    def close(self):
+        self._conn.close()
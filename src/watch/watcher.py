@@ -0,0 +1,321 @@
+"""Watch mode: converts PDFs as they arrive in one or more inbox directories.
+
+A FileIndex remembers every converted file, so only new or changed PDFs
+are converted, also across restarts. At startup the inboxes are scanned
+once and compared with the index by size and mtime (one stat per file,
+no hashing), then the watcher waits for changes:
+
+- on Linux through inotify (via ctypes, no extra dependency), reacting to
+  files that are closed after writing or moved into an inbox
+- elsewhere, or with poll=True, by rescanning the inboxes every
+  poll_interval seconds
+
+Changed paths go through a DebounceQueue and are converted only once no
+new event arrived for debounce seconds, so a scanner that writes a file
+in several steps triggers a single conversion.
+"""
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import struct
+import logging
+from functools import partial
+from concurrent.futures import wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+INDEX_NAME = ".eslog-index.sqlite3"
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def is_pdf(path):
+    return path.lower().endswith(".pdf")
+
+
+def scan_directories(directories):
+    """Returns {path: (size, mtime_ns)} of the PDFs directly inside the directories."""
+    found = {}
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if is_pdf(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    found[os.path.normpath(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+def _ignore_interrupts():
+    """Worker initializer: leaves Ctrl+C to the watcher, which shuts the pool down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class InotifySource:
+    """Reports PDFs written or moved into directories, using Linux inotify."""
+
+    def __init__(self, directories):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+            self._directories[wd] = directory
+
+    def wait(self, timeout):
+        """Returns (paths, rescan): the PDFs that changed within timeout seconds,
+        and whether events were lost so the directories must be rescanned."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+
+        paths, rescan, offset = [], False, 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+            elif name and is_pdf(name) and wd in self._directories:
+                paths.append(os.path.normpath(os.path.join(self._directories[wd], name)))
+        return paths, rescan
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingSource:
+    """Reports changed PDFs by rescanning the directories every interval seconds."""
+
+    def __init__(self, directories, interval=DEFAULT_POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self._snapshot = scan_directories(directories)
+        self._next_scan = time.monotonic() + interval
+
+    def wait(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return [], False
+        time.sleep(max(delay, 0))
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = scan_directories(self.directories)
+        changed = [path for path, stat in snapshot.items() if self._snapshot.get(path) != stat]
+        self._snapshot = snapshot
+        return changed, False
+
+    def close(self):
+        pass
+
+
+def open_source(directories, poll=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Returns an InotifySource where available, otherwise a PollingSource."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifySource(directories)
+        except (OSError, AttributeError) as e:
+            # AttributeError: libc without inotify; ENOSPC: out of inotify watches
+            level = logging.WARNING if getattr(e, "errno", None) == errno.ENOSPC else logging.DEBUG
+            logger.log(level, f"inotify unavailable ({e}), falling back to polling")
+    return PollingSource(directories, poll_interval)
+
+
+class DebounceQueue:
+    """Holds paths until no new event arrived for them for delay seconds."""
+
+    def __init__(self, delay=DEFAULT_DEBOUNCE):
+        self.delay = delay
+        self._due = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def touch(self, path, now=None):
+        self._due[path] = (now if now is not None else time.monotonic()) + self.delay
+
+    def next_due(self):
+        """Returns the monotonic time the next path becomes due, or None when empty."""
+        return min(self._due.values(), default=None)
+
+    def pop_due(self, now=None):
+        now = now if now is not None else time.monotonic()
+        due = [path for path, at in self._due.items() if at <= now]
+        for path in due:
+            del self._due[path]
+        return due
+
+
+class InboxWatcher:
+    """Converts new and changed PDFs in inbox directories across a process pool.
+
+    convert_options are passed on to pipeline.batch.convert_one (cache_dir,
+    fast_xml, validation, ...). The index is stored in index_path, by
+    default a hidden file in the first directory.
+
+    A worker that dies (e.g. MuPDF crashing on a PDF) takes down the pool
+    and every conversion running in it. The pool is then replaced and those
+    files are converted again one at a time, while other files wait, so
+    only the file that crashes again is recorded as failed.
+    """
+
+    def __init__(self, directories, output_dir=None, jobs=None, index_path=None,
+                 debounce=DEFAULT_DEBOUNCE, poll=False, poll_interval=DEFAULT_POLL_INTERVAL,
+                 **convert_options):
+        self.directories = [os.path.normpath(d) for d in directories]
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                raise NotADirectoryError(f"Not a directory: {directory}")
+        self.output_dir = output_dir
+        self.jobs = jobs
+        # Imported here so main.py can read the defaults above without loading
+        # the converter, SQLite and the process pool
+        from src.watch.index import FileIndex
+        from src.pipeline.batch import convert_one
+        self.index = FileIndex(index_path or os.path.join(self.directories[0], INDEX_NAME))
+        self.queue = DebounceQueue(debounce)
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.converted = 0
+        self.failed = 0
+        self._convert = partial(convert_one, output_dir=output_dir, **convert_options)
+        self._pending = {}
+        # Files whose conversion died with the pool, to be converted again on their own
+        self._suspects = []
+        self._isolated = None
+        self._pool_broken = False
+
+    def scan(self, now=None):
+        """Queues every PDF that is not in the index with its current size and mtime."""
+        known = self.index.stats()
+        changed = [path for path, stat in scan_directories(self.directories).items() if known.get(path) != stat]
+        for path in changed:
+            self.queue.touch(path, now)
+        return len(changed)
+
+    def _submit(self, executor, path):
+        if path in {p for p, _, _ in self._pending.values()}:
+            # Still converting the previous version; look at it again afterwards
+            self.queue.touch(path)
+            return
+        try:
+            stat = os.stat(path)
+            needed, content_hash = self.index.check(path, stat)
+        except FileNotFoundError:
+            self.index.forget(path)
+            return
+        if needed:
+            self._pending[executor.submit(self._convert, path)] = (path, stat, content_hash)
+
+    def _start_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        self._pool_broken = False
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=_ignore_interrupts)
+
+    def _collect(self, futures):
+        for future in futures:
+            path, stat, content_hash = self._pending.pop(future)
+            try:
+                report = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._pool_broken = True
+                    if path != self._isolated:
+                        logger.warning(f"Worker died while converting {path}; converting it again on its own")
+                        self._suspects.append(path)
+                        continue
+                report = {"status": "failed", "output": None, "error": f"{type(e).__name__}: {e}"}
+            self.index.record(path, stat, content_hash, report["status"], report["output"], report["error"])
+            if report["status"] == "ok":
+                self.converted += 1
+                logger.info(f"✓ {path} -> {report['output']}")
+            else:
+                self.failed += 1
+                logger.error(f"✗ {path}: {report['error']}")
+
+    def run(self, once=False):
+        """Converts the backlog, then keeps watching until interrupted.
+
+        With once, returns as soon as the backlog found by the startup scan
+        is converted. Returns {"converted": n, "failed": n}.
+        """
+        backlog = self.scan(now=time.monotonic() - self.queue.delay)
+        logger.info(f"{backlog} new or changed PDFs in {', '.join(self.directories)}")
+        source = None if once else open_source(self.directories, self.poll, self.poll_interval)
+        if source is not None:
+            logger.info(f"Watching for new PDFs ({type(source).__name__})...")
+
+        executor = self._start_pool()
+        try:
+            while True:
+                if self._pool_broken:
+                    logger.error("A worker process died; restarting the worker pool")
+                    executor.shutdown(wait=False)
+                    executor = self._start_pool()
+
+                isolating = self._suspects or (self._isolated and self._pending)
+                if not isolating:
+                    self._isolated = None
+                    for path in self.queue.pop_due():
+                        self._submit(executor, path)
+                elif not self._pending:
+                    self._isolated = self._suspects.pop(0)
+                    self._submit(executor, self._isolated)
+
+                if once and not self.queue and not self._pending and not self._suspects:
+                    break
+
+                timeout = self.poll_interval
+                next_due = self.queue.next_due()
+                if next_due is not None and not isolating:
+                    timeout = max(0.0, min(timeout, next_due - time.monotonic()))
+
+                if source is None:
+                    if self._pending:
+                        done, _ = wait(self._pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                        self._collect(done)
+                    elif not self._suspects:
+                        # Only files that are not due yet
+                        time.sleep(timeout)
+                    continue
+
+                if self._pending:
+                    timeout = min(timeout, 0.2)
+                paths, rescan = source.wait(timeout)
+                if rescan:
+                    self.scan()
+                for path in paths:
+                    self.queue.touch(path)
+                self._collect([f for f in list(self._pending) if f.done()])
+        except KeyboardInterrupt:
+            logger.info("Watcher stopped")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._collect([f for f in list(self._pending) if f.done() and not f.cancelled()])
+            if source is not None:
+                source.close()
+            self.index.close()
+        return {"converted": self.converted, "failed": self.failed}
@@ -1,9 +1,40 @@
-from lxml import etree
 from datetime import datetime
 import re
+from src.xml_generator.invoice import EslogInvoice
+from src.xml_generator.amounts import (
+    DEFAULT_TAX_RATE, format_amount, format_rate, invoice_totals, rate_points, vat_category,
+)
+from src.suppliers.registry import load_registry
 
-def generate_eslog_xml(data):
-    """Generates a proper e-SLOG 2.0 XML file according to official specification."""
+def compute_amounts(data):
+    """Returns (total with VAT, tax rate, base amount, tax amount) for a single-rate invoice, in EUR.
+
+    Kept for existing callers; the XML generators use amounts.invoice_totals,
+    which works in cents.
+    """
+    totals = invoice_totals(data)
+    rate = totals.breakdown[0].rate if totals.breakdown else rate_points(data.get('TaxRate', DEFAULT_TAX_RATE))
+    return totals.payable / 100, rate / 100, totals.net / 100, totals.tax / 100
+
+def split_address(address):
+    """Splits 'street, 1234 City' into (street, city, postal code).
+
+    city and postal code are None when the second part is not a Slovenian
+    postal code followed by a city name.
+    """
+    address_parts = address.split(',')
+    street = address_parts[0].strip()
+    city = postal_code = None
+    if len(address_parts) > 1:
+        city_part = address_parts[1].strip()
+        match = re.match(r'(\d{4})\s+(.+)', city_part)
+        if match:
+            city, postal_code = match.group(2), match.group(1)
+    return street, city, postal_code
+
+def build_eslog_tree(data):
+    """Builds the e-SLOG 2.0 Invoice element tree according to official specification."""
+    from lxml import etree
     
     # Define the correct namespace for e-SLOG 2.0
     NS = 'urn:eslog:2.00'
@@ -26,14 +57,8 @@ def generate_eslog_xml(data):
             elem.text = str(text)
         return elem
     
-    # Calculate amounts properly
-    total_amount_with_vat = float(data.get('Amount', 0.0))
-    tax_rate = float(data.get('TaxRate', 22.0))
-    tax_rate_decimal = tax_rate / 100
-    
-    # Calculate base amount (without VAT) and tax amount
-    base_amount = round(total_amount_with_vat / (1 + tax_rate_decimal), 2)
-    tax_amount = round(total_amount_with_vat - base_amount, 2)
+    # Amounts in integer cents (see amounts.py)
+    totals = invoice_totals(data)
     
     # 1. UNH - Message Header
     s_unh = add_element(m_invoic, 'S_UNH')
@@ -107,19 +132,14 @@ def generate_eslog_xml(data):
         # Buyer address
         buyer_address = data.get('BuyerAddress', '')
         if buyer_address:
-            address_parts = buyer_address.split(',')
+            street, city, postal_code = split_address(buyer_address)
             c_c059_buyer = add_element(s_nad_buyer, 'C_C059')
+            add_element(c_c059_buyer, 'D_3042', street)
             
-            if len(address_parts) > 0:
-                add_element(c_c059_buyer, 'D_3042', address_parts[0].strip())
-            
-            # Extract postal code and city
-            if len(address_parts) > 1:
-                city_part = address_parts[1].strip()
-                match = re.match(r'(\d{4})\s+(.+)', city_part)
-                if match:
-                    add_element(s_nad_buyer, 'D_3164', match.group(2))  # City name
-                    add_element(s_nad_buyer, 'D_3251', match.group(1))  # Postal code
+            # Postal code and city
+            if city:
+                add_element(s_nad_buyer, 'D_3164', city)  # City name
+                add_element(s_nad_buyer, 'D_3251', postal_code)  # Postal code
         
         add_element(s_nad_buyer, 'D_3207', 'SI')  # Country code
     
@@ -136,19 +156,14 @@ def generate_eslog_xml(data):
         # Seller address
         seller_address = data.get('SellerAddress', '')
         if seller_address:
-            address_parts = seller_address.split(',')
+            street, city, postal_code = split_address(seller_address)
             c_c059_seller = add_element(s_nad_seller, 'C_C059')
+            add_element(c_c059_seller, 'D_3042', street)
             
-            if len(address_parts) > 0:
-                add_element(c_c059_seller, 'D_3042', address_parts[0].strip())
-            
-            # Extract postal code and city
-            if len(address_parts) > 1:
-                city_part = address_parts[1].strip()
-                match = re.match(r'(\d{4})\s+(.+)', city_part)
-                if match:
-                    add_element(s_nad_seller, 'D_3164', match.group(2))  # City name
-                    add_element(s_nad_seller, 'D_3251', match.group(1))  # Postal code
+            # Postal code and city
+            if city:
+                add_element(s_nad_seller, 'D_3164', city)  # City name
+                add_element(s_nad_seller, 'D_3251', postal_code)  # Postal code
         
         add_element(s_nad_seller, 'D_3207', 'SI')  # Country code
         
@@ -198,53 +213,54 @@ def generate_eslog_xml(data):
     c_c534 = add_element(s_pai, 'C_C534')
     add_element(c_c534, 'D_4461', '30')  # Payment means code (30 = Credit transfer)
     
-    # 8. SG26 - Line Details
-    g_sg26 = add_element(m_invoic, 'G_SG26')
-    s_lin = add_element(g_sg26, 'S_LIN')
-    add_element(s_lin, 'D_1082', '1')  # Line item number
-    
-    # Item description
-    s_imd = add_element(g_sg26, 'S_IMD')
-    add_element(s_imd, 'D_7077', 'F')  # Item description type (F = Free-form)
-    c_c273 = add_element(s_imd, 'C_C273')
-    add_element(c_c273, 'D_7008', data.get('ItemDescription', 'Storitev po računu'))
-    
-    # Quantity
-    s_qty = add_element(g_sg26, 'S_QTY')
-    c_c186 = add_element(s_qty, 'C_C186')
-    add_element(c_c186, 'D_6063', '47')      # Quantity qualifier (47 = Invoiced quantity)
-    add_element(c_c186, 'D_6060', '1')       # Quantity
-    add_element(c_c186, 'D_6411', 'C62')     # Measure unit qualifier (C62 = One/each)
-    
-    # BT-131: Invoice line net amount (line amount without VAT)
-    g_sg27 = add_element(g_sg26, 'G_SG27')
-    s_moa_line = add_element(g_sg27, 'S_MOA')
-    c_c516_line = add_element(s_moa_line, 'C_C516')
-    add_element(c_c516_line, 'D_5025', '203')  # Monetary amount type (203 = Line item amount)
-    add_element(c_c516_line, 'D_5004', f"{base_amount:.2f}")  # Line net amount (without VAT)
-    
-    # Price details (net price)
-    g_sg29 = add_element(g_sg26, 'G_SG29')
-    s_pri = add_element(g_sg29, 'S_PRI')
-    c_c509 = add_element(s_pri, 'C_C509')
-    add_element(c_c509, 'D_5125', 'AAA')     # Price qualifier (AAA = Calculation net)
-    add_element(c_c509, 'D_5118', f"{base_amount:.4f}")  # Net price
-    add_element(c_c509, 'D_5284', '1')       # Unit price basis
-    add_element(c_c509, 'D_6411', 'C62')     # Measure unit qualifier
-    
-    # Tax information for line item - Only if VAT ID is available
-    if data.get('SellerVATID'):
-        g_sg34 = add_element(g_sg26, 'G_SG34')
-        s_tax_line = add_element(g_sg34, 'S_TAX')
-        add_element(s_tax_line, 'D_5283', '7')   # Duty/tax/fee type (7 = Tax)
-        
-        c_c241_line = add_element(s_tax_line, 'C_C241')
-        add_element(c_c241_line, 'D_5153', 'VAT')  # Duty/tax/fee type name
-        
-        c_c243_line = add_element(s_tax_line, 'C_C243')
-        add_element(c_c243_line, 'D_5278', f"{tax_rate:.0f}")  # Duty/tax/fee rate
-        
-        add_element(s_tax_line, 'D_5305', 'S')   # Duty/tax/fee category code (S = Standard rate)
+    # 8. SG26 - Line Details, one per invoice line
+    for number, line in enumerate(totals.lines, 1):
+        g_sg26 = add_element(m_invoic, 'G_SG26')
+        s_lin = add_element(g_sg26, 'S_LIN')
+        add_element(s_lin, 'D_1082', str(number))  # Line item number
+
+        # Item description
+        s_imd = add_element(g_sg26, 'S_IMD')
+        add_element(s_imd, 'D_7077', 'F')  # Item description type (F = Free-form)
+        c_c273 = add_element(s_imd, 'C_C273')
+        add_element(c_c273, 'D_7008', data.get('ItemDescription', 'Storitev po računu'))
+
+        # Quantity
+        s_qty = add_element(g_sg26, 'S_QTY')
+        c_c186 = add_element(s_qty, 'C_C186')
+        add_element(c_c186, 'D_6063', '47')      # Quantity qualifier (47 = Invoiced quantity)
+        add_element(c_c186, 'D_6060', '1')       # Quantity
+        add_element(c_c186, 'D_6411', 'C62')     # Measure unit qualifier (C62 = One/each)
+
+        # BT-131: Invoice line net amount (line amount without VAT)
+        g_sg27 = add_element(g_sg26, 'G_SG27')
+        s_moa_line = add_element(g_sg27, 'S_MOA')
+        c_c516_line = add_element(s_moa_line, 'C_C516')
+        add_element(c_c516_line, 'D_5025', '203')  # Monetary amount type (203 = Line item amount)
+        add_element(c_c516_line, 'D_5004', format_amount(line.net))  # Line net amount (without VAT)
+
+        # Price details (net price)
+        g_sg29 = add_element(g_sg26, 'G_SG29')
+        s_pri = add_element(g_sg29, 'S_PRI')
+        c_c509 = add_element(s_pri, 'C_C509')
+        add_element(c_c509, 'D_5125', 'AAA')     # Price qualifier (AAA = Calculation net)
+        add_element(c_c509, 'D_5118', format_amount(line.net, 4))  # Net price
+        add_element(c_c509, 'D_5284', '1')       # Unit price basis
+        add_element(c_c509, 'D_6411', 'C62')     # Measure unit qualifier
+
+        # Tax information for line item - Only if VAT ID is available
+        if data.get('SellerVATID'):
+            g_sg34 = add_element(g_sg26, 'G_SG34')
+            s_tax_line = add_element(g_sg34, 'S_TAX')
+            add_element(s_tax_line, 'D_5283', '7')   # Duty/tax/fee type (7 = Tax)
+
+            c_c241_line = add_element(s_tax_line, 'C_C241')
+            add_element(c_c241_line, 'D_5153', 'VAT')  # Duty/tax/fee type name
+
+            c_c243_line = add_element(s_tax_line, 'C_C243')
+            add_element(c_c243_line, 'D_5278', format_rate(line.rate))  # Duty/tax/fee rate
+
+            add_element(s_tax_line, 'D_5305', vat_category(line.rate))  # Duty/tax/fee category code (S = Standard rate, Z = Zero rated)
     
     # 9. UNS - Section Control (separates detail from summary)
     s_uns = add_element(m_invoic, 'S_UNS')
@@ -252,26 +268,26 @@ def generate_eslog_xml(data):
     
     # 10. SG50 - Monetary Amounts Summary (Fixed calculations per business rules)
     
-    # BT-106: Sum of Invoice line net amount (same as BT-131 for single line)
+    # BT-106: Sum of Invoice line net amounts (BR-CO-10)
     g_sg50_line_total = add_element(m_invoic, 'G_SG50')
     s_moa_line_total = add_element(g_sg50_line_total, 'S_MOA')
     c_c516_line_total = add_element(s_moa_line_total, 'C_C516')
     add_element(c_c516_line_total, 'D_5025', '79')  # Monetary amount type (79 = Total line items amount)
-    add_element(c_c516_line_total, 'D_5004', f"{base_amount:.2f}")
+    add_element(c_c516_line_total, 'D_5004', format_amount(totals.line_net))
     
     # BT-109: Invoice total amount without VAT (BR-13 requirement)
     g_sg50_total_no_vat = add_element(m_invoic, 'G_SG50')
     s_moa_total_no_vat = add_element(g_sg50_total_no_vat, 'S_MOA')
     c_c516_total_no_vat = add_element(s_moa_total_no_vat, 'C_C516')
     add_element(c_c516_total_no_vat, 'D_5025', '389')  # Monetary amount type (389 = Total invoice amount excl. VAT)
-    add_element(c_c516_total_no_vat, 'D_5004', f"{base_amount:.2f}")
+    add_element(c_c516_total_no_vat, 'D_5004', format_amount(totals.net))
     
     # BT-112: Invoice total amount with VAT (BR-14 requirement)
     g_sg50_total_with_vat = add_element(m_invoic, 'G_SG50')
     s_moa_total_with_vat = add_element(g_sg50_total_with_vat, 'S_MOA')
     c_c516_total_with_vat = add_element(s_moa_total_with_vat, 'C_C516')
     add_element(c_c516_total_with_vat, 'D_5025', '388')  # Monetary amount type (388 = Total invoice amount incl. VAT)
-    add_element(c_c516_total_with_vat, 'D_5004', f"{total_amount_with_vat:.2f}")
+    add_element(c_c516_total_with_vat, 'D_5004', format_amount(totals.gross))
     
     # BT-110: Invoice total VAT amount - Only if VAT ID is available
     if data.get('SellerVATID'):
@@ -279,57 +295,63 @@ def generate_eslog_xml(data):
         s_moa_vat_total = add_element(g_sg50_vat_total, 'S_MOA')
         c_c516_vat_total = add_element(s_moa_vat_total, 'C_C516')
         add_element(c_c516_vat_total, 'D_5025', '176')  # Monetary amount type (176 = Total tax amount)
-        add_element(c_c516_vat_total, 'D_5004', f"{tax_amount:.2f}")
+        add_element(c_c516_vat_total, 'D_5004', format_amount(totals.tax))
     
     # BT-115: Amount due for payment (BR-CO-16: BT-112 - BT-113 + BT-114)
-    # Assuming no paid amount (BT-113=0) and no rounding (BT-114=0)
+    # The UPNQR amount; BT-114 holds a cent VAT rounding could not reach
     g_sg50_payable = add_element(m_invoic, 'G_SG50')
     s_moa_payable = add_element(g_sg50_payable, 'S_MOA')
     c_c516_payable = add_element(s_moa_payable, 'C_C516')
     add_element(c_c516_payable, 'D_5025', '9')   # Monetary amount type (9 = Amount due/payable)
-    add_element(c_c516_payable, 'D_5004', f"{total_amount_with_vat:.2f}")
+    add_element(c_c516_payable, 'D_5004', format_amount(totals.payable))
     
     # BT-113: Paid amount (0.00 for unpaid invoice)
     g_sg50_paid = add_element(m_invoic, 'G_SG50')
     s_moa_paid = add_element(g_sg50_paid, 'S_MOA')
     c_c516_paid = add_element(s_moa_paid, 'C_C516')
     add_element(c_c516_paid, 'D_5025', '113')  # Monetary amount type (113 = Paid amount)
-    add_element(c_c516_paid, 'D_5004', '0.00')
+    add_element(c_c516_paid, 'D_5004', format_amount(totals.paid))
     
-    # BT-114: Rounding amount (0.00)
+    # BT-114: Rounding amount
     g_sg50_rounding = add_element(m_invoic, 'G_SG50')
     s_moa_rounding = add_element(g_sg50_rounding, 'S_MOA')
     c_c516_rounding = add_element(s_moa_rounding, 'C_C516')
     add_element(c_c516_rounding, 'D_5025', '366')  # Monetary amount type (366 = Rounding amount)
-    add_element(c_c516_rounding, 'D_5004', '0.00')
+    add_element(c_c516_rounding, 'D_5004', format_amount(totals.rounding))
     
-    # 11. SG52 - Tax Totals - Only if VAT ID is available
+    # 11. SG52 - Tax Totals, one per VAT rate - Only if VAT ID is available
     if data.get('SellerVATID'):
-        g_sg52 = add_element(m_invoic, 'G_SG52')
-        s_tax_total = add_element(g_sg52, 'S_TAX')
-        add_element(s_tax_total, 'D_5283', '7')  # Duty/tax/fee type (7 = Tax)
-        
-        c_c241_total = add_element(s_tax_total, 'C_C241')
-        add_element(c_c241_total, 'D_5153', 'VAT')  # Duty/tax/fee type name
-        
-        c_c243_total = add_element(s_tax_total, 'C_C243')
-        add_element(c_c243_total, 'D_5278', f"{tax_rate:.0f}")  # Duty/tax/fee rate
-        
-        add_element(s_tax_total, 'D_5305', 'S')  # Duty/tax/fee category code
-        
-        # BT-116: VAT category taxable amount
-        s_moa_tax_base_rate = add_element(g_sg52, 'S_MOA')
-        c_c516_tax_base_rate = add_element(s_moa_tax_base_rate, 'C_C516')
-        add_element(c_c516_tax_base_rate, 'D_5025', '125')  # Monetary amount type (125 = Taxable amount)
-        add_element(c_c516_tax_base_rate, 'D_5004', f"{base_amount:.2f}")
-        
-        # BT-117: VAT category tax amount
-        s_moa_tax_amount_rate = add_element(g_sg52, 'S_MOA')
-        c_c516_tax_amount_rate = add_element(s_moa_tax_amount_rate, 'C_C516')
-        add_element(c_c516_tax_amount_rate, 'D_5025', '124')  # Monetary amount type (124 = Tax amount)
-        add_element(c_c516_tax_amount_rate, 'D_5004', f"{tax_amount:.2f}")
+        for vat in totals.breakdown:
+            g_sg52 = add_element(m_invoic, 'G_SG52')
+            s_tax_total = add_element(g_sg52, 'S_TAX')
+            add_element(s_tax_total, 'D_5283', '7')  # Duty/tax/fee type (7 = Tax)
+
+            c_c241_total = add_element(s_tax_total, 'C_C241')
+            add_element(c_c241_total, 'D_5153', 'VAT')  # Duty/tax/fee type name
+
+            c_c243_total = add_element(s_tax_total, 'C_C243')
+            add_element(c_c243_total, 'D_5278', format_rate(vat.rate))  # Duty/tax/fee rate
+
+            add_element(s_tax_total, 'D_5305', vat.category)  # Duty/tax/fee category code
+
+            # BT-116: VAT category taxable amount
+            s_moa_tax_base_rate = add_element(g_sg52, 'S_MOA')
+            c_c516_tax_base_rate = add_element(s_moa_tax_base_rate, 'C_C516')
+            add_element(c_c516_tax_base_rate, 'D_5025', '125')  # Monetary amount type (125 = Taxable amount)
+            add_element(c_c516_tax_base_rate, 'D_5004', format_amount(vat.taxable))
+
+            # BT-117: VAT category tax amount (BR-CO-17)
+            s_moa_tax_amount_rate = add_element(g_sg52, 'S_MOA')
+            c_c516_tax_amount_rate = add_element(s_moa_tax_amount_rate, 'C_C516')
+            add_element(c_c516_tax_amount_rate, 'D_5025', '124')  # Monetary amount type (124 = Tax amount)
+            add_element(c_c516_tax_amount_rate, 'D_5004', format_amount(vat.tax))
     
-    # Generate pretty XML with proper declaration
+    return root
+
+
+def serialize_eslog_tree(root):
+    """Serializes an Invoice element tree to pretty-printed XML with declaration."""
+    from lxml import etree
     return etree.tostring(
         root, 
         pretty_print=True, 
@@ -338,33 +360,24 @@ def generate_eslog_xml(data):
     ).decode('utf-8')
 
 
-def map_upnqr_to_eslog(upnqr_data):
-    """Maps UPNQR data to e-SLOG fields."""
-    # Extract seller name and determine VAT ID
-    seller_name = upnqr_data.get('ime_prejemnika', '')
-    seller_vat_id = ''
-    seller_legal_id = ''
-    
-    # Check if receiver is NGEN and assign their VAT ID
-    if 'NGEN' in seller_name.upper():
-        seller_vat_id = 'SI24576239'
-        seller_legal_id = '8209901000'
-    # Otherwise leave empty - UPNQR doesn't contain VAT information
-    
-    return {
-        'InvoiceNumber': upnqr_data.get('stevilka_racuna', upnqr_data.get('referenca_prejemnika', '')),
-        'InvoiceDate': '',  # Not in UPNQR, will use current date
-        'DueDate': upnqr_data.get('rok_placila', ''),
-        'BuyerName': upnqr_data.get('ime_placnika', ''),
-        'BuyerAddress': f"{upnqr_data.get('ulica_placnika', '')}, {upnqr_data.get('kraj_placnika', '')}",
-        'SellerName': upnqr_data.get('ime_prejemnika', ''),
-        'SellerAddress': f"{upnqr_data.get('ulica_prejemnika', '')}, {upnqr_data.get('kraj_prejemnika', '')}",
-        'SellerIBAN': upnqr_data.get('iban_prejemnika', ''),
-        'SellerVATID': seller_vat_id,  # Will be empty unless it's NGEN
-        'SellerLegalID': seller_legal_id,  # Will be empty unless it's NGEN
-        'Amount': upnqr_data.get('znesek', 0.0),
-        'PaymentReference': upnqr_data.get('referenca_prejemnika', ''),
-        'PurposeCode': upnqr_data.get('koda_namena', ''),
-        'ItemDescription': upnqr_data.get('namen', ''),
-        'TaxRate': 22.0,  # Default Slovenian VAT rate
-    }
\ No newline at end of file
+def generate_eslog_xml(data):
+    """Generates a proper e-SLOG 2.0 XML file according to official specification."""
+    return serialize_eslog_tree(build_eslog_tree(data))
+
+
+def map_upnqr_to_eslog(upnqr_data, registry=None):
+    """Maps UPNQR data (an UpnqrRecord or the equivalent dict) to an EslogInvoice.
+
+    The seller VAT and legal IDs and the tax rate come from the supplier
+    registry (see suppliers.registry), looked up by the receiver IBAN and
+    name; without one, the built-in suppliers are used. Sellers missing
+    from the registry get empty IDs, as UPNQR carries no VAT information.
+    """
+    registry = registry or load_registry()
+    supplier = registry.lookup(upnqr_data.get('iban_prejemnika', ''), upnqr_data.get('ime_prejemnika', ''))
+    if supplier is None:
+        return EslogInvoice(upnqr_data)
+
+    # InvoiceDate is not in UPNQR (the current date is used); 22 % is the default Slovenian VAT rate
+    tax_rate = supplier.tax_rate if supplier.tax_rate is not None else DEFAULT_TAX_RATE
+    return EslogInvoice(upnqr_data, supplier.vat_id, supplier.legal_id, invoice_date='', tax_rate=tax_rate)
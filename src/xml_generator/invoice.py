@@ -0,0 +1,126 @@
+from collections.abc import Mapping
+
+# e-SLOG field keys (as used by the XML generators) -> EslogInvoice attributes
+FIELDS = {
+    'InvoiceNumber': 'invoice_number',
+    'InvoiceDate': 'invoice_date',
+    'DueDate': 'due_date',
+    'BuyerName': 'buyer_name',
+    'BuyerAddress': 'buyer_address',
+    'SellerName': 'seller_name',
+    'SellerAddress': 'seller_address',
+    'SellerIBAN': 'seller_iban',
+    'SellerVATID': 'seller_vat_id',
+    'SellerLegalID': 'seller_legal_id',
+    'Amount': 'amount',
+    'AmountCents': 'amount_cents',
+    'PaymentReference': 'payment_reference',
+    'PurposeCode': 'purpose_code',
+    'ItemDescription': 'item_description',
+    'TaxRate': 'tax_rate',
+    'Lines': 'lines',
+}
+
+
+class EslogInvoice(Mapping):
+    """e-SLOG invoice fields mapped from parsed UPNQR data.
+
+    Only the fields UPNQR does not carry (VAT and legal IDs, invoice date,
+    tax rate) are stored. Everything else is read from the source
+    UpnqrRecord (or UPNQR dict) on access, so an invoice shares its strings
+    with the record instead of copying them into a second dict.
+
+    The invoice is a read-only Mapping with the keys map_upnqr_to_eslog's
+    dict used to have ('InvoiceNumber', 'Amount', ...); as_dict() returns
+    that dict.
+
+    lines splits the amount across VAT rates as (gross amount in cents,
+    VAT rate in percent) pairs (see amounts.invoice_totals); None means
+    one line with the whole amount at tax_rate.
+    """
+
+    __slots__ = ('source', 'seller_vat_id', 'seller_legal_id', 'invoice_date', 'tax_rate', 'lines')
+
+    def __init__(self, source, seller_vat_id='', seller_legal_id='', invoice_date='', tax_rate=22.0,
+                 lines=None):
+        self.source = source
+        self.seller_vat_id = seller_vat_id
+        self.seller_legal_id = seller_legal_id
+        self.invoice_date = invoice_date
+        self.tax_rate = tax_rate
+        self.lines = lines
+
+    @property
+    def invoice_number(self):
+        return self.source.get('stevilka_racuna', self.source.get('referenca_prejemnika', ''))
+
+    @property
+    def due_date(self):
+        return self.source.get('rok_placila', '')
+
+    @property
+    def buyer_name(self):
+        return self.source.get('ime_placnika', '')
+
+    @property
+    def buyer_address(self):
+        return f"{self.source.get('ulica_placnika', '')}, {self.source.get('kraj_placnika', '')}"
+
+    @property
+    def seller_name(self):
+        return self.source.get('ime_prejemnika', '')
+
+    @property
+    def seller_address(self):
+        return f"{self.source.get('ulica_prejemnika', '')}, {self.source.get('kraj_prejemnika', '')}"
+
+    @property
+    def seller_iban(self):
+        return self.source.get('iban_prejemnika', '')
+
+    @property
+    def amount(self):
+        return self.source.get('znesek', 0.0)
+
+    @property
+    def amount_cents(self):
+        """Amount in cents, exactly as in the UPNQR amount field; None if the source has no such field."""
+        cents = self.source.get('znesek_centi')
+        if cents is None:
+            return None
+        return int(cents) if cents else 0
+
+    @property
+    def payment_reference(self):
+        return self.source.get('referenca_prejemnika', '')
+
+    @property
+    def purpose_code(self):
+        return self.source.get('koda_namena', '')
+
+    @property
+    def item_description(self):
+        return self.source.get('namen', '')
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, FIELDS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __reduce__(self):
+        return (EslogInvoice, (self.source, self.seller_vat_id, self.seller_legal_id,
+                               self.invoice_date, self.tax_rate, self.lines))
+
+    def __repr__(self):
+        return f"EslogInvoice(invoice_number={self.invoice_number!r}, seller_name={self.seller_name!r}, amount={self.amount!r})"
+
+    def as_dict(self):
+        """Returns the invoice as the plain dict map_upnqr_to_eslog used to return."""
+        return {key: getattr(self, attribute) for key, attribute in FIELDS.items()}
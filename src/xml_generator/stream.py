@@ -0,0 +1,200 @@
+"""Streaming output of many e-SLOG documents into one archive or stream.
+
+Each invoice is serialized with lxml's incremental writer (etree.xmlfile)
+directly into the output as soon as it is produced, or copied in as the
+bytes a worker process already serialized (write_xml), so memory use stays
+flat no matter how many invoices a batch contains. The only per-invoice
+state kept is the member name (and, for ZIP, its central directory
+entry). A JSONL manifest with one line per invoice is written alongside.
+
+Supported targets:
+    *.zip            ZIP archive, invoices plus manifest.jsonl
+    *.tar, *.tar.gz  tar archive (optionally gzip compressed), invoices plus manifest.jsonl
+    a directory      one XML file per invoice plus manifest.jsonl; the entries of
+                     files written again by a later run are replaced, not duplicated
+    -                all documents concatenated on stdout, manifest omitted
+"""
+import os
+import sys
+import json
+import shutil
+import tarfile
+import zipfile
+import tempfile
+from src.xml_generator.generator import build_eslog_tree
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# Documents larger than this are spooled to disk before being added to a tar archive
+TAR_SPOOL_BYTES = 1024 * 1024
+
+
+def write_eslog_document(stream, data):
+    """Serializes the e-SLOG document for data into a binary stream with etree.xmlfile.
+
+    The bytes written are identical to generate_eslog_xml(data) in UTF-8.
+    """
+    from lxml import etree
+    with etree.xmlfile(stream, encoding='UTF-8') as xf:
+        xf.write_declaration()
+        xf.write(build_eslog_tree(data), pretty_print=True)
+
+
+def detect_format(target):
+    """Returns the output format ('zip', 'tar', 'tar.gz', 'dir' or 'concat') for a target path."""
+    if target == '-':
+        return 'concat'
+    lower = target.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if lower.endswith('.tar'):
+        return 'tar'
+    return 'dir'
+
+
+class EslogStreamWriter:
+    """Writes e-SLOG invoices to a ZIP/tar archive, a directory or stdout one at a time.
+
+    Usage:
+        with EslogStreamWriter("invoices.zip") as writer:
+            for name, eslog_data in produced_invoices:
+                writer.write(name, eslog_data, source="invoice.pdf")
+
+    write_xml takes documents that were serialized elsewhere, e.g. by
+    batch workers with the template serializer or from the result cache.
+    """
+
+    def __init__(self, target, output_format=None):
+        self.target = target
+        self.format = output_format or detect_format(target)
+        self.count = 0
+        self._names = set()
+        self._manifest = None
+        self._archive = None
+
+        if self.format == 'zip':
+            self._archive = zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED)
+        elif self.format in ('tar', 'tar.gz'):
+            mode = 'w|gz' if self.format == 'tar.gz' else 'w|'
+            self._archive = tarfile.open(target, mode)
+        elif self.format == 'dir':
+            os.makedirs(target, exist_ok=True)
+            # Merged with the directory's existing manifest on close
+            self._manifest = tempfile.TemporaryFile()
+        elif self.format == 'concat':
+            self._stream = sys.stdout.buffer
+        else:
+            raise ValueError(f"Unknown output format: {self.format}")
+
+        if self._archive is not None:
+            # Manifest lines are spooled to disk and added as the last archive member
+            self._manifest = tempfile.TemporaryFile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _unique_name(self, name):
+        base, ext = os.path.splitext(name)
+        ext = ext or '.xml'
+        candidate, n = base + ext, 1
+        while candidate in self._names:
+            n += 1
+            candidate = f"{base}-{n}{ext}"
+        self._names.add(candidate)
+        return candidate
+
+    def write(self, name, data, **manifest_fields):
+        """Serializes one invoice under name and records it in the manifest.
+
+        Extra keyword arguments are added to the invoice's manifest line.
+        Returns the member name actually used (made unique if needed).
+        """
+        return self._add(name, lambda stream: write_eslog_document(stream, data), data, manifest_fields)
+
+    def write_xml(self, name, xml, data, **manifest_fields):
+        """Like write, for an invoice already serialized to the UTF-8 bytes xml.
+
+        data (the mapped e-SLOG fields) only fills in the manifest line.
+        """
+        return self._add(name, lambda stream: stream.write(xml), data, manifest_fields)
+
+    def _add(self, name, write_body, data, manifest_fields):
+        name = self._unique_name(name)
+
+        if self.format == 'zip':
+            with self._archive.open(name, 'w') as member:
+                write_body(member)
+        elif self.format in ('tar', 'tar.gz'):
+            with tempfile.SpooledTemporaryFile(max_size=TAR_SPOOL_BYTES) as spool:
+                write_body(spool)
+                info = tarfile.TarInfo(name)
+                info.size = spool.tell()
+                spool.seek(0)
+                self._archive.addfile(info, spool)
+            # TarFile remembers every member it wrote; a stream never needs them again
+            self._archive.members.clear()
+        elif self.format == 'dir':
+            with open(os.path.join(self.target, name), 'wb') as f:
+                write_body(f)
+        else:
+            write_body(self._stream)
+            self._stream.flush()
+
+        if self._manifest is not None:
+            entry = {
+                "name": name,
+                "invoice_number": data.get('InvoiceNumber', ''),
+                "seller": data.get('SellerName', ''),
+                "amount": data.get('Amount', 0.0),
+                "due_date": data.get('DueDate', ''),
+            }
+            entry.update(manifest_fields)
+            self._manifest.write((json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8'))
+        self.count += 1
+        return name
+
+    def close(self):
+        if self._archive is not None:
+            size = self._manifest.tell()
+            self._manifest.seek(0)
+            if self.format == 'zip':
+                with self._archive.open(MANIFEST_NAME, 'w') as member:
+                    shutil.copyfileobj(self._manifest, member)
+            else:
+                info = tarfile.TarInfo(MANIFEST_NAME)
+                info.size = size
+                self._archive.addfile(info, self._manifest)
+            self._archive.close()
+            self._archive = None
+        elif self.format == 'dir' and self._manifest is not None:
+            self._merge_manifest()
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
+
+    def _merge_manifest(self):
+        """Rewrites the directory's manifest: earlier entries of files this run did not write, then this run's."""
+        path = os.path.join(self.target, MANIFEST_NAME)
+        fd, temp_path = tempfile.mkstemp(dir=self.target, prefix=MANIFEST_NAME + '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if os.path.exists(path):
+                    with open(path, 'rb') as previous:
+                        for line in previous:
+                            try:
+                                name = json.loads(line)["name"]
+                            except (ValueError, KeyError, TypeError):
+                                continue
+                            if name not in self._names:
+                                f.write(line)
+                self._manifest.seek(0)
+                shutil.copyfileobj(self._manifest, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,278 @@
+"""Template-based e-SLOG 2.0 serializer.
+
+render_eslog_xml produces exactly the same output as generate_eslog_xml,
+without building an lxml tree. The constant parts of the document (the
+S_UNH header, C_S009, the FTX specification identifier, CUX, PAI and the
+fixed tax/amount qualifiers) are pre-rendered once at import time with
+the same indentation lxml's pretty printer uses. Per invoice only the
+variable fields are escaped and joined in between.
+"""
+import re
+from datetime import datetime
+from src.xml_generator.generator import split_address
+from src.xml_generator.amounts import format_amount, format_rate, invoice_totals, vat_category
+
+INDENT = '  '
+
+# Characters lxml refuses in text content
+_INVALID_XML_CHARS = re.compile(r'[^\x09\x0a\x0d\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def escape_text(value):
+    """Escapes a text value the way lxml serializes element text."""
+    text = str(value)
+    if _INVALID_XML_CHARS.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '\r' in text:
+        text = text.replace('\r', '&#13;')
+    return text
+
+
+def _open(depth, name):
+    return f"{INDENT * depth}<{name}>\n"
+
+
+def _close(depth, name):
+    return f"{INDENT * depth}</{name}>\n"
+
+
+def _leaf(depth, name, text):
+    """Renders an element with text. None renders an empty element, like lxml."""
+    if text is None:
+        return f"{INDENT * depth}<{name}/>\n"
+    return f"{INDENT * depth}<{name}>{escape_text(text)}</{name}>\n"
+
+
+def _date_segment(depth, qualifier, tag='S_DTM'):
+    """Pre-renders the opening of a DTM segment up to the date value."""
+    return (_open(depth, tag) + _open(depth + 1, 'C_C507') +
+            _leaf(depth + 2, 'D_2005', qualifier) + f"{INDENT * (depth + 2)}<D_2380>")
+
+
+_DATE_END = "</D_2380>\n" + _close(3, 'C_C507') + _close(2, 'S_DTM')
+_PAYMENT_DATE_END = "</D_2380>\n" + _close(4, 'C_C507') + _close(3, 'S_DTM')
+
+
+def _amount_segment(qualifier):
+    """Pre-renders a G_SG50 summary amount up to the amount value."""
+    return (_open(2, 'G_SG50') + _open(3, 'S_MOA') + _open(4, 'C_C516') +
+            _leaf(5, 'D_5025', qualifier) + f"{INDENT * 5}<D_5004>")
+
+
+_AMOUNT_END = "</D_5004>\n" + _close(4, 'C_C516') + _close(3, 'S_MOA') + _close(2, 'G_SG50')
+
+
+def _tax_segment(depth):
+    """Pre-renders an S_TAX segment around its rate and category values, returned as (head, middle, tail)."""
+    head = (_open(depth, 'S_TAX') + _leaf(depth + 1, 'D_5283', '7') +
+            _open(depth + 1, 'C_C241') + _leaf(depth + 2, 'D_5153', 'VAT') + _close(depth + 1, 'C_C241') +
+            _open(depth + 1, 'C_C243') + f"{INDENT * (depth + 2)}<D_5278>")
+    middle = "</D_5278>\n" + _close(depth + 1, 'C_C243') + f"{INDENT * (depth + 1)}<D_5305>"
+    tail = "</D_5305>\n" + _close(depth, 'S_TAX')
+    return head, middle, tail
+
+
+# ─── Pre-rendered constant skeleton ───
+
+_HEADER = (
+    "<?xml version='1.0' encoding='UTF-8'?>\n"
+    '<Invoice xmlns="urn:eslog:2.00" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+    + f'{INDENT}<M_INVOIC Id="data">\n'
+    + _open(2, 'S_UNH')
+)
+
+_C_S009 = (
+    _open(3, 'C_S009') + _leaf(4, 'D_0065', 'INVOIC') + _leaf(4, 'D_0052', 'D') +
+    _leaf(4, 'D_0054', '01B') + _leaf(4, 'D_0051', 'UN') + _close(3, 'C_S009') +
+    _close(2, 'S_UNH')
+)
+
+_BGM_START = _open(2, 'S_BGM') + _open(3, 'C_C002') + _leaf(4, 'D_1001', '380') + _close(3, 'C_C002') + _open(3, 'C_C106')
+_BGM_END = _close(3, 'C_C106') + _close(2, 'S_BGM')
+
+_DTM_INVOICE = _date_segment(2, '137')
+_DTM_SERVICE_START = _date_segment(2, '167')
+_DTM_SERVICE_END = _date_segment(2, '168')
+_DTM_DUE = _date_segment(2, '13')
+
+_FTX_SPEC = (
+    _open(2, 'S_FTX') + _leaf(3, 'D_4451', 'DOC') +
+    _open(3, 'C_C107') + _leaf(4, 'D_4441', 'P1') + _close(3, 'C_C107') +
+    _open(3, 'C_C108') + _leaf(4, 'D_4440', 'urn:cen.eu:en16931:2017') + _close(3, 'C_C108') +
+    _close(2, 'S_FTX')
+)
+
+_CUX = (
+    _open(2, 'G_SG7') + _open(3, 'S_CUX') + _open(4, 'C_C504') +
+    _leaf(5, 'D_6347', '2') + _leaf(5, 'D_6345', 'EUR') +
+    _close(4, 'C_C504') + _close(3, 'S_CUX') + _close(2, 'G_SG7')
+)
+
+_PAT = _open(2, 'G_SG8') + _open(3, 'S_PAT') + _leaf(4, 'D_4279', '1') + _close(3, 'S_PAT')
+_DTM_PAYMENT = _date_segment(3, '13')
+_PAI = (
+    _open(3, 'S_PAI') + _open(4, 'C_C534') + _leaf(5, 'D_4461', '30') +
+    _close(4, 'C_C534') + _close(3, 'S_PAI') + _close(2, 'G_SG8')
+)
+
+_LINE_START = _open(2, 'G_SG26') + _open(3, 'S_LIN') + f"{INDENT * 4}<D_1082>"
+_LINE_DESCRIPTION = (
+    "</D_1082>\n" + _close(3, 'S_LIN') +
+    _open(3, 'S_IMD') + _leaf(4, 'D_7077', 'F') + _open(4, 'C_C273')
+)
+_QTY = (
+    _close(4, 'C_C273') + _close(3, 'S_IMD') +
+    _open(3, 'S_QTY') + _open(4, 'C_C186') + _leaf(5, 'D_6063', '47') + _leaf(5, 'D_6060', '1') +
+    _leaf(5, 'D_6411', 'C62') + _close(4, 'C_C186') + _close(3, 'S_QTY') +
+    _open(3, 'G_SG27') + _open(4, 'S_MOA') + _open(5, 'C_C516') + _leaf(6, 'D_5025', '203') +
+    f"{INDENT * 6}<D_5004>"
+)
+_PRICE = (
+    "</D_5004>\n" + _close(5, 'C_C516') + _close(4, 'S_MOA') + _close(3, 'G_SG27') +
+    _open(3, 'G_SG29') + _open(4, 'S_PRI') + _open(5, 'C_C509') + _leaf(6, 'D_5125', 'AAA') +
+    f"{INDENT * 6}<D_5118>"
+)
+_PRICE_END = (
+    "</D_5118>\n" + _leaf(6, 'D_5284', '1') + _leaf(6, 'D_6411', 'C62') +
+    _close(5, 'C_C509') + _close(4, 'S_PRI') + _close(3, 'G_SG29')
+)
+_LINE_TAX_START, _LINE_TAX_CATEGORY, _LINE_TAX_END = _tax_segment(4)
+_LINE_TAX_START = _open(3, 'G_SG34') + _LINE_TAX_START
+_LINE_TAX_END = _LINE_TAX_END + _close(3, 'G_SG34')
+_LINE_END = _close(2, 'G_SG26')
+_UNS = _open(2, 'S_UNS') + _leaf(3, 'D_0081', 'S') + _close(2, 'S_UNS')
+
+_MOA_LINE_TOTAL = _amount_segment('79')
+_MOA_TOTAL_NO_VAT = _amount_segment('389')
+_MOA_TOTAL_WITH_VAT = _amount_segment('388')
+_MOA_VAT_TOTAL = _amount_segment('176')
+_MOA_PAYABLE = _amount_segment('9')
+_MOA_PAID = _amount_segment('113')
+_MOA_ROUNDING = _amount_segment('366')
+
+_TAX_TOTAL_START, _TAX_TOTAL_CATEGORY, _TAX_TOTAL_END = _tax_segment(3)
+_TAX_TOTAL_START = _open(2, 'G_SG52') + _TAX_TOTAL_START
+_TAX_BASE = _open(3, 'S_MOA') + _open(4, 'C_C516') + _leaf(5, 'D_5025', '125') + f"{INDENT * 5}<D_5004>"
+_TAX_AMOUNT = (
+    "</D_5004>\n" + _close(4, 'C_C516') + _close(3, 'S_MOA') +
+    _open(3, 'S_MOA') + _open(4, 'C_C516') + _leaf(5, 'D_5025', '124') + f"{INDENT * 5}<D_5004>"
+)
+_TAX_TOTAL_END_ALL = "</D_5004>\n" + _close(4, 'C_C516') + _close(3, 'S_MOA') + _close(2, 'G_SG52')
+
+_FOOTER = _close(1, 'M_INVOIC') + "</Invoice>\n"
+
+
+def _party(out, qualifier, name, address, iban=None, vat_id=None, legal_id=None):
+    out.append(_open(2, 'G_SG2'))
+    out.append(_open(3, 'S_NAD'))
+    out.append(_leaf(4, 'D_3035', qualifier))
+    out.append(_open(4, 'C_C080'))
+    out.append(_leaf(5, 'D_3036', name))
+    out.append(_close(4, 'C_C080'))
+    if address:
+        street, city, postal_code = split_address(address)
+        out.append(_open(4, 'C_C059'))
+        out.append(_leaf(5, 'D_3042', street))
+        out.append(_close(4, 'C_C059'))
+        if city:
+            out.append(_leaf(4, 'D_3164', city))
+            out.append(_leaf(4, 'D_3251', postal_code))
+    out.append(_leaf(4, 'D_3207', 'SI'))
+    out.append(_close(3, 'S_NAD'))
+    if iban:
+        out.append(_open(3, 'S_FII'))
+        out.append(_leaf(4, 'D_3035', 'RB'))
+        out.append(_open(4, 'C_C078'))
+        out.append(_leaf(5, 'D_3194', iban))
+        out.append(_close(4, 'C_C078'))
+        out.append(_close(3, 'S_FII'))
+    for reference_qualifier, reference in (('VA', vat_id), ('AHP', legal_id)):
+        if reference:
+            out.append(_open(3, 'G_SG3'))
+            out.append(_open(4, 'S_RFF'))
+            out.append(_open(5, 'C_C506'))
+            out.append(_leaf(6, 'D_1153', reference_qualifier))
+            out.append(_leaf(6, 'D_1154', reference))
+            out.append(_close(5, 'C_C506'))
+            out.append(_close(4, 'S_RFF'))
+            out.append(_close(3, 'G_SG3'))
+    out.append(_close(2, 'G_SG2'))
+
+
+def _slot(out, head, value, tail):
+    out.append(head + escape_text(value) + tail)
+
+
+def render_eslog_xml(data):
+    """Renders e-SLOG 2.0 XML for the invoice data from the pre-rendered template.
+
+    Produces exactly the same string as generate_eslog_xml(data).
+    """
+    totals = invoice_totals(data)
+    invoice_number = data.get('InvoiceNumber', 'INV001')
+    invoice_date = data.get('InvoiceDate', '')
+    if not invoice_date:
+        invoice_date = datetime.now().strftime('%Y-%m-%d')
+    due_date = data.get('DueDate')
+    seller_vat = data.get('SellerVATID')
+
+    out = [_HEADER]
+    out.append(_leaf(3, 'D_0062', invoice_number))
+    out.append(_C_S009)
+    out.append(_BGM_START)
+    out.append(_leaf(4, 'D_1004', invoice_number))
+    out.append(_BGM_END)
+
+    for segment in (_DTM_INVOICE, _DTM_SERVICE_START, _DTM_SERVICE_END):
+        _slot(out, segment, invoice_date, _DATE_END)
+    if due_date:
+        _slot(out, _DTM_DUE, due_date, _DATE_END)
+
+    out.append(_FTX_SPEC)
+
+    if data.get('BuyerName'):
+        _party(out, 'BY', data.get('BuyerName', ''), data.get('BuyerAddress', ''))
+    if data.get('SellerName'):
+        _party(out, 'SE', data.get('SellerName', ''), data.get('SellerAddress', ''),
+               data.get('SellerIBAN'), data.get('SellerVATID', ''), data.get('SellerLegalID', ''))
+
+    out.append(_CUX)
+    out.append(_PAT)
+    if due_date:
+        _slot(out, _DTM_PAYMENT, due_date, _PAYMENT_DATE_END)
+    out.append(_PAI)
+
+    description = _leaf(5, 'D_7008', data.get('ItemDescription', 'Storitev po računu'))
+    for number, line in enumerate(totals.lines, 1):
+        out.append(_LINE_START + str(number) + _LINE_DESCRIPTION)
+        out.append(description)
+        out.append(_QTY + format_amount(line.net) + _PRICE + format_amount(line.net, 4) + _PRICE_END)
+        if seller_vat:
+            out.append(_LINE_TAX_START + format_rate(line.rate) + _LINE_TAX_CATEGORY
+                       + vat_category(line.rate) + _LINE_TAX_END)
+        out.append(_LINE_END)
+    out.append(_UNS)
+
+    out.append(_MOA_LINE_TOTAL + format_amount(totals.line_net) + _AMOUNT_END)
+    out.append(_MOA_TOTAL_NO_VAT + format_amount(totals.net) + _AMOUNT_END)
+    out.append(_MOA_TOTAL_WITH_VAT + format_amount(totals.gross) + _AMOUNT_END)
+    if seller_vat:
+        out.append(_MOA_VAT_TOTAL + format_amount(totals.tax) + _AMOUNT_END)
+    out.append(_MOA_PAYABLE + format_amount(totals.payable) + _AMOUNT_END)
+    out.append(_MOA_PAID + format_amount(totals.paid) + _AMOUNT_END)
+    out.append(_MOA_ROUNDING + format_amount(totals.rounding) + _AMOUNT_END)
+
+    if seller_vat:
+        for vat in totals.breakdown:
+            out.append(_TAX_TOTAL_START + format_rate(vat.rate) + _TAX_TOTAL_CATEGORY + vat.category + _TAX_TOTAL_END)
+            out.append(_TAX_BASE + format_amount(vat.taxable) + _TAX_AMOUNT + format_amount(vat.tax)
+                       + _TAX_TOTAL_END_ALL)
+
+    out.append(_FOOTER)
+    return ''.join(out)
@@ -0,0 +1,58 @@
+"""e-SLOG 2.0 XSD validation of generated invoices.
+
+The schema is parsed and compiled into an etree.XMLSchema once per process
+and cached. Batch runs load it in the parent before the worker pool
+starts, so forked workers inherit the compiled schema instead of each
+compiling their own copy. Invoices are validated as in-memory element
+trees before serialization, so the XML is never parsed back.
+
+The e-SLOG 2.0 XSD is not distributed with the converter. Place the
+schema (with any files it includes) under src/xml_generator/schemas/ or
+pass its path explicitly.
+"""
+import os
+from functools import lru_cache
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas', 'eSLOG20_INVOIC_v200.xsd')
+
+# Cap on reported errors per invoice; a broken mapping tends to repeat the same error
+MAX_REPORTED_ERRORS = 50
+
+
+class SchemaNotFoundError(FileNotFoundError):
+    """Raised when the e-SLOG XSD cannot be found."""
+
+
+@lru_cache(maxsize=None)
+def load_schema(schema_path=None):
+    """Returns the compiled e-SLOG XMLSchema, parsing the XSD only on the first call per path."""
+    schema_path = schema_path or DEFAULT_SCHEMA_PATH
+    if not os.path.exists(schema_path):
+        raise SchemaNotFoundError(
+            f"e-SLOG 2.0 schema not found at {schema_path}. "
+            f"Download the XSD and place it there or pass its path with --schema."
+        )
+    from lxml import etree
+    return etree.XMLSchema(etree.parse(schema_path))
+
+
+def validate_tree(root, schema_path=None):
+    """Validates an Invoice element tree and returns a structured report.
+
+    The report is a dict: {"valid": bool, "errors": [{"message", "path",
+    "line", "type", "level"}, ...]}. Errors are listed in document order;
+    "path" is the XPath of the offending element.
+    """
+    schema = load_schema(schema_path)
+    valid = schema.validate(root)
+    errors = [
+        {
+            "message": error.message,
+            "path": error.path,
+            "line": error.line,
+            "type": error.type_name,
+            "level": error.level_name,
+        }
+        for error in list(schema.error_log)[:MAX_REPORTED_ERRORS]
+    ]
+    return {"valid": valid, "errors": errors}
@@ -0,0 +1,98 @@
+import pytest
+
+from src.xml_generator.amounts import (
+    BATCH_COLUMNS, VAT_RATES, batch_totals, format_amount, format_rate, invoice_totals, line_tax,
+    net_from_gross, rate_points, round_div, to_cents, totals_from_gross, totals_from_lines,
+)
+
+# Every cent value from -5 EUR to 150 EUR
+CENTS = range(-500, 15001)
+
+
+@pytest.mark.parametrize("rate", VAT_RATES)
+def test_net_vat_and_rounding_add_up_to_gross_for_every_cent(rate):
+    points = rate_points(rate)
+    for gross in CENTS:
+        totals = totals_from_gross([(gross, points)])
+        assert totals.net + totals.tax + totals.rounding == gross
+        assert totals.payable == gross
+        assert totals.gross == totals.net + totals.tax
+        assert totals.tax == line_tax(totals.net, points)
+        assert abs(totals.rounding) <= 1
+
+
+@pytest.mark.parametrize("rate", VAT_RATES)
+def test_rounding_is_only_used_when_no_net_amount_adds_up(rate):
+    points = rate_points(rate)
+    exact = {net + line_tax(net, points) for net in range(-1000, 15001)}
+    for gross in CENTS:
+        net = net_from_gross(gross, points)
+        assert (net + line_tax(net, points) == gross) == (gross in exact)
+
+
+@pytest.mark.parametrize("rate, share", [(22.0, 0.180), (9.5, 0.087), (5.0, 0.048), (0.0, 0.0)])
+def test_share_of_amounts_with_a_rounding_line(rate, share):
+    # About rate / (100 + rate) of all cent values, as stated in the README
+    rounding = batch_totals(range(100000), rate)["BT-114"]
+    assert sum(1 for cents in rounding if cents) / len(rounding) == pytest.approx(share, abs=0.001)
+
+
+@pytest.mark.parametrize("rate", VAT_RATES)
+def test_batch_totals_match_invoice_totals(rate):
+    columns = batch_totals(CENTS, rate)
+    assert sorted(columns) == sorted(BATCH_COLUMNS)
+    for i, gross in enumerate(CENTS):
+        totals = invoice_totals({'AmountCents': str(gross), 'TaxRate': rate})
+        assert [columns[column][i] for column in BATCH_COLUMNS] == [
+            totals.line_net, totals.net, totals.tax, totals.gross, totals.rounding, totals.payable]
+
+
+def test_batch_totals_with_a_rate_per_invoice():
+    amounts = [12200, 10950, 10500, 10000, 48, -48]
+    rates = [22.0, 9.5, 5.0, 0.0, 22.0, 9.5]
+    columns = batch_totals(amounts, rates)
+    assert columns["BT-109"] == [10000, 10000, 10000, 10000, 39, -44]
+    assert columns["BT-110"] == [2200, 950, 500, 0, 9, -4]
+    for i, (amount, rate) in enumerate(zip(amounts, rates)):
+        assert columns["BT-112"][i] == invoice_totals({'AmountCents': amount, 'TaxRate': rate}).gross
+
+
+def test_batch_totals_need_a_rate_per_amount():
+    with pytest.raises(ValueError):
+        batch_totals([100, 200], [22.0])
+
+
+def test_vat_is_rounded_once_per_rate():
+    totals = totals_from_lines([(5, 2200), (5, 2200), (5, 2200), (1000, 950)])
+    # 15 cents at 22 % is 3.3 cents of VAT, where three separately rounded lines would give 3
+    assert [(entry.rate, entry.taxable, entry.tax) for entry in totals.breakdown] == [(2200, 15, 3), (950, 1000, 95)]
+    assert totals.tax == 98 and totals.gross == 1113 and totals.rounding == 0
+
+
+def test_multi_line_gross_amounts():
+    totals = invoice_totals({'Lines': [(12200, 22.0), (10950, 9.5), (1, 5.0)]})
+    assert totals.payable == 23151
+    assert totals.net + totals.tax + totals.rounding == totals.payable
+    assert [entry.category for entry in totals.breakdown] == ["S", "S", "S"]
+
+
+@pytest.mark.parametrize("numerator, denominator, expected", [
+    (5, 10, 1), (4, 10, 0), (15, 10, 2), (-5, 10, -1), (-4, 10, 0), (-15, 10, -2), (0, 7, 0),
+])
+def test_round_div_rounds_half_away_from_zero(numerator, denominator, expected):
+    assert round_div(numerator, denominator) == expected
+
+
+@pytest.mark.parametrize("amount, cents", [
+    (0.48, 48), ("12,345", 1235), (1.005, 101), (-0.015, -2), (100, 10000), ("0.1", 10),
+])
+def test_to_cents(amount, cents):
+    assert to_cents(amount) == cents
+
+
+def test_rates_and_formatting():
+    assert [rate_points(rate) for rate in (22, 9.5, "9,5", 0)] == [2200, 950, 950, 0]
+    assert [format_rate(points) for points in (2200, 950, 500, 0, 1234)] == ["22", "9.5", "5", "0", "12.34"]
+    assert format_amount(12345) == "123.45"
+    assert format_amount(-5) == "-0.05"
+    assert format_amount(48, decimals=4) == "0.4800"
@@ -0,0 +1,28 @@
+import zipfile
+
+from src.pipeline import batch
+from src.xml_generator.stream import MANIFEST_NAME
+
+def fake_convert_document(pdf, cache=None, fast_xml=False, validation=None, schema_path=None,
+                          suppliers_path=None):
+    data = {'InvoiceNumber': 'INV-' + str(len(pdf)), 'Amount': 1.0}
+    xml = f"<invoice fast='{fast_xml}' cached='{cache is not None}'/>"
+    return {"upnqr_data": {}, "eslog_data": data, "xml": xml, "cached": False, "validation": None}
+
+
+def test_archive_mode_streams_xml_serialized_by_the_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "convert_document", fake_convert_document)
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    archive = tmp_path / "out.zip"
+
+    summary = batch.run_batch([str(tmp_path)], jobs=2, archive=str(archive), fast_xml=True,
+                              cache_dir=str(tmp_path / "cache"))
+
+    assert summary["succeeded"] == 2
+    with zipfile.ZipFile(archive) as z:
+        assert sorted(z.namelist()) == ["a.xml", "b.xml", MANIFEST_NAME]
+        # Serialized in the worker with the template serializer and the cache
+        assert z.read("a.xml") == b"<invoice fast='True' cached='True'/>"
+        assert b'"invoice_number": "INV-8"' in z.read(MANIFEST_NAME)
+    assert all("xml_bytes" not in report and "eslog_data" not in report for report in summary["files"])
@@ -0,0 +1,83 @@
+import sqlite3
+
+from src import __version__, DECODER_VERSION, OUTPUT_VERSION
+from src.cache.store import CACHE_VERSION, PAYLOAD_VERSION, ResultCache
+from src.pipeline import converter
+
+
+def test_entries_are_keyed_by_converter_and_output_version(tmp_path):
+    assert CACHE_VERSION == f"{__version__}/{OUTPUT_VERSION}"
+    old = ResultCache(str(tmp_path), version=f"{__version__}/{OUTPUT_VERSION - 1}")
+    old.put_document("abc", {"format": "UPNQR"}, "<old/>")
+    old.close()
+
+    cache = ResultCache(str(tmp_path))
+    assert cache.get_document("abc") is None
+
+    cache.put_document("abc", {"format": "UPNQR"}, "<new/>")
+    assert cache.get_document("abc") == {"upnqr_data": {"format": "UPNQR"}, "xml": "<new/>"}
+
+
+def test_payloads_are_keyed_by_decoder_version_only(tmp_path):
+    assert PAYLOAD_VERSION == str(DECODER_VERSION)
+    other_output = ResultCache(str(tmp_path), version=f"{__version__}/{OUTPUT_VERSION - 1}")
+    other_output.put_qr_payload("img", "UPNQR")
+    other_output.close()
+    old_decoder = ResultCache(str(tmp_path), payload_version=str(DECODER_VERSION - 1))
+    old_decoder.put_qr_payload("old", "UPNQR")
+    old_decoder.close()
+
+    cache = ResultCache(str(tmp_path))
+    assert cache.get_qr_payload("img") == (True, "UPNQR")
+    assert cache.get_qr_payload("old") == (False, None)
+
+
+def test_misses_without_the_retry_ladder_are_not_trusted_for_retry_candidates(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put_qr_payload("plain", None)
+    cache.put_qr_payload("ladder", None, retried=True)
+    cache.put_qr_payload("hit", "UPNQR")
+    assert cache.get_qr_payload("plain") == (True, None)
+    assert cache.get_qr_payload("plain", retried=True) == (False, None)
+    assert cache.get_qr_payload("ladder", retried=True) == (True, None)
+    assert cache.get_qr_payload("hit", retried=True) == (True, "UPNQR")
+
+
+def test_databases_without_the_retried_column_are_migrated(tmp_path):
+    conn = sqlite3.connect(tmp_path / "cache.sqlite3")
+    conn.execute("CREATE TABLE qr_payloads (image_hash TEXT PRIMARY KEY, version TEXT NOT NULL, "
+                 "payload TEXT, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+    conn.execute("INSERT INTO qr_payloads VALUES ('img', ?, NULL, 3, 0)", (PAYLOAD_VERSION,))
+    conn.commit()
+    conn.close()
+
+    cache = ResultCache(str(tmp_path))
+    assert cache.get_qr_payload("img", retried=True) == (False, None)
+    cache.put_qr_payload("img", None, retried=True)
+    assert cache.get_qr_payload("img", retried=True) == (True, None)
+
+
+def test_retry_ladder_runs_for_an_image_cached_as_a_plain_miss(tmp_path, monkeypatch):
+    images = {}
+    ladder = []
+
+    def sources(path):
+        for name in images[path]:
+            yield name.encode(), lambda name=name: name
+
+    monkeypatch.setattr(converter, "iter_qr_candidate_sources", sources)
+    monkeypatch.setattr(converter, "iter_rendered_qr_regions", lambda path: (yield from ()))
+    monkeypatch.setattr(converter, "decode_qr_code", lambda image: None)
+    monkeypatch.setattr(converter, "decode_qr_code_retry",
+                        lambda image: ladder.append(image) or ("UPNQR" if image == "qr" else None))
+    cache = ResultCache(str(tmp_path))
+
+    # Ranked third, the QR image is only decoded plainly and cached as a miss
+    images["a.pdf"] = ["logo", "photo", "qr"]
+    assert converter.find_qr_data("a.pdf", cache) is None
+    assert ladder == ["logo", "photo"]
+
+    # Ranked first in another PDF it gets the retry ladder anyway
+    images["b.pdf"] = ["qr", "logo"]
+    assert converter.find_qr_data("b.pdf", cache) == "UPNQR"
+    assert ladder == ["logo", "photo", "qr"]
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from src.qr_code_processor import processor
+from src.qr_code_processor.processor import ADAPT_AFTER_RUNS, DEFAULT_TIERS, DecodeLadder
+
+IMAGE = (b"\x80" * 4, 2, 2)
+NAMES = [name for name, _ in DEFAULT_TIERS]
+
+
+def synthetic_tier(name):
+    def tier(image):
+        yield SimpleNamespace(tobytes=lambda: name.encode(), width=1, height=1)
+    return tier
+
+
+def ladder_where(rescuer, monkeypatch, adaptive=True):
+    """Returns a DecodeLadder with the default tier names in which only the rescuer tier decodes."""
+    monkeypatch.setattr(processor, "decode_qr_code",
+                        lambda image: "UPNQR" if image[0] == rescuer.encode() else None)
+    return DecodeLadder([(name, synthetic_tier(name)) for name in NAMES], adaptive=adaptive)
+
+
+def test_order_adapts_after_enough_runs(monkeypatch):
+    ladder = ladder_where("rotate", monkeypatch)
+    for _ in range(ADAPT_AFTER_RUNS - 1):
+        assert ladder.decode(IMAGE) == "UPNQR"
+        assert ladder.order() == NAMES
+
+    assert ladder.decode(IMAGE) == "UPNQR"
+    assert ladder.runs == ADAPT_AFTER_RUNS
+    assert ladder.order()[0] == "rotate"
+    assert sorted(ladder.order()) == sorted(NAMES)
+
+    # The rescuing tier now runs first, so the others are no longer tried
+    before = ladder.stats()
+    assert ladder.decode(IMAGE) == "UPNQR"
+    after = ladder.stats()
+    assert after["rotate"]["attempts"] == before["rotate"]["attempts"] + 1
+    assert all(after[name] == before[name] for name in NAMES if name != "rotate")
+
+
+def test_stats_count_attempts_and_successes(monkeypatch):
+    ladder = ladder_where("upscale3", monkeypatch)
+    for _ in range(3):
+        ladder.decode(IMAGE)
+    stats = ladder.stats()
+    assert [stats[name]["attempts"] for name in NAMES] == [3, 3, 3, 0, 0]
+    assert [stats[name]["successes"] for name in NAMES] == [0, 0, 3, 0, 0]
+
+
+def test_fixed_order_without_adaptive(monkeypatch):
+    ladder = ladder_where("rotate", monkeypatch, adaptive=False)
+    for _ in range(ADAPT_AFTER_RUNS + 5):
+        ladder.decode(IMAGE)
+    assert ladder.order() == NAMES
+
+
+def test_images_that_no_tier_decodes_count_as_runs(monkeypatch):
+    ladder = ladder_where("none", monkeypatch)
+    assert ladder.decode(IMAGE) is None
+    assert ladder.runs == 1
+    assert all(stats["attempts"] == 1 and not stats["successes"] for stats in ladder.stats().values())
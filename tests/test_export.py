@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+
+from src.export.table import COLUMN_NAMES, InvoiceTableWriter
+from src.qr_code_processor.processor import parse_upnqr_data
+from tests.test_xml_template import EXAMPLE_PAYLOAD
+
+
+def example_record(due_date):
+    lines = EXAMPLE_PAYLOAD.split("\n")
+    lines[13] = due_date
+    return parse_upnqr_data("\n".join(lines))
+
+
+RECORDS = [example_record("17.04.2025"), example_record("31.02.2025"), example_record("2025/04/17"), example_record("")]
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_csv_dates(tmp_path):
+    path = tmp_path / "invoices.csv"
+    with InvoiceTableWriter(str(path)) as table:
+        for record in RECORDS:
+            table.add(record, source="example_invoice.pdf")
+
+    rows = read_csv(path)
+    assert list(rows[0]) == COLUMN_NAMES
+    assert [row["rok_placila"] for row in rows] == ["2025-04-17", "", "", ""]
+    assert rows[0]["znesek_centi"] == "48"
+
+
+def test_csv_and_parquet_export_the_same_values(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with InvoiceTableWriter(str(tmp_path / "invoices.csv")) as table:
+        for record in RECORDS:
+            table.add(record, source="example_invoice.pdf")
+    with InvoiceTableWriter(str(tmp_path / "invoices.parquet")) as table:
+        for record in RECORDS:
+            table.add(record, source="example_invoice.pdf")
+
+    csv_rows = read_csv(tmp_path / "invoices.csv")
+    parquet_rows = pq.read_table(str(tmp_path / "invoices.parquet")).to_pylist()
+    as_text = [{name: "" if value is None else str(value) for name, value in row.items()} for row in parquet_rows]
+    assert as_text == csv_rows
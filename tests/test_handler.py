@@ -0,0 +1,156 @@
+import io
+import mmap
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.pdf_handler.handler import PdfTooLargeError, check_pdf_size, pdf_source
+
+DATA = b"%PDF-1.4\n" + bytes(range(256)) * 4 + b"%%EOF\n"
+
+
+class CountingStream:
+    """A non-seekable stream without a file descriptor that never runs dry; records every read size."""
+
+    def __init__(self):
+        self.reads = []
+
+    def read(self, size=-1):
+        assert size >= 0, "an endless stream must not be read to EOF"
+        self.reads.append(size)
+        return b"x" * size
+
+
+def pipe(data):
+    """Returns the read end of a pipe that a thread fills with data."""
+    read_fd, write_fd = os.pipe()
+
+    def fill():
+        try:
+            with os.fdopen(write_fd, "wb", buffering=0) as f:
+                f.write(data)
+        except BrokenPipeError:
+            pass  # The reader stopped early
+
+    threading.Thread(target=fill, daemon=True).start()
+    return os.fdopen(read_fd, "rb")
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / "invoice.pdf"
+    path.write_bytes(DATA)
+    return path
+
+
+def open_source(kind, path):
+    """Returns (input, resources to close) for one kind of pdf_source input holding DATA."""
+    if kind == "str":
+        return str(path), []
+    if kind == "pathlike":
+        return Path(path), []
+    if kind == "bytes":
+        return DATA, []
+    if kind == "bytearray":
+        return bytearray(DATA), []
+    if kind == "memoryview":
+        return memoryview(DATA), []
+    if kind == "mmap":
+        f = open(path, "rb")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped, [mapped, f]
+    if kind == "bytesio":
+        return io.BytesIO(DATA), []
+    if kind == "file":
+        f = open(path, "rb")
+        return f, [f]
+    if kind == "pipe":
+        f = pipe(DATA)
+        return f, [f]
+    raise AssertionError(kind)
+
+
+KINDS = ["str", "pathlike", "bytes", "bytearray", "memoryview", "mmap", "bytesio", "file", "pipe"]
+
+
+def release(source, resources):
+    if isinstance(source, memoryview):
+        source.release()
+    for resource in resources:
+        resource.close()
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_every_input_kind_gives_the_pdf_contents(kind, pdf_file):
+    pdf, resources = open_source(kind, pdf_file)
+    source = pdf_source(pdf)
+    try:
+        if kind in ("str", "pathlike"):
+            assert source == str(pdf_file)
+        else:
+            assert bytes(source) == DATA
+            # Only bytes and streams read to the end are not wrapped in a zero-copy view
+            assert isinstance(source, bytes if kind in ("bytes", "pipe") else memoryview)
+    finally:
+        release(source, resources)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("limit, too_large", [(len(DATA), False), (len(DATA) - 1, True)], ids=["at-limit", "over"])
+def test_size_limit(kind, limit, too_large, pdf_file):
+    pdf, resources = open_source(kind, pdf_file)
+    try:
+        if too_large:
+            with pytest.raises(PdfTooLargeError):
+                pdf_source(pdf, limit)
+        else:
+            release(pdf_source(pdf, limit), [])
+    finally:
+        release(None, resources)
+
+
+def test_no_limit():
+    with pipe(DATA) as f:
+        assert pdf_source(f, None) == DATA
+
+
+def test_stream_reads_at_most_one_byte_past_the_limit():
+    stream = CountingStream()
+    with pytest.raises(PdfTooLargeError):
+        pdf_source(stream, 1000)
+    assert stream.reads == [1001]
+
+
+def test_pipe_larger_than_the_limit_is_not_read_to_the_end():
+    with pipe(DATA * 64) as f:
+        with pytest.raises(PdfTooLargeError):
+            pdf_source(f, len(DATA))
+        # The rest of the stream is still unread
+        assert f.read(1)
+
+
+def test_wide_memoryview_is_cast_to_bytes():
+    data = DATA[:len(DATA) // 4 * 4]
+    source = pdf_source(memoryview(bytearray(data)).cast("I"))
+    assert source.format == "B" and bytes(source) == data
+
+
+def test_empty_regular_file_is_read_instead_of_mapped(tmp_path):
+    path = tmp_path / "empty.pdf"
+    path.write_bytes(b"")
+    with open(path, "rb") as f:
+        assert pdf_source(f) == b""
+
+
+def test_unsupported_input():
+    with pytest.raises(TypeError):
+        pdf_source(12345)
+
+
+def test_check_pdf_size():
+    check_pdf_size("a.pdf", 10, 10)
+    check_pdf_size("a.pdf", 10 ** 12, None)
+    with pytest.raises(PdfTooLargeError, match="a.pdf is larger than the 0.0 MB limit"):
+        check_pdf_size("a.pdf", 11, 10)
@@ -0,0 +1,192 @@
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from src.pipeline.jobs import JobJournal, JobRunner, file_stat, run_job
+
+
+def read_journal(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_file_that_is_not_a_pdf_is_quarantined_without_retries(tmp_path):
+    pytest.importorskip("fitz")
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    (inbox / "b.pdf").write_bytes(b"not a pdf")
+    journal = tmp_path / "job.jsonl"
+
+    summary = run_job([str(inbox)], str(journal), jobs=1, output_dir=str(tmp_path / "xml"), retries=2,
+                      retry_delay=30.0, quarantine_dir=str(tmp_path / "quarantine"))
+
+    statuses = [(record["status"], record["attempt"]) for record in read_journal(journal)]
+    assert statuses == [("started", 1), ("quarantined", 1)]
+    assert summary["files"][0]["error"].startswith("FileDataError")
+    assert (tmp_path / "quarantine").exists()
+
+
+def ok_report(pdf_path):
+    return {"input": pdf_path, "output": pdf_path + ".xml", "status": "ok", "error": None}
+
+
+def fake_convert(pdf_path):
+    """Stands in for convert_one in the workers; the file name picks the outcome."""
+    name = os.path.basename(pdf_path)
+    if name.startswith("hang"):
+        time.sleep(60)
+    if name.startswith("crash"):
+        os._exit(1)
+    if name.startswith("busy") or (name.startswith("flaky") and not os.path.exists(pdf_path + ".tried")):
+        open(pdf_path + ".tried", "w").close()
+        return {"input": pdf_path, "output": None, "status": "failed", "error": "OSError: device busy"}
+    return ok_report(pdf_path)
+
+
+def make_files(directory, *names):
+    paths = []
+    for name in names:
+        path = directory / name
+        path.write_bytes(b"%PDF-1.4 " + name.encode())
+        paths.append(str(path))
+    return paths
+
+
+def run_runner(tmp_path, paths, **options):
+    journal = JobJournal(str(tmp_path / "job.jsonl"))
+    options = {"jobs": 2, "retries": 2, "base_delay": 0.01, "quarantine_dir": str(tmp_path / "quarantine"),
+               **options}
+    runner = JobRunner(fake_convert, journal, **options)
+    try:
+        reports = runner.run(paths)
+    finally:
+        journal.close()
+    return runner, {os.path.basename(r["input"]): r for r in reports}
+
+
+def statuses(journal_path, name):
+    return [(record["status"], record["attempt"]) for record in read_journal(journal_path)
+            if os.path.basename(record["input"]) == name]
+
+
+def test_retries_then_quarantines(tmp_path):
+    paths = make_files(tmp_path, "busy.pdf", "flaky.pdf", "ok.pdf")
+    runner, reports = run_runner(tmp_path, paths)
+
+    journal = tmp_path / "job.jsonl"
+    assert statuses(journal, "busy.pdf") == [("started", 1), ("failed", 1), ("started", 2), ("failed", 2),
+                                             ("started", 3), ("quarantined", 3)]
+    assert reports["busy.pdf"]["status"] == "quarantined"
+    assert os.path.exists(reports["busy.pdf"]["quarantine"]) and not os.path.exists(paths[0])
+    assert statuses(journal, "flaky.pdf") == [("started", 1), ("failed", 1), ("started", 2), ("done", 2)]
+    assert reports["flaky.pdf"]["attempts"] == 2
+    assert statuses(journal, "ok.pdf") == [("started", 1), ("done", 1)]
+
+
+def test_rerun_keeps_quarantined_files_settled(tmp_path):
+    paths = make_files(tmp_path, "busy.pdf", "ok.pdf")
+    run_runner(tmp_path, paths)
+    lines = len(read_journal(tmp_path / "job.jsonl"))
+
+    # The same explicit paths again: busy.pdf is in quarantine now
+    runner, reports = run_runner(tmp_path, paths)
+
+    assert reports == {}
+    assert runner.resumed == 2
+    assert len(read_journal(tmp_path / "job.jsonl")) == lines
+    entries = JobJournal(str(tmp_path / "job.jsonl")).entries
+    assert entries[paths[0]]["status"] == "quarantined" and entries[paths[0]]["quarantine"]
+
+
+def test_missing_file_that_was_never_settled_is_skipped(tmp_path):
+    runner, reports = run_runner(tmp_path, [str(tmp_path / "gone.pdf")])
+    assert reports["gone.pdf"]["status"] == "skipped"
+
+
+def test_timeout_kills_only_the_stuck_worker(tmp_path):
+    paths = make_files(tmp_path, "hang.pdf", "a.pdf", "b.pdf", "c.pdf")
+    runner, reports = run_runner(tmp_path, paths, retries=1, timeout=0.5)
+
+    assert reports["hang.pdf"]["status"] == "quarantined"
+    assert reports["hang.pdf"]["error"] == "TimeoutError: no result after 0.5s"
+    assert statuses(tmp_path / "job.jsonl", "hang.pdf") == [("started", 1), ("failed", 1), ("started", 2),
+                                                            ("quarantined", 2)]
+    assert [reports[name]["status"] for name in ("a.pdf", "b.pdf", "c.pdf")] == ["ok"] * 3
+
+
+def test_worker_crash_fails_only_its_document(tmp_path):
+    paths = make_files(tmp_path, "crash.pdf", "a.pdf", "b.pdf")
+    runner, reports = run_runner(tmp_path, paths, retries=0, quarantine_dir=None)
+
+    assert reports["crash.pdf"]["status"] == "failed"
+    assert reports["crash.pdf"]["error"] == "WorkerCrashed: the worker process exited with status 1"
+    assert reports["a.pdf"]["status"] == reports["b.pdf"]["status"] == "ok"
+
+
+def test_resume_after_interrupt(tmp_path):
+    paths = make_files(tmp_path, "done.pdf", "started.pdf", "cancelled.pdf", "new.pdf")
+    # The journal of a job that was stopped: one file converted, one killed mid-attempt, one cancelled by Ctrl+C
+    journal = JobJournal(str(tmp_path / "job.jsonl"))
+    for path, status in zip(paths, ("done", "started", "cancelled")):
+        size, mtime_ns = file_stat(path)
+        journal.record(path, status, size=size, mtime_ns=mtime_ns, attempt=1)
+    journal.close()
+
+    runner, reports = run_runner(tmp_path, paths)
+
+    journal_path = tmp_path / "job.jsonl"
+    assert runner.resumed == 1 and "done.pdf" not in reports
+    # The interrupted attempt counts; the cancelled one is repeated
+    assert statuses(journal_path, "started.pdf")[1:] == [("failed", 1), ("started", 2), ("done", 2)]
+    assert read_journal(journal_path)[3]["error"].startswith("Interrupted")
+    assert statuses(journal_path, "cancelled.pdf")[1:] == [("started", 1), ("done", 1)]
+    assert statuses(journal_path, "new.pdf") == [("started", 1), ("done", 1)]
+
+
+def test_interrupted_last_attempt_is_quarantined(tmp_path):
+    (path,) = make_files(tmp_path, "killer.pdf")
+    journal = JobJournal(str(tmp_path / "job.jsonl"))
+    size, mtime_ns = file_stat(path)
+    journal.record(path, "started", size=size, mtime_ns=mtime_ns, attempt=3)
+    journal.close()
+
+    runner, reports = run_runner(tmp_path, [path])
+
+    assert reports["killer.pdf"]["status"] == "quarantined"
+    assert statuses(tmp_path / "job.jsonl", "killer.pdf")[1:] == [("quarantined", 3)]
+
+
+def test_changed_file_is_converted_again(tmp_path):
+    changed, unchanged = make_files(tmp_path, "changed.pdf", "unchanged.pdf")
+    run_runner(tmp_path, [changed, unchanged])
+
+    with open(changed, "ab") as f:
+        f.write(b" corrected")
+    runner, reports = run_runner(tmp_path, [changed, unchanged])
+
+    assert runner.resumed == 1
+    assert list(reports) == ["changed.pdf"]
+    assert statuses(tmp_path / "job.jsonl", "changed.pdf") == [("started", 1), ("done", 1), ("started", 1),
+                                                               ("done", 1)]
+    assert read_journal(tmp_path / "job.jsonl")[-1]["size"] == os.path.getsize(changed)
+
+
+def test_metrics_are_written_and_sent_to_statsd(tmp_path):
+    pytest.importorskip("fitz")
+    (tmp_path / "b.pdf").write_bytes(b"not a pdf")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(5)
+        metrics_file = tmp_path / "metrics.prom"
+
+        summary = run_job([str(tmp_path / "b.pdf")], str(tmp_path / "job.jsonl"), jobs=1,
+                          output_dir=str(tmp_path / "xml"), quarantine_dir=str(tmp_path / "quarantine"),
+                          metrics_options={}, metrics_file=str(metrics_file),
+                          statsd=f"127.0.0.1:{server.getsockname()[1]}")
+
+        assert summary["metrics"]["documents"]["failed"] == 1
+        assert metrics_file.exists()
+        assert b"documents.failed:1|c" in server.recv(4096)
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from src.pdf_handler.ranking import rank_images, rank_page_images, score_image
+
+PAGE = SimpleNamespace(width=595, height=842)
+
+
+def rect(x0, y0, x1, y1):
+    return SimpleNamespace(x0=x0, y0=y0, x1=x1, y1=y1, width=x1 - x0, height=y1 - y0)
+
+
+def image(xref, width, height, bpc=8, colorspace='DeviceRGB', image_filter='FlateDecode'):
+    return (xref, 0, width, height, bpc, colorspace, '', f'Im{xref}', image_filter, 0)
+
+
+QR = image(1, 308, 308, bpc=1, colorspace='DeviceGray', image_filter='CCITTFaxDecode')
+LOGO = image(2, 600, 200)
+PHOTO = image(3, 1200, 1200, image_filter='DCTDecode')
+ICON = image(4, 16, 16)
+
+
+class FakePage:
+    def __init__(self, images, rects=None):
+        self.images = images
+        self.rects = rects or {}
+        self.rect = PAGE
+
+    def get_images(self, full=False):
+        return self.images
+
+    def get_image_rects(self, xref):
+        return self.rects.get(xref, [])
+
+
+def test_too_small_image_is_not_a_candidate():
+    assert score_image(ICON) is None
+
+
+def test_square_bitonal_image_scores_highest():
+    assert score_image(QR) > score_image(PHOTO) > score_image(LOGO)
+
+
+def test_placement_on_the_upn_slip_adds_to_the_score():
+    on_slip = score_image(QR, [rect(400, 650, 510, 760)], PAGE)
+    in_header = score_image(QR, [rect(400, 40, 510, 150)], PAGE)
+    too_large = score_image(QR, [rect(0, 0, 595, 595)], PAGE)
+    assert on_slip > in_header > too_large
+    assert in_header > score_image(QR)
+
+
+def test_rank_images_orders_by_score_and_lists_repeated_images_once():
+    doc = [FakePage([LOGO, PHOTO, ICON]), FakePage([LOGO, QR], {1: [rect(400, 650, 510, 760)]})]
+    assert rank_images(doc) == [1, 3, 2]
+
+
+def test_ties_keep_document_order():
+    twin = image(5, 308, 308, bpc=1, colorspace='DeviceGray', image_filter='CCITTFaxDecode')
+    assert rank_images([FakePage([twin, QR])]) == [5, 1]
+    assert rank_page_images(FakePage([QR, twin, QR])) == [1, 5]
@@ -0,0 +1,87 @@
+import random
+
+from src.pdf_handler.render import (
+    CLIP_MARGIN_MODULES, MAX_FINDER_CANDIDATES, find_finder_patterns, locate_qr_region,
+)
+
+MODULE = 3
+SIZE = 120
+
+
+def finder(image, left, top, module=MODULE):
+    """Draws a 7x7-module finder pattern with its top-left corner at (left, top)."""
+    for row in range(7):
+        for col in range(7):
+            ring = max(abs(row - 3), abs(col - 3))
+            if ring != 2:
+                for y in range(top + row * module, top + (row + 1) * module):
+                    start = y * SIZE + left + col * module
+                    image[start:start + module] = b'\x00' * module
+
+
+def blank():
+    return bytearray(b'\xff' * SIZE * SIZE)
+
+
+def qr_finders(image, left=12, top=15, modules=21):
+    """Draws the three finder patterns of a version 1 symbol; returns the expected centers."""
+    far = (modules - 7) * MODULE
+    for dx, dy in ((0, 0), (far, 0), (0, far)):
+        finder(image, left + dx, top + dy)
+    center = 3.5 * MODULE
+    return [(left + center, top + center), (left + far + center, top + center),
+            (left + center, top + far + center)]
+
+
+def test_finds_the_three_finder_patterns():
+    image = blank()
+    expected = qr_finders(image)
+    patterns = find_finder_patterns(bytes(image), SIZE, SIZE)
+    assert len(patterns) == 3
+    for (x, y, module), (ex, ey) in zip(sorted(patterns, key=lambda p: (p[1], p[0])),
+                                        sorted(expected, key=lambda p: (p[1], p[0]))):
+        assert abs(x - ex) <= 1 and abs(y - ey) <= 1
+        assert abs(module - MODULE) <= 0.5
+
+
+def test_row_stride_is_honoured():
+    image = blank()
+    qr_finders(image)
+    padded = b''.join(bytes(image[y * SIZE:(y + 1) * SIZE]) + b'\x00' * 8 for y in range(SIZE))
+    assert len(find_finder_patterns(padded, SIZE, SIZE, SIZE + 8)) == 3
+
+
+def test_blank_and_text_like_images_have_no_patterns():
+    assert find_finder_patterns(bytes(blank()), SIZE, SIZE) == []
+    image = blank()
+    # A single row of 1:1:3:1:1 runs, as in a line of text, is not confirmed
+    row = 60 * SIZE
+    image[row + 10:row + 31] = b'\x00' * 3 + b'\xff' * 3 + b'\x00' * 9 + b'\xff' * 3 + b'\x00' * 3
+    assert find_finder_patterns(bytes(image), SIZE, SIZE) == []
+
+
+def test_locates_the_symbol_from_a_synthetic_image():
+    image = blank()
+    expected = qr_finders(image)
+    region = locate_qr_region(find_finder_patterns(bytes(image), SIZE, SIZE))
+    assert region is not None
+    margin = CLIP_MARGIN_MODULES * MODULE
+    x0, y0, x1, y1 = region
+    assert abs(x0 - (expected[0][0] - margin)) <= 2 and abs(y0 - (expected[0][1] - margin)) <= 2
+    assert abs(x1 - (expected[1][0] + margin)) <= 2 and abs(y1 - (expected[2][1] + margin)) <= 2
+
+
+def test_two_patterns_are_not_a_symbol():
+    image = blank()
+    finder(image, 12, 15)
+    finder(image, 54, 15)
+    assert locate_qr_region(find_finder_patterns(bytes(image), SIZE, SIZE)) is None
+
+
+def test_candidate_count_is_capped():
+    qr = [(100.0, 100.0, 2.0), (200.0, 100.0, 2.0), (100.0, 200.0, 2.0)]
+    rng = random.Random(7)
+    noise = [(rng.uniform(0, 2000), rng.uniform(0, 2000), 2.0) for _ in range(2000)]
+    # Far more triples than could be checked in time without the cap
+    assert locate_qr_region(qr + noise) is not None
+    assert locate_qr_region(noise[:MAX_FINDER_CANDIDATES] + qr) is None
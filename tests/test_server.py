@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from src.server import app
+
+EXAMPLE_PDF = Path(__file__).resolve().parent.parent / "example_invoice.pdf"
+
+
+# Stand-ins for the worker functions; they must live in an importable module,
+# since workers are started from a fork server
+
+def no_warm_up(*args):
+    pass
+
+
+def fake_convert(body):
+    if body == b"hang":
+        time.sleep(60)
+    if body == b"crash":
+        os._exit(1)
+    if body.startswith(b"slow"):
+        time.sleep(1.0)
+    return body.upper() + b" " + str(os.getpid()).encode(), None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def send(reader, writer, method, path, body=b"", headers=""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n{headers}\r\n".encode() + body)
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    length = int(next(line.split(":")[1] for line in head.split("\r\n") if line.startswith("Content-Length")))
+    return int(head.split(" ")[1]), await reader.readexactly(length)
+
+
+async def request(port, method, path, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        return await send(reader, writer, method, path, body, "Connection: close\r\n")
+    finally:
+        writer.close()
+
+
+def serve(test, **options):
+    """Runs test(server, port) against a ConversionServer running on this event loop."""
+    async def main():
+        port = free_port()
+        server = app.ConversionServer(port=port, **options)
+        task = asyncio.create_task(server.serve_forever())
+        for _ in range(200):
+            try:
+                await request(port, "GET", "/health")
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+        try:
+            await asyncio.wait_for(test(server, port), 30)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(main())
+
+
+@pytest.fixture
+def fake_workers(monkeypatch):
+    monkeypatch.setattr(app, "_warm_up", no_warm_up)
+    monkeypatch.setattr(app, "_convert_bytes", fake_convert)
+
+
+def test_post_round_trip(fake_workers):
+    async def test(server, port):
+        status, body = await request(port, "POST", "/convert", b"pdf")
+        assert status == 200 and body.startswith(b"PDF ")
+        assert await request(port, "POST", "/convert") == (400, b'{"error": "Empty request body"}')
+        assert (await request(port, "GET", "/convert"))[0] == 405
+    serve(test, workers=1)
+
+
+def test_example_invoice_round_trip():
+    pytest.importorskip("fitz")
+    pytest.importorskip("pyzbar.pyzbar", exc_type=ImportError)  # also skips without libzbar
+
+    async def test(server, port):
+        status, body = await request(port, "POST", "/convert", EXAMPLE_PDF.read_bytes())
+        assert status == 200
+        assert b"1090010602" in body
+        status, body = await request(port, "POST", "/convert", b"not a pdf")
+        assert status == 422
+    serve(test, workers=1)
+
+
+def test_bodies_of_other_methods_are_drained_on_keep_alive_connections(fake_workers):
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            status, body = await send(reader, writer, "GET", "/health", b"ignored")
+            assert status == 200 and json.loads(body)["status"] == "ok"
+            status, body = await send(reader, writer, "POST", "/convert", b"pdf")
+            assert status == 200 and body.startswith(b"PDF ")
+        finally:
+            writer.close()
+    serve(test, workers=1)
+
+
+def test_timeout_replaces_only_the_stuck_worker(fake_workers):
+    async def test(server, port):
+        hang = asyncio.create_task(request(port, "POST", "/convert", b"hang"))
+        await asyncio.sleep(1.4)
+        # Still running in the other worker when the stuck one is killed at 2s
+        slow = asyncio.create_task(request(port, "POST", "/convert", b"slow"))
+        status, _ = await hang
+        assert status == 504
+        status, body = await slow
+        assert status == 200 and body.startswith(b"SLOW ")
+
+        # The replacement worker takes requests, and every slot is free again
+        results = await asyncio.gather(*(request(port, "POST", "/convert", b"pdf") for _ in range(4)))
+        assert [status for status, _ in results] == [200] * 4
+        assert len({body for _, body in results}) == 2
+        assert server.in_flight == 0 and len(server._workers) == 2
+    serve(test, workers=2, timeout=2.0)
+
+
+def test_crashed_worker_fails_only_its_own_request(fake_workers):
+    async def test(server, port):
+        slow = asyncio.create_task(request(port, "POST", "/convert", b"slow"))
+        await asyncio.sleep(0.3)
+        status, _ = await request(port, "POST", "/convert", b"crash")
+        assert status == 503
+        status, body = await slow
+        assert status == 200 and body.startswith(b"SLOW ")
+        assert (await request(port, "POST", "/convert", b"pdf"))[0] == 200
+    serve(test, workers=2)
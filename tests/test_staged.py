@@ -0,0 +1,69 @@
+import os
+from functools import partial
+
+from src.pdf_handler.handler import MAX_PDF_BYTES
+from src.pipeline.staged import run_pipeline
+
+
+def fake_convert(pdf_path, output_dir, data=None):
+    output = os.path.join(output_dir, os.path.basename(pdf_path) + ".xml")
+    record = {"document": pdf_path, "status": "ok", "wall": 0.0, "cpu": 0.0, "stages": {}, "counters": {}}
+    return {"input": pdf_path, "output": output, "status": "ok", "error": None, "xml": "<x/>", "metrics": record}
+
+
+def convert_all(paths, output_dir, jobs=2):
+    reports = []
+    run_pipeline(paths, partial(fake_convert, output_dir=str(output_dir)), reports.append, jobs=jobs)
+    return {os.path.basename(r["input"]): r for r in reports}
+
+
+def make_pdfs(directory, *names):
+    paths = []
+    for name in names:
+        path = directory / name
+        path.write_bytes(b"%PDF-1.4")
+        paths.append(str(path))
+    return paths
+
+
+def test_writes_xml_of_every_report(tmp_path):
+    reports = convert_all(make_pdfs(tmp_path, "a.pdf", "b.pdf"), tmp_path)
+
+    assert {name: r["status"] for name, r in reports.items()} == {"a.pdf": "ok", "b.pdf": "ok"}
+    assert (tmp_path / "a.pdf.xml").read_text() == "<x/>"
+
+
+def test_write_failure_marks_the_metrics_record_failed(tmp_path):
+    reports = convert_all(make_pdfs(tmp_path, "a.pdf"), tmp_path / "missing")
+
+    report = reports["a.pdf"]
+    assert report["status"] == "failed"
+    assert report["error"].startswith("FileNotFoundError")
+    assert report["metrics"]["status"] == "failed"
+
+
+def crashing_convert(pdf_path, output_dir, data=None):
+    if os.path.basename(pdf_path).startswith("crash"):
+        os._exit(1)
+    return fake_convert(pdf_path, output_dir, data)
+
+
+def test_worker_crash_fails_only_the_crashing_pdf(tmp_path):
+    paths = make_pdfs(tmp_path, "a.pdf", "crash.pdf", "b.pdf", "c.pdf")
+    reports = []
+    run_pipeline(paths, partial(crashing_convert, output_dir=str(tmp_path)), reports.append, jobs=2)
+
+    statuses = {os.path.basename(r["input"]): r["status"] for r in reports}
+    assert statuses == {"a.pdf": "ok", "crash.pdf": "failed", "b.pdf": "ok", "c.pdf": "ok"}
+    failed = next(r for r in reports if r["status"] == "failed")
+    assert failed["error"].startswith("BrokenProcessPool")
+
+
+def test_pdf_over_the_size_limit_is_not_read(tmp_path):
+    path = tmp_path / "huge.pdf"
+    with open(path, "wb") as f:
+        f.truncate(MAX_PDF_BYTES + 1)  # sparse, takes no disk space
+    reports = convert_all([str(path)], tmp_path)
+
+    assert reports["huge.pdf"]["status"] == "failed"
+    assert reports["huge.pdf"]["error"].startswith("PdfTooLargeError")
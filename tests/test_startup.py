@@ -0,0 +1,54 @@
+"""main.py must start without loading the heavy dependencies; each mode imports them when it runs."""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = {"fitz", "pymupdf", "PIL", "pyzbar", "lxml", "inquirer", "numpy", "pyarrow"}
+
+# Total import time of main.py --help; it takes about 50 ms, loading PyMuPDF or lxml alone adds more than that
+IMPORT_BUDGET_MS = 250
+
+_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)")
+
+
+def run_with_importtime(*args):
+    """Returns {module: cumulative µs} and the summed top-level import time in ms of one run."""
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    modules, total = {}, 0
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules[match.group(3)] = int(match.group(1))
+            if not match.group(2):
+                total += int(match.group(1))
+    return modules, total / 1000
+
+
+def heavy_modules(modules):
+    return sorted({name.split(".")[0] for name in modules} & HEAVY)
+
+
+def test_help_loads_no_heavy_modules():
+    modules, _ = run_with_importtime("main.py", "--help")
+    assert "argparse" in modules
+    assert heavy_modules(modules) == []
+
+
+def test_help_import_time_within_budget():
+    best = min(run_with_importtime("main.py", "--help")[1] for _ in range(3))
+    assert best < IMPORT_BUDGET_MS
+
+
+@pytest.mark.parametrize("module", [
+    "src.pipeline.batch", "src.pipeline.jobs", "src.pipeline.statement", "src.server.app", "src.watch.watcher",
+])
+def test_mode_modules_load_no_heavy_modules(module):
+    modules, _ = run_with_importtime("-c", f"import {module}")
+    assert module in modules
+    assert heavy_modules(modules) == []
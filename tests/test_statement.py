@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from src.pipeline import statement
+from tests.test_xml_template import EXAMPLE_PAYLOAD
+
+PORTAL_LINK = "https://example.com/e-racun"
+
+
+def slip(page):
+    return EXAMPLE_PAYLOAD.replace("1090010602", f"10900106{page:02d}")
+
+
+def make_statement(path, pages):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page()
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def fake_scan_pages(pdf_path, start, stop):
+    """Stands in for scan_pages in the forked workers: one slip per page, page 6 of crash.pdf crashes."""
+    if os.path.basename(pdf_path) == "crash.pdf" and start <= 5 < stop:
+        os._exit(1)
+    return [(number + 1, slip(number + 1)) for number in range(start, stop)]
+
+
+def test_worker_crash_fails_only_the_crashing_page_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(statement, "scan_pages", fake_scan_pages)
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    for name in ("a.pdf", "crash.pdf", "z.pdf"):
+        make_statement(inbox / name, 12)
+
+    summary = statement.run_statements([str(inbox)], jobs=2, output_dir=str(tmp_path / "xml"))
+
+    failed = [r for r in summary["invoices"] if r["status"] == "failed"]
+    assert len(failed) == 1
+    assert failed[0]["input"].endswith("crash.pdf")
+    assert failed[0]["error"].startswith("BrokenProcessPool") and "(pages 5-8)" in failed[0]["error"]
+    pages = {(os.path.basename(r["input"]), r["page"]) for r in summary["invoices"] if r["status"] == "ok"}
+    assert pages == {(name, page) for name in ("a.pdf", "crash.pdf", "z.pdf") for page in range(1, 13)
+                     if name != "crash.pdf" or not 5 <= page <= 8}
+    assert summary["documents"] == 3 and summary["succeeded"] == 32
+
+
+class FakePage:
+    parent = None
+
+
+def fake_scan(monkeypatch, images, retried=None, rendered=None):
+    """Patches the decoding steps of scan_page: images maps xrefs to their plain decode result."""
+    calls = []
+    monkeypatch.setattr(statement, "rank_page_images", lambda page: list(images))
+    monkeypatch.setattr(statement, "extract_gray_image", lambda doc, xref: xref)
+    monkeypatch.setattr(statement, "decode_qr_code",
+                        lambda image: images.get(image) if image != "region" else rendered)
+    monkeypatch.setattr(statement, "decode_qr_code_retry",
+                        lambda image: calls.append(("retry", image)) or (retried or {}).get(image))
+    monkeypatch.setattr(statement, "render_qr_region",
+                        lambda page: calls.append(("render", None)) or "region")
+    return calls
+
+
+def test_slip_found_by_plain_decode_skips_the_fallbacks(monkeypatch):
+    calls = fake_scan(monkeypatch, {1: slip(1), 2: None})
+    assert statement.scan_page(FakePage(), {}) == [slip(1)]
+    assert calls == []
+
+
+def test_qr_code_that_is_not_a_slip_does_not_stop_the_retry_ladder(monkeypatch):
+    calls = fake_scan(monkeypatch, {1: PORTAL_LINK, 2: None}, retried={2: slip(1)})
+    assert statement.scan_page(FakePage(), {}) == [PORTAL_LINK, slip(1)]
+    assert calls == [("retry", 2)]
+
+
+def test_qr_code_that_is_not_a_slip_does_not_stop_the_rendering_fallback(monkeypatch):
+    calls = fake_scan(monkeypatch, {1: PORTAL_LINK}, rendered=slip(1))
+    assert statement.scan_page(FakePage(), {}) == [PORTAL_LINK, slip(1)]
+    assert calls == [("render", None)]
+
+
+def test_page_without_any_qr_code(monkeypatch):
+    calls = fake_scan(monkeypatch, {1: None, 2: None})
+    assert statement.scan_page(FakePage(), {}) == []
+    assert calls == [("retry", 1), ("retry", 2), ("render", None)]
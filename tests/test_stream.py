@@ -0,0 +1,61 @@
+import json
+import os
+import tarfile
+import zipfile
+
+from src.xml_generator.generator import generate_eslog_xml
+from src.xml_generator.stream import MANIFEST_NAME, EslogStreamWriter
+
+DATA = {'InvoiceNumber': '1090010602', 'InvoiceDate': '2025-04-17', 'SellerName': 'NGEN d.o.o.', 'Amount': 0.48}
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+        return [json.loads(line)["name"] for line in f]
+
+
+def test_directory_manifest_has_one_entry_per_file_across_runs(tmp_path):
+    for names in (['a', 'b'], ['b', 'c'], ['b']):
+        with EslogStreamWriter(str(tmp_path)) as writer:
+            for name in names:
+                writer.write(name, DATA)
+
+    assert sorted(read_manifest(tmp_path)) == ['a.xml', 'b.xml', 'c.xml']
+    assert sorted(os.listdir(tmp_path)) == ['a.xml', 'b.xml', 'c.xml', MANIFEST_NAME]
+
+
+def test_directory_manifest_lists_names_made_unique_within_a_run(tmp_path):
+    with EslogStreamWriter(str(tmp_path)) as writer:
+        writer.write('a', DATA)
+        writer.write('a', DATA)
+
+    assert read_manifest(tmp_path) == ['a.xml', 'a-2.xml']
+
+
+def test_write_xml_stores_the_given_bytes_like_write(tmp_path):
+    xml = generate_eslog_xml(DATA).encode('utf-8')
+    (tmp_path / 'write').mkdir()
+    (tmp_path / 'write_xml').mkdir()
+    for target in ('a.zip', 'a.tar', 'a.tar.gz', 'dir'):
+        for method in ('write', 'write_xml'):
+            with EslogStreamWriter(str(tmp_path / method / target)) as writer:
+                if method == 'write':
+                    writer.write('a', DATA, source='a.pdf')
+                else:
+                    writer.write_xml('a', xml, DATA, source='a.pdf')
+        assert read_member(tmp_path / 'write' / target, 'a.xml') == xml
+        assert read_member(tmp_path / 'write_xml' / target, 'a.xml') == xml
+        assert (read_member(tmp_path / 'write' / target, MANIFEST_NAME)
+                == read_member(tmp_path / 'write_xml' / target, MANIFEST_NAME))
+
+
+def read_member(target, name):
+    target = str(target)
+    if target.endswith('.zip'):
+        with zipfile.ZipFile(target) as archive:
+            return archive.read(name)
+    if '.tar' in target:
+        with tarfile.open(target) as archive:
+            return archive.extractfile(name).read()
+    with open(os.path.join(target, name), 'rb') as f:
+        return f.read()
@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+
+from src.suppliers.registry import Supplier, SupplierRegistry
+
+PETROL = Supplier("Petrol d.d.", "SI80267432", "5025796000", ("SI56 0510 0800 0123 456",), None)
+
+
+@pytest.fixture
+def registry():
+    return SupplierRegistry([PETROL, Supplier("Elektro Gorenjska d.d.", "SI20389264", "5175348000", (), 9.5)])
+
+
+def test_iban_and_exact_name(registry):
+    assert registry.lookup(iban="SI56051008000123456").vat_id == PETROL.vat_id
+    assert registry.lookup(name="PETROL, d.d.") is PETROL
+    assert registry.lookup(name="Ngen doo").vat_id == "SI24576239"
+
+
+def test_fuzzy_match_of_a_misspelled_name(registry):
+    assert registry.lookup(name="Elektro Gorenjksa d.d.").vat_id == "SI20389264"
+
+
+@pytest.mark.parametrize("name", ["Petrol Plin d.o.o.", "Elektro Ljubljana d.o.o.", "Elektro d.o.o."])
+def test_other_company_sharing_words_gets_no_ids(registry, name, caplog):
+    with caplog.at_level(logging.WARNING, logger="src.suppliers.registry"):
+        assert registry.lookup(name=name) is None
+    assert "No supplier matches" in caplog.text
+
+
+def test_unrelated_name(registry):
+    assert registry.lookup(name="Komunala Kranj d.o.o.") is None
+
+
+@pytest.mark.parametrize("name", ["NGEN d.o.o. Ljubljana", "NGEN Energija d.o.o.", "ngen, trgovina in storitve"])
+def test_names_containing_ngen_get_the_builtin_ids(registry, name, caplog):
+    with caplog.at_level(logging.WARNING, logger="src.suppliers.registry"):
+        assert registry.lookup(name=name).vat_id == "SI24576239"
+    assert caplog.text == ""
+
+
+def test_registry_entry_takes_precedence_over_the_ngen_rule():
+    ngen = Supplier("NGEN d.o.o.", "SI11111111", "1111111000", (), 9.5)
+    energija = Supplier("NGEN Energija d.o.o.", "SI22222222", "2222222000", (), None)
+    registry = SupplierRegistry([ngen, energija])
+    assert registry.lookup(name="NGEN d.o.o. Ljubljana") is ngen
+    assert registry.lookup(name="NGEN Energija d.o.o.") is energija
@@ -0,0 +1,101 @@
+import gc
+
+import pytest
+
+from src.qr_code_processor.upnqr import iban_valid, parse_many, parse_upnqr_data, reference_valid
+from tests.test_xml_template import EXAMPLE_PAYLOAD
+
+
+def payload(**replacements):
+    """Returns EXAMPLE_PAYLOAD with field lines replaced, keyed by 1-based field number (f15=...)."""
+    lines = EXAMPLE_PAYLOAD.split("\n")
+    for key, value in replacements.items():
+        lines[int(key[1:]) - 1] = value
+    return "\n".join(lines)
+
+
+def test_valid_payload():
+    errors = []
+    record = parse_upnqr_data(EXAMPLE_PAYLOAD, errors)
+    assert errors == []
+    assert record["iban_prejemnika"] == "SI56040000276166895"
+    assert record["znesek_centi"] == "00000000048"
+    assert record["znesek"] == 0.48
+    assert record["rok_placila"] == "2025-04-17"
+    assert record["kraj_prejemnika"] == "4274 Žirovnica"
+
+
+def test_validation_is_only_done_with_an_errors_list():
+    assert parse_upnqr_data(payload(f20="999")) is not None
+
+
+def test_bad_checksum():
+    errors = []
+    assert parse_upnqr_data(payload(f20="185"), errors) is not None
+    assert errors == ["Checksum '185' does not match the payload length 184"]
+
+
+@pytest.mark.parametrize("iban", ["SI57040000276166895", "SI5604000027616689", "si56040000276166895"])
+def test_bad_receiver_iban(iban):
+    errors = []
+    assert parse_upnqr_data(payload(f15=iban), errors) is not None
+    assert f"Receiver IBAN {iban} is not valid" in errors
+
+
+def test_bad_payer_iban_and_reference():
+    errors = []
+    parse_upnqr_data(payload(f2="SI56040000276166894", f16="RF18539007547035"), errors)
+    assert "Payer IBAN SI56040000276166894 is not valid" in errors
+    assert "Receiver reference RF18539007547035 is not valid" in errors
+
+
+@pytest.mark.parametrize("reference, valid", [
+    ("SI001090010602", True), ("SI12 1234", False), ("RF18539007547034", True),
+    ("RF18539007547035", False), ("XX001234", False),
+])
+def test_references(reference, valid):
+    assert reference_valid(reference) is valid
+
+
+def test_iban_check_digits():
+    assert iban_valid("SI56040000276166895")
+    assert not iban_valid("SI56 0400 0027 6166 895")
+
+
+@pytest.mark.parametrize("data", [
+    "",
+    "UPNQR",
+    "\n".join(EXAMPLE_PAYLOAD.split("\n")[:19]),
+    EXAMPLE_PAYLOAD.replace("UPNQR", "BCD", 1),
+    payload(f9="12,50"),
+], ids=["empty", "header-only", "19-lines", "other-format", "bad-amount"])
+def test_not_a_upnqr_payload(data):
+    assert parse_upnqr_data(data) is None
+
+
+def test_zbar_mojibake_in_receiver_city_is_repaired():
+    record = parse_upnqr_data(EXAMPLE_PAYLOAD.replace("Žirovnica", "鬚irovnica"))
+    assert record["kraj_prejemnika"] == "4274 Žirovnica"
+
+
+def test_parse_many_matches_parse_upnqr_data():
+    payloads = [EXAMPLE_PAYLOAD, "UPNQR", payload(f20="185")]
+    errors = []
+    assert parse_many(payloads) == [parse_upnqr_data(p) for p in payloads]
+    assert parse_many(payloads, errors) == [parse_upnqr_data(p) for p in payloads]
+    assert errors == [[], [], ["Checksum '185' does not match the payload length 184"]]
+
+
+def test_parse_many_restores_the_garbage_collector_when_it_raises():
+    assert gc.isenabled()
+    with pytest.raises(AttributeError):
+        parse_many([EXAMPLE_PAYLOAD, None])
+    assert gc.isenabled()
+
+    gc.disable()
+    try:
+        with pytest.raises(AttributeError):
+            parse_many([None])
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
@@ -0,0 +1,43 @@
+import os
+
+from src.watch.watcher import InboxWatcher
+
+
+def fake_convert(pdf_path):
+    if os.path.basename(pdf_path).startswith("crash"):
+        os._exit(1)
+    return {"input": pdf_path, "output": pdf_path[:-4] + ".xml", "status": "ok", "error": None}
+
+
+def make_watcher(inbox, debounce=0.0):
+    watcher = InboxWatcher([str(inbox)], jobs=1, debounce=debounce)
+    watcher._convert = fake_convert
+    return watcher
+
+
+def test_worker_crash_records_the_file_as_failed_and_keeps_going(tmp_path):
+    for name in ("a.pdf", "crash.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+
+    result = make_watcher(tmp_path).run(once=True)
+
+    index = make_watcher(tmp_path).index
+    assert index.get(str(tmp_path / "a.pdf"))["status"] == "ok"
+    assert index.get(str(tmp_path / "b.pdf"))["status"] == "ok"
+    crashed = index.get(str(tmp_path / "crash.pdf"))
+    assert crashed["status"] == "failed"
+    assert crashed["error"].startswith("BrokenProcessPool")
+    assert result == {"converted": 2, "failed": 1}
+
+
+def test_once_sleeps_until_a_queued_file_is_due(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"%PDF-1.4")
+    watcher = make_watcher(tmp_path, debounce=0.3)
+    # Queue the backlog as freshly touched instead of already due
+    watcher.scan = lambda now=None: InboxWatcher.scan(watcher)
+    pop_due = watcher.queue.pop_due
+    calls = []
+    watcher.queue.pop_due = lambda: calls.append(1) or pop_due()
+
+    assert watcher.run(once=True) == {"converted": 1, "failed": 0}
+    assert len(calls) < 10
@@ -0,0 +1,130 @@
+"""render_eslog_xml must produce exactly the output of generate_eslog_xml."""
+import itertools
+import pickle
+
+import pytest
+
+from src.qr_code_processor.processor import parse_upnqr_data
+from src.suppliers.registry import SupplierRegistry
+from src.xml_generator.generator import generate_eslog_xml, map_upnqr_to_eslog
+from src.xml_generator.invoice import EslogInvoice
+from src.xml_generator.template import render_eslog_xml
+
+# The UPNQR payload of example_invoice.pdf
+EXAMPLE_PAYLOAD = (
+    "UPNQR\n\n\n\n\nLuka Oblak\nDelavska cesta BŠ\n4280 Šenčur\n00000000048\n\n\nGDSV\n"
+    "Plačilo računa št.: 1090010602\n17.04.2025\nSI56040000276166895\nSI001090010602\n"
+    "NGEN d.o.o.\nMoste 101\n4274 Žirovnica\n184\n" + " " * 223
+)
+
+BASE = {
+    'InvoiceNumber': '1090010602',
+    'InvoiceDate': '2025-04-17',
+    'DueDate': '2025-05-01',
+    'BuyerName': 'Luka Oblak',
+    'BuyerAddress': 'Delavska cesta BŠ, 4280 Šenčur',
+    'SellerName': 'NGEN d.o.o.',
+    'SellerAddress': 'Moste 101, 4274 Žirovnica',
+    'SellerIBAN': 'SI56040000276166895',
+    'SellerVATID': 'SI24576239',
+    'SellerLegalID': '8209901000',
+    'Amount': 0.48,
+    'PaymentReference': 'SI001090010602',
+    'PurposeCode': 'GDSV',
+    'ItemDescription': 'Plačilo računa št.: 1090010602',
+    'TaxRate': 22.0,
+}
+
+
+def assert_same_xml(data):
+    expected = generate_eslog_xml(data)
+    assert render_eslog_xml(data) == expected
+
+
+def invoice(**fields):
+    data = dict(BASE, **fields)
+    for key in [key for key, value in fields.items() if value is KeyError]:
+        del data[key]
+    return data
+
+
+def test_example_invoice():
+    data = map_upnqr_to_eslog(parse_upnqr_data(EXAMPLE_PAYLOAD), SupplierRegistry())
+    assert data['SellerVATID'] == 'SI24576239'
+    assert_same_xml(data)
+    assert_same_xml(dict(data, InvoiceDate='2025-04-17'))
+
+
+def test_example_invoice_without_supplier():
+    # Without VAT or legal IDs the tax segments are left out
+    assert_same_xml(EslogInvoice(parse_upnqr_data(EXAMPLE_PAYLOAD)))
+
+
+@pytest.mark.parametrize("key, value", [
+    (key, value)
+    for key in sorted(BASE)
+    for value in (None, '', KeyError)
+    # Amount and TaxRate are always numbers in mapper output, but may be missing
+    if key not in ('Amount', 'TaxRate') or value is KeyError
+])
+def test_none_empty_and_missing_fields(key, value):
+    assert_same_xml(invoice(**{key: value}))
+
+
+@pytest.mark.parametrize("text", [
+    'Čevljarstvo & Co.',
+    'A <b> "quoted" \'x\'',
+    ']]> cdata end',
+    'line\r\nbreak',
+    'tab\there',
+    '&amp; already escaped',
+    '鬚 😀',
+])
+@pytest.mark.parametrize("key", ['InvoiceNumber', 'BuyerName', 'BuyerAddress', 'SellerName',
+                                 'SellerAddress', 'ItemDescription', 'DueDate'])
+def test_characters_that_need_escaping(key, text):
+    assert_same_xml(invoice(**{key: text}))
+
+
+@pytest.mark.parametrize("key", ['BuyerName', 'ItemDescription'])
+def test_invalid_xml_characters_are_rejected_by_both(key):
+    data = invoice(**{key: 'null\x00byte'})
+    with pytest.raises(ValueError):
+        generate_eslog_xml(data)
+    with pytest.raises(ValueError):
+        render_eslog_xml(data)
+
+
+@pytest.mark.parametrize("address", ['', ', ', 'Ulica 1', 'Ulica 1, Ljubljana', 'Ulica 1, 1000',
+                                     'a,b,c', ' , 2000 Maribor'])
+def test_address_formats(address):
+    assert_same_xml(invoice(BuyerAddress=address, SellerAddress=address))
+
+
+@pytest.mark.parametrize("amount, rate", list(itertools.product(
+    [0.0, 0.01, 0.48, 1.0, 99.99, 1234.56, 99999.99], [22.0, 9.5, 5.0, 0.0])))
+def test_amounts_and_rates(amount, rate):
+    assert_same_xml(invoice(Amount=amount, TaxRate=rate))
+    assert_same_xml(invoice(Amount=amount, AmountCents=str(round(amount * 100)), TaxRate=rate))
+
+
+@pytest.mark.parametrize("lines", [
+    [(10000, 22.0)],
+    [(10000, 22.0), (2050, 9.5)],
+    [(1, 22.0), (1, 22.0), (1, 22.0)],
+    [(123456, 22.0), (999, 9.5), (0, 5.0), (5000, 0.0)],
+], ids=["one", "two-rates", "same-rate", "four-rates"])
+@pytest.mark.parametrize("seller_vat", ['SI24576239', ''], ids=["vat", "no-vat"])
+def test_multi_line_invoices(lines, seller_vat):
+    assert_same_xml(invoice(Lines=lines, SellerVATID=seller_vat))
+
+
+def test_multi_line_eslog_invoice():
+    record = parse_upnqr_data(EXAMPLE_PAYLOAD)
+    single = EslogInvoice(record, 'SI24576239', '8209901000', '2025-04-17')
+    split = EslogInvoice(record, 'SI24576239', '8209901000', '2025-04-17', lines=[(30, 22.0), (18, 9.5)])
+    assert split['Lines'] == [(30, 22.0), (18, 9.5)] and single['Lines'] is None
+    assert_same_xml(split)
+    assert generate_eslog_xml(split) == generate_eslog_xml(dict(split))
+    assert generate_eslog_xml(split) != generate_eslog_xml(single)
+    assert pickle.loads(pickle.dumps(split)).lines == split.lines